@@ -2,11 +2,14 @@ import os
 import subprocess
 import asyncio
 import logging
-import tempfile
-from fastapi import APIRouter, HTTPException, Depends, Body, File, UploadFile
+from fastapi import APIRouter, HTTPException, Depends, Body, File, UploadFile, Query
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Dict, Any
 from ..crud import get_db, update_project_user_data, update_project_cost
+from ..utils import template_registry, response_cache
+from ..fingerprint import workspace_fingerprints
+from ..context_packer import context_packer
+from ..workspace_gc import workspace_gc
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
@@ -14,12 +17,19 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 code_bot_router = APIRouter()
 
+CACHE_BYPASS = "bypass"
+CODE_BOT_CONTEXT_TOKENS = int(os.environ.get("CODE_BOT_CONTEXT_TOKENS", "8000"))
+
+def referenced_files(context: Dict[str, Any]) -> Optional[List[str]]:
+    """Files named in a task's ``files`` context value; None means the task may read the whole workspace."""
+    files = [name.strip() for name in str(context.get("files") or "").split(",") if name.strip()]
+    for file in files:
+        if '..' in file or file.startswith('/'):
+            raise HTTPException(status_code=400, detail=f"Invalid file path: {file}")
+    return files or None
+
 def read_template(template_name):
-    template_path = os.path.join("templates", template_name)
-    if not os.path.exists(template_path):
-        raise FileNotFoundError(f"Template file not found: {template_path}")
-    with open(template_path, "r") as file:
-        return file.read()
+    return template_registry.get(template_name).source
 
 class AiderConfig(BaseModel):
     chat_mode: str = Field("code", example="code")
@@ -87,7 +97,8 @@ class CodeManagementConfig(BaseModel):
     task: str
     files: List[str]
 
-def run_aider(config: AiderConfig, project_path: str):
+def run_aider(config: AiderConfig, project_path: str, message: Optional[str] = None):
+    """Runs Aider in ``project_path``. A ``message`` is piped to Aider on stdin instead of via a file."""
     command = [
         "aider",
         "--chat-mode", config.chat_mode,
@@ -97,7 +108,9 @@ def run_aider(config: AiderConfig, project_path: str):
         "--no-git"  # Run without git integration
     ]
 
-    if config.message_file:
+    if message is not None:
+        command.extend(["--message-file", "/dev/stdin"])
+    elif config.message_file:
         command.extend(["--message-file", config.message_file])
     elif config.prompt:
         command.extend(["--message", config.prompt])
@@ -118,6 +131,7 @@ def run_aider(config: AiderConfig, project_path: str):
         logger.info(f"Running Aider command: {' '.join(command)}")
         process = subprocess.Popen(
             command,
+            stdin=subprocess.PIPE if message is not None else None,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             universal_newlines=True,
@@ -125,7 +139,7 @@ def run_aider(config: AiderConfig, project_path: str):
             env=env
         )
         
-        output, error = process.communicate()
+        output, error = process.communicate(input=message)
         
         if process.returncode != 0:
             logger.error(f"Aider command failed with return code {process.returncode}")
@@ -170,6 +184,7 @@ async def execute_aider(config: AiderConfig, db: Session = Depends(get_db)):
     
     # Create project directory if it doesn't exist
     os.makedirs(project_path, exist_ok=True)
+    workspace_gc.touch(project_path)
 
     # Ensure all files exist in the project directory
     for file in config.files:
@@ -197,22 +212,18 @@ async def execute_aider(config: AiderConfig, db: Session = Depends(get_db)):
     }
 
 @code_bot_router.post("/sparc")
-async def sparc_task(config: SPARCConfig, db: Session = Depends(get_db)):
+async def sparc_task(config: SPARCConfig, db: Session = Depends(get_db), cache: Optional[str] = Query(None, description="Set to 'bypass' to skip the response cache")):
     project_path = os.path.join("projects", f"{config.project_name}_{config.user_id}")
     os.makedirs(project_path, exist_ok=True)
+    workspace_gc.touch(project_path)
 
     try:
-        template_content = read_template(f"{config.template}.md")
+        template = template_registry.get(f"{config.template}.md")
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"Template '{config.template}' not found")
 
-    # Replace placeholders in the template with context values
-    for key, value in config.context.items():
-        template_content = template_content.replace(f"{{{{ {key} }}}}", str(value))
-
-    with tempfile.NamedTemporaryFile(mode='w+', delete=False) as temp_file:
-        temp_file.write(template_content)
-        temp_file_path = temp_file.name
+    # Fill the template placeholders with context values in a single pass
+    template_content = template.render(config.context)
 
     aider_config = AiderConfig(
         chat_mode="sparc",
@@ -221,27 +232,65 @@ async def sparc_task(config: SPARCConfig, db: Session = Depends(get_db)):
         prompt=None,
         files=[],
         project_name=config.project_name,
-        user_id=config.user_id,
-        message_file=temp_file_path
+        user_id=config.user_id
     )
 
-    output, error = await asyncio.to_thread(run_aider, aider_config, project_path)
-    processed_output = process_aider_output(output.split('\n'))
+    # Identical prompts against identical files give the same answer, so retries
+    # are served from the cache without calling the model again
+    files = referenced_files(config.context)
+    files_hash = await asyncio.to_thread(workspace_fingerprints.fingerprint, project_path, files)
+    cache_key = response_cache.make_key(config.template, template_content, aider_config.model, files_hash)
+    if cache != CACHE_BYPASS:
+        cached = await asyncio.to_thread(response_cache.get, cache_key)
+        if cached is not None:
+            return {
+                "project_name": config.project_name,
+                "user_id": config.user_id,
+                "sparc_output": cached["sparc_output"],
+                "estimated_cost": 0.0,
+                "cached": True,
+                "context": None
+            }
+
+    # Tasks that name files used to pass only their names; the files now go in
+    # with their contents, or summaries when they do not fit the budget. The
+    # packed text is derived from those files, so files_hash still covers it.
+    prompt = template_content
+    packed = None
+    if files:
+        packed = await asyncio.to_thread(
+            context_packer.pack, project_path, CODE_BOT_CONTEXT_TOKENS, seeds=files, task=template_content,
+            only_seeds=True
+        )
+        if packed.text:
+            prompt = f"{template_content}\n\n{packed.text}"
 
-    os.unlink(temp_file_path)  # Remove the temporary file
+    output, error = await asyncio.to_thread(run_aider, aider_config, project_path, prompt)
+    processed_output = process_aider_output(output.split('\n'))
 
+    # Billed on the task as asked, not on the context packed around it
     estimated_cost = len(template_content) * 0.00001  # Example cost calculation
     update_project_cost(db, config.project_name, config.user_id, estimated_cost)
 
+    # Only runs that left the files untouched are idempotent; replaying the
+    # output of a run that edited them would skip the edits
+    if await asyncio.to_thread(workspace_fingerprints.fingerprint, project_path, files) == files_hash:
+        try:
+            await asyncio.to_thread(response_cache.put, cache_key, {"sparc_output": processed_output})
+        except OSError as e:
+            logger.error(f"Error caching response for template {config.template}: {e}")
+
     return {
         "project_name": config.project_name,
         "user_id": config.user_id,
         "sparc_output": processed_output,
-        "estimated_cost": estimated_cost
+        "estimated_cost": estimated_cost,
+        "cached": False,
+        "context": packed.stats() if packed else None
     }
 
 @code_bot_router.post("/architect")
-async def architect_mode(config: ArchitectConfig, db: Session = Depends(get_db)):
+async def architect_mode(config: ArchitectConfig, db: Session = Depends(get_db), cache: Optional[str] = Query(None, description="Set to 'bypass' to skip the response cache")):
     sparc_config = SPARCConfig(
         project_name=config.project_name,
         user_id=config.user_id,
@@ -250,10 +299,10 @@ async def architect_mode(config: ArchitectConfig, db: Session = Depends(get_db))
             "requirements": config.requirements
         }
     )
-    return await sparc_task(sparc_config, db)
+    return await sparc_task(sparc_config, db, cache=cache)
 
 @code_bot_router.post("/code-review")
-async def code_review(config: CodeReviewConfig, db: Session = Depends(get_db)):
+async def code_review(config: CodeReviewConfig, db: Session = Depends(get_db), cache: Optional[str] = Query(None, description="Set to 'bypass' to skip the response cache")):
     sparc_config = SPARCConfig(
         project_name=config.project_name,
         user_id=config.user_id,
@@ -262,10 +311,10 @@ async def code_review(config: CodeReviewConfig, db: Session = Depends(get_db)):
             "files": ",".join(config.files)
         }
     )
-    return await sparc_task(sparc_config, db)
+    return await sparc_task(sparc_config, db, cache=cache)
 
 @code_bot_router.post("/bug-fix")
-async def bug_fix(config: BugFixConfig, db: Session = Depends(get_db)):
+async def bug_fix(config: BugFixConfig, db: Session = Depends(get_db), cache: Optional[str] = Query(None, description="Set to 'bypass' to skip the response cache")):
     sparc_config = SPARCConfig(
         project_name=config.project_name,
         user_id=config.user_id,
@@ -275,10 +324,10 @@ async def bug_fix(config: BugFixConfig, db: Session = Depends(get_db)):
             "files": ",".join(config.files)
         }
     )
-    return await sparc_task(sparc_config, db)
+    return await sparc_task(sparc_config, db, cache=cache)
 
 @code_bot_router.post("/framework")
-async def framework_task(config: FrameworkConfig, db: Session = Depends(get_db)):
+async def framework_task(config: FrameworkConfig, db: Session = Depends(get_db), cache: Optional[str] = Query(None, description="Set to 'bypass' to skip the response cache")):
     sparc_config = SPARCConfig(
         project_name=config.project_name,
         user_id=config.user_id,
@@ -289,10 +338,10 @@ async def framework_task(config: FrameworkConfig, db: Session = Depends(get_db))
             "details": config.details
         }
     )
-    return await sparc_task(sparc_config, db)
+    return await sparc_task(sparc_config, db, cache=cache)
 
 @code_bot_router.post("/application")
-async def application_task(config: ApplicationConfig, db: Session = Depends(get_db)):
+async def application_task(config: ApplicationConfig, db: Session = Depends(get_db), cache: Optional[str] = Query(None, description="Set to 'bypass' to skip the response cache")):
     sparc_config = SPARCConfig(
         project_name=config.project_name,
         user_id=config.user_id,
@@ -302,10 +351,10 @@ async def application_task(config: ApplicationConfig, db: Session = Depends(get_
             "requirements": config.requirements
         }
     )
-    return await sparc_task(sparc_config, db)
+    return await sparc_task(sparc_config, db, cache=cache)
 
 @code_bot_router.post("/language")
-async def language_task(config: LanguageConfig, db: Session = Depends(get_db)):
+async def language_task(config: LanguageConfig, db: Session = Depends(get_db), cache: Optional[str] = Query(None, description="Set to 'bypass' to skip the response cache")):
     sparc_config = SPARCConfig(
         project_name=config.project_name,
         user_id=config.user_id,
@@ -316,10 +365,10 @@ async def language_task(config: LanguageConfig, db: Session = Depends(get_db)):
             "files": ",".join(config.files)
         }
     )
-    return await sparc_task(sparc_config, db)
+    return await sparc_task(sparc_config, db, cache=cache)
 
 @code_bot_router.post("/code-management")
-async def code_management_task(config: CodeManagementConfig, db: Session = Depends(get_db)):
+async def code_management_task(config: CodeManagementConfig, db: Session = Depends(get_db), cache: Optional[str] = Query(None, description="Set to 'bypass' to skip the response cache")):
     sparc_config = SPARCConfig(
         project_name=config.project_name,
         user_id=config.user_id,
@@ -329,7 +378,7 @@ async def code_management_task(config: CodeManagementConfig, db: Session = Depen
             "files": ",".join(config.files)
         }
     )
-    return await sparc_task(sparc_config, db)
+    return await sparc_task(sparc_config, db, cache=cache)
 
 # Include the code_bot_router in the main router
 router.include_router(code_bot_router, prefix="/code-bot", tags=["Code Bot Capabilities"])
@@ -1,33 +1,167 @@
 # agentic_platform/agentic_platform/api/cost_summary.py
-from fastapi import APIRouter, Depends
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import Optional
-from ..crud import get_db
+from ..crud import get_db, ensure_cost_rollup_table, rollup_bucket_start
+from ..models import Project, CostRollup
+from ..utils import streaming_export
 
 router = APIRouter()
 
+GROUP_BY_OPTIONS = ("user", "project", "day")
+
 @router.get("/cost-summary")
-async def get_cost_summary(project_name: Optional[str] = None, user_id: Optional[str] = None, db: Session = Depends(get_db)):
-    from ..models import Project
-    query = db.query(Project)
-    if project_name:
-        query = query.filter(Project.name == project_name)
-    if user_id:
-        query = query.filter(Project.user_id == user_id)
-    
-    projects = query.all()
-    
+async def get_cost_summary(
+    project_name: Optional[str] = None,
+    user_id: Optional[str] = None,
+    group_by: Optional[str] = Query(None, description="Aggregate costs by 'user', 'project' or 'day'"),
+    from_: Optional[datetime] = Query(None, alias="from", description="Only include costs recorded at or after this time (UTC)"),
+    to: Optional[datetime] = Query(None, description="Only include costs recorded before this time (UTC)"),
+    format: str = Query("json", description="Response format: json, ndjson or csv"),
+    db: Session = Depends(get_db)
+):
+    if group_by and group_by not in GROUP_BY_OPTIONS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(GROUP_BY_OPTIONS)}")
+
+    # Lifetime totals are kept on the project rows; anything time-bounded or
+    # bucketed by day is answered from the rollup tables.
+    use_rollups = from_ is not None or to is not None or group_by == "day"
+    granularity = rollup_granularity(group_by, from_, to) if use_rollups else None
+
+    def build_rows(session: Session):
+        if use_rollups:
+            return rollup_cost_rows(session, project_name, user_id, group_by, from_, to, granularity)
+        return project_cost_rows(session, project_name, user_id, group_by)
+
+    if format != "json":
+        if use_rollups:
+            ensure_cost_rollup_table(db)
+        return streaming_export(build_rows, format, "cost-summary")
+
+    if not use_rollups:
+        total_cost = db.query(func.coalesce(func.sum(Project.total_cost), 0.0)).filter(
+            *project_filters(project_name, user_id)
+        ).scalar()
+        rows = [dict(row._mapping) for row in build_rows(db)]
+        if group_by:
+            return {"total_cost": total_cost, "group_by": group_by, "groups": rows}
+        return {"total_cost": total_cost, "projects": rows}
+
+    ensure_cost_rollup_table(db)
+    total_cost, total_events = rollup_query(
+        db, project_name, user_id, group_by, from_, to, granularity,
+        func.coalesce(func.sum(CostRollup.total_cost), 0.0),
+        func.coalesce(func.sum(CostRollup.event_count), 0)
+    ).one()
     summary = {
-        "total_cost": sum(project.total_cost for project in projects),
-        "projects": [
-            {
-                "name": project.name,
-                "user_id": project.user_id,
-                "cost": project.total_cost,
-                "last_updated": project.last_updated
-            }
-            for project in projects
-        ]
+        "total_cost": total_cost,
+        "events": total_events,
+        "granularity": granularity,
+        "from": from_,
+        "to": to
     }
-    
+    if group_by:
+        summary["group_by"] = group_by
+        summary["groups"] = [dict(row._mapping) for row in build_rows(db)]
     return summary
+
+def project_filters(project_name: Optional[str], user_id: Optional[str]):
+    filters = []
+    if project_name:
+        filters.append(Project.name == project_name)
+    if user_id:
+        filters.append(Project.user_id == user_id)
+    return filters
+
+def project_cost_rows(db: Session, project_name: Optional[str], user_id: Optional[str], group_by: Optional[str]):
+    filters = project_filters(project_name, user_id)
+
+    if group_by == "user":
+        cost = func.coalesce(func.sum(Project.total_cost), 0.0)
+        return (
+            db.query(Project.user_id, cost.label("cost"), func.count(Project.id).label("projects"))
+            .filter(*filters)
+            .group_by(Project.user_id)
+            .order_by(cost.desc())
+        )
+
+    cost = func.coalesce(Project.total_cost, 0.0).label("cost")
+    if group_by == "project":
+        columns = (Project.id.label("project_id"), Project.name, Project.user_id, cost)
+    else:
+        columns = (Project.name, Project.user_id, cost, Project.updated_at.label("last_updated"))
+    return db.query(*columns).filter(*filters).order_by(Project.total_cost.desc())
+
+def rollup_granularity(group_by: Optional[str], from_: Optional[datetime], to: Optional[datetime]) -> str:
+    if group_by == "day":
+        return "day"
+    for bound in (from_, to):
+        if bound is not None and bound != rollup_bucket_start(bound, "day"):
+            return "hour"
+    return "day"
+
+def rollup_query(
+    db: Session,
+    project_name: Optional[str],
+    user_id: Optional[str],
+    group_by: Optional[str],
+    from_: Optional[datetime],
+    to: Optional[datetime],
+    granularity: str,
+    *columns
+):
+    # Bounds are rounded down to the bucket they fall in
+    query = db.query(*columns)
+    if project_name:
+        query = query.join(Project, CostRollup.project_id == Project.id).filter(Project.name == project_name)
+    elif group_by == "project":
+        # Rollups outlive removed projects, which then group without a name
+        query = query.outerjoin(Project, CostRollup.project_id == Project.id)
+    query = query.filter(CostRollup.granularity == granularity)
+    if from_ is not None:
+        query = query.filter(CostRollup.bucket_start >= rollup_bucket_start(from_, granularity))
+    if to is not None:
+        query = query.filter(CostRollup.bucket_start < to)
+    if user_id:
+        query = query.filter(CostRollup.user_id == user_id)
+    return query
+
+def rollup_cost_rows(
+    db: Session,
+    project_name: Optional[str],
+    user_id: Optional[str],
+    group_by: Optional[str],
+    from_: Optional[datetime],
+    to: Optional[datetime],
+    granularity: str
+):
+    cost = func.coalesce(func.sum(CostRollup.total_cost), 0.0)
+    events = func.coalesce(func.sum(CostRollup.event_count), 0)
+
+    def grouped(*keys):
+        return rollup_query(
+            db, project_name, user_id, group_by, from_, to, granularity,
+            *keys, cost.label("cost"), events.label("events")
+        )
+
+    if group_by == "user":
+        return grouped(CostRollup.user_id).group_by(CostRollup.user_id).order_by(cost.desc())
+    if group_by == "project":
+        return (
+            grouped(CostRollup.project_id, Project.name, CostRollup.user_id)
+            .group_by(CostRollup.project_id, Project.name, CostRollup.user_id)
+            .order_by(cost.desc())
+        )
+    if group_by == "day":
+        return (
+            grouped(func.date(CostRollup.bucket_start).label("day"))
+            .group_by(CostRollup.bucket_start)
+            .order_by(CostRollup.bucket_start)
+        )
+    return grouped(
+        CostRollup.project_id, CostRollup.user_id, CostRollup.bucket_start
+    ).group_by(
+        CostRollup.project_id, CostRollup.user_id, CostRollup.bucket_start
+    ).order_by(CostRollup.bucket_start)
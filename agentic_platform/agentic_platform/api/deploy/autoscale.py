@@ -0,0 +1,379 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from typing import Optional
+from .fly_config import DEFAULT_FLY_PROFILE, FLY_PROFILES
+from .utils import execute_command
+
+logger = logging.getLogger(__name__)
+
+AUTOSCALE_INTERVAL = float(os.environ.get("AUTOSCALE_INTERVAL", "15"))
+AUTOSCALE_WINDOW = int(os.environ.get("AUTOSCALE_WINDOW", "20"))
+AUTOSCALE_MIN_SAMPLES = int(os.environ.get("AUTOSCALE_MIN_SAMPLES", "5"))
+AUTOSCALE_HEALTH_PATH = os.environ.get("AUTOSCALE_HEALTH_PATH", "/health")
+# "logs" parses each preview's recent flyctl log lines; "health" probes its health endpoint
+# through the Fly proxy, which keeps auto-stopped machines awake, so it has to be opted in
+AUTOSCALE_SOURCE = os.environ.get("AUTOSCALE_SOURCE", "logs")
+AUTOSCALE_TIMEOUT = float(os.environ.get("AUTOSCALE_TIMEOUT", "5"))
+AUTOSCALE_APPLY = os.environ.get("AUTOSCALE_APPLY", "false").lower() in ("1", "true", "yes")
+AUTOSCALE_MAX_MACHINES = int(os.environ.get("AUTOSCALE_MAX_MACHINES", "4"))
+AUTOSCALE_LATENCY_TARGET_MS = float(os.environ.get("AUTOSCALE_LATENCY_TARGET_MS", "500"))
+AUTOSCALE_COOLDOWN = float(os.environ.get("AUTOSCALE_COOLDOWN", "300"))
+
+# Utilization of the soft limit (p90 concurrency per machine) that counts as pressure or slack
+SCALE_UP_UTILIZATION = 0.8
+SCALE_DOWN_UTILIZATION = 0.3
+# Consecutive evaluations with the same signal before acting; scaling in waits
+# longer than scaling out so a short lull does not undo a scale-out
+SCALE_UP_STREAK = 3
+SCALE_DOWN_STREAK = 6
+
+# VM sizes in increasing order, as (flyctl size name, cpu_kind, cpus, memory_mb)
+VM_LADDER = [
+    ("shared-cpu-1x", "shared", 1, 256),
+    ("shared-cpu-1x", "shared", 1, 512),
+    ("shared-cpu-1x", "shared", 1, 1024),
+    ("shared-cpu-1x", "shared", 1, 2048),
+    ("shared-cpu-2x", "shared", 2, 2048),
+    ("shared-cpu-4x", "shared", 4, 4096),
+    ("performance-2x", "performance", 2, 4096),
+    ("performance-4x", "performance", 4, 8192),
+]
+
+CONCURRENCY_KEYS = ("in_flight", "inflight", "concurrency", "active_requests", "concurrent_requests")
+LATENCY_KEYS = {
+    "latency_ms": 1.0, "duration_ms": 1.0, "response_time_ms": 1.0,
+    "latency": 1000.0, "duration": 1000.0, "response_time": 1000.0,
+}
+LOGFMT_PATTERN = re.compile(r"(\w+)=(\"[^\"]*\"|\S+)")
+DURATION_PATTERN = re.compile(r"^([\d.]+)(ms|s|µs|us)?$")
+DURATION_UNITS = {"ms": 1.0, "s": 1000.0, "us": 0.001, "µs": 0.001, None: None}
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _latency_ms(key, value):
+    if isinstance(value, str):
+        match = DURATION_PATTERN.match(value.strip())
+        if not match:
+            return None
+        number, unit = float(match.group(1)), match.group(2)
+        return number * (DURATION_UNITS[unit] or LATENCY_KEYS[key])
+    number = _number(value)
+    return None if number is None else number * LATENCY_KEYS[key]
+
+def read_metrics(payload):
+    """
+    Picks concurrency and latency out of a health or log payload.
+
+    Recognizes ``in_flight``/``concurrency``-style keys and ``latency``/``duration``
+    keys, at the top level or under ``metrics``. Values without a unit are
+    milliseconds for ``*_ms`` keys and seconds otherwise.
+
+    Returns:
+        tuple: (concurrency or None, latency in ms or None)
+    """
+    if not isinstance(payload, dict):
+        return None, None
+    scopes = [payload] + ([payload["metrics"]] if isinstance(payload.get("metrics"), dict) else [])
+    concurrency = latency = None
+    for scope in scopes:
+        for key in CONCURRENCY_KEYS:
+            if concurrency is None and key in scope:
+                concurrency = _number(scope[key])
+        for key in LATENCY_KEYS:
+            if latency is None and key in scope:
+                latency = _latency_ms(key, scope[key])
+    return concurrency, latency
+
+def parse_log_line(line: str):
+    """Metrics from one JSON or logfmt log line, e.g. ``method=GET in_flight=7 duration=42ms``."""
+    line = line.strip()
+    payload = None
+    if line.startswith("{"):
+        try:
+            payload = json.loads(line)
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict) and isinstance(payload.get("message"), str) and "=" in payload["message"]:
+            # flyctl logs --json wraps the application's line in "message"
+            return parse_log_line(payload["message"])
+    if payload is None:
+        payload = {key: value.strip('"') for key, value in LOGFMT_PATTERN.findall(line)}
+    return read_metrics(payload)
+
+class Sample:
+    def __init__(self, timestamp, concurrency, latency_ms, ok):
+        self.timestamp = timestamp
+        self.concurrency = concurrency
+        self.latency_ms = latency_ms
+        self.ok = ok
+
+class PreviewScale:
+    """What the advisor knows about one preview: its limits, size and recent samples."""
+
+    def __init__(self, app_name, url, profile_name, memory=None, machines=1, source=AUTOSCALE_SOURCE):
+        profile = FLY_PROFILES[profile_name]
+        self.app_name = app_name
+        self.url = url
+        self.source = source
+        self.profile = profile_name
+        self.soft_limit = profile["soft_limit"]
+        self.hard_limit = profile["hard_limit"]
+        self.min_machines = max(1, profile.get("min_machines_running", 0))
+        self.machines = max(machines, self.min_machines)
+        self.base_vm = self.vm = _ladder_index(profile["cpu_kind"], profile["cpus"], memory or profile["memory_mb"])
+        self.samples = deque(maxlen=AUTOSCALE_WINDOW)
+        self.log_lines = set()
+        self.up_streak = 0
+        self.down_streak = 0
+        self.last_change = None
+        self.recommendation = None
+        self.history = deque(maxlen=50)
+
+def _ladder_index(cpu_kind, cpus, memory):
+    """The smallest ladder size at least as large as the given VM."""
+    for index, (_, kind, size_cpus, size_memory) in enumerate(VM_LADDER):
+        if (kind == cpu_kind or cpu_kind == "shared") and size_cpus >= cpus and size_memory >= memory:
+            return index
+    return len(VM_LADDER) - 1
+
+def _vm(index):
+    name, kind, cpus, memory = VM_LADDER[index]
+    return {"size": name, "cpu_kind": kind, "cpus": cpus, "memory_mb": memory}
+
+def _fetch_health(url, timeout):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            body = response.read(65536)
+            ok = 200 <= response.status < 300
+    except urllib.error.HTTPError as e:
+        body, ok = b"", False
+        logger.debug(f"Health check {url} returned {e.code}")
+    except (urllib.error.URLError, OSError) as e:
+        logger.debug(f"Health check {url} failed: {e}")
+        return None, None, False
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    try:
+        payload = json.loads(body.decode("utf-8")) if body else None
+    except (UnicodeDecodeError, ValueError):
+        payload = None
+    concurrency, latency_ms = read_metrics(payload)
+    # The app's own latency figure wins over the probe's round trip
+    return concurrency, latency_ms if latency_ms is not None else elapsed_ms, ok
+
+class ScalingAdvisor:
+    """
+    Samples preview concurrency and latency, and recommends (or, with
+    ``AUTOSCALE_APPLY``, applies) machine count and VM size changes.
+
+    A change needs the same signal for several consecutive evaluations and is
+    followed by a cooldown, so noisy samples do not make the scale flap.
+    """
+
+    def __init__(self, execute=execute_command, fetch=_fetch_health, apply=AUTOSCALE_APPLY,
+                 interval=AUTOSCALE_INTERVAL, clock=time.monotonic):
+        self.previews = {}
+        self.execute = execute
+        self.fetch = fetch
+        self.apply_changes = apply
+        self.interval = interval
+        self.clock = clock
+        self._task = None
+
+    def register(self, app_name: str, url: str, profile: str = DEFAULT_FLY_PROFILE,
+                 memory: Optional[int] = None, machines: int = 1, source: str = AUTOSCALE_SOURCE):
+        self.previews[app_name] = PreviewScale(app_name, url.rstrip("/"), profile, memory, machines, source)
+        return self.previews[app_name]
+
+    def unregister(self, app_name: str):
+        self.previews.pop(app_name, None)
+
+    def record(self, app_name, concurrency=None, latency_ms=None, ok=True):
+        preview = self.previews[app_name]
+        preview.samples.append(Sample(time.time(), concurrency, latency_ms, ok))
+
+    def ingest_log_lines(self, app_name, lines):
+        """Records a sample for every log line that carries concurrency or latency."""
+        recorded = 0
+        for line in lines:
+            concurrency, latency_ms = parse_log_line(line)
+            if concurrency is not None or latency_ms is not None:
+                self.record(app_name, concurrency, latency_ms)
+                recorded += 1
+        return recorded
+
+    async def sample(self, app_name):
+        preview = self.previews[app_name]
+        if preview.source == "logs":
+            output = await self.execute(["flyctl", "logs", "--app", app_name, "--no-tail"])
+            # Only lines since the last sample; flyctl returns a fixed backlog every time
+            lines = output.splitlines()
+            seen = preview.log_lines
+            preview.log_lines = set(lines)
+            self.ingest_log_lines(app_name, [line for line in lines if line not in seen])
+            return
+        concurrency, latency_ms, ok = await asyncio.to_thread(
+            self.fetch, preview.url + AUTOSCALE_HEALTH_PATH, AUTOSCALE_TIMEOUT
+        )
+        self.record(app_name, concurrency, latency_ms, ok)
+
+    def _signals(self, preview):
+        samples = list(preview.samples)
+        concurrency = [s.concurrency for s in samples if s.concurrency is not None]
+        latency = [s.latency_ms for s in samples if s.latency_ms is not None]
+        failures = sum(1 for s in samples if not s.ok)
+        p90_concurrency = _percentile(concurrency, 0.9)
+        utilization = None if p90_concurrency is None else p90_concurrency / preview.soft_limit
+        return {
+            "samples": len(samples),
+            "failures": failures,
+            "p90_concurrency": p90_concurrency,
+            "p50_latency_ms": _percentile(latency, 0.5),
+            "p90_latency_ms": _percentile(latency, 0.9),
+            "utilization": None if utilization is None else round(utilization, 3),
+        }
+
+    def evaluate(self, app_name):
+        """
+        Updates the hysteresis counters from the current window and returns
+        the recommendation: ``action`` is "hold", "scale_out", "scale_in",
+        "scale_up" or "scale_down", with the target ``machines`` and ``vm``.
+        """
+        preview = self.previews[app_name]
+        signals = self._signals(preview)
+        utilization, latency = signals["utilization"], signals["p90_latency_ms"]
+        pressure = slack = False
+        reason = "Not enough samples"
+        if signals["samples"] >= AUTOSCALE_MIN_SAMPLES and (utilization is not None or latency is not None):
+            busy = utilization is not None and utilization > SCALE_UP_UTILIZATION
+            slow = latency is not None and latency > AUTOSCALE_LATENCY_TARGET_MS
+            pressure = busy or slow
+            slack = not pressure and (utilization is None or utilization < SCALE_DOWN_UTILIZATION) \
+                and (latency is None or latency < AUTOSCALE_LATENCY_TARGET_MS / 2)
+            reason = "Within limits"
+        preview.up_streak = preview.up_streak + 1 if pressure else 0
+        preview.down_streak = preview.down_streak + 1 if slack else 0
+
+        action, machines, vm = "hold", preview.machines, preview.vm
+        cooling = preview.last_change is not None and self.clock() - preview.last_change < AUTOSCALE_COOLDOWN
+        if pressure:
+            reason = f"p90 concurrency at {utilization:.0%} of the soft limit" if busy else \
+                f"p90 latency {latency:.0f}ms over the {AUTOSCALE_LATENCY_TARGET_MS:.0f}ms target"
+            if preview.up_streak >= SCALE_UP_STREAK and not cooling:
+                # Many concurrent requests need more machines; slow requests at
+                # low concurrency need a bigger machine
+                if busy and preview.machines < AUTOSCALE_MAX_MACHINES:
+                    action, machines = "scale_out", preview.machines + 1
+                elif preview.vm < len(VM_LADDER) - 1:
+                    action, vm = "scale_up", preview.vm + 1
+        elif slack:
+            reason = "Sustained low concurrency and latency"
+            if preview.down_streak >= SCALE_DOWN_STREAK and not cooling:
+                if preview.machines > preview.min_machines:
+                    action, machines = "scale_in", preview.machines - 1
+                elif preview.vm > preview.base_vm:
+                    action, vm = "scale_down", preview.vm - 1
+        if action == "hold" and cooling and (pressure or slack):
+            reason += "; cooling down after the last change"
+
+        preview.recommendation = {
+            "action": action,
+            "reason": reason,
+            "machines": machines,
+            "vm": _vm(vm),
+            "signals": signals,
+            "streaks": {"up": preview.up_streak, "down": preview.down_streak},
+        }
+        return preview.recommendation
+
+    async def apply(self, app_name, recommendation=None):
+        """Runs the flyctl command for a recommendation and records the new scale."""
+        preview = self.previews[app_name]
+        recommendation = recommendation or preview.recommendation
+        if not recommendation or recommendation["action"] == "hold":
+            return None
+        if recommendation["action"] in ("scale_out", "scale_in"):
+            command = ["flyctl", "scale", "count", str(recommendation["machines"]), "--app", app_name, "--yes"]
+        else:
+            vm = recommendation["vm"]
+            command = ["flyctl", "scale", "vm", vm["size"], "--vm-memory", str(vm["memory_mb"]), "--app", app_name]
+        await self.execute(command)
+        preview.machines = recommendation["machines"]
+        preview.vm = next(
+            index for index, size in enumerate(VM_LADDER)
+            if size[0] == recommendation["vm"]["size"] and size[3] == recommendation["vm"]["memory_mb"]
+        )
+        preview.last_change = self.clock()
+        preview.up_streak = preview.down_streak = 0
+        # Samples taken at the old size say nothing about the new one
+        preview.samples.clear()
+        preview.history.append({"timestamp": time.time(), "command": " ".join(command), **recommendation})
+        logger.info(f"Autoscaled {app_name}: {recommendation['action']} ({recommendation['reason']})")
+        return command
+
+    async def tick(self):
+        for app_name in list(self.previews):
+            try:
+                await self.sample(app_name)
+                recommendation = self.evaluate(app_name)
+                if self.apply_changes and recommendation["action"] != "hold":
+                    await self.apply(app_name, recommendation)
+            except KeyError:
+                # Unregistered while sampling
+                continue
+            except Exception as e:
+                logger.error(f"Error autoscaling {app_name}: {e}")
+
+    async def _loop(self):
+        while True:
+            await self.tick()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def report(self, app_name=None):
+        names = [app_name] if app_name else sorted(self.previews)
+        return {
+            name: {
+                "url": preview.url,
+                "profile": preview.profile,
+                "source": preview.source,
+                "machines": preview.machines,
+                "vm": _vm(preview.vm),
+                "limits": {"soft_limit": preview.soft_limit, "hard_limit": preview.hard_limit},
+                "recommendation": preview.recommendation,
+                "history": list(preview.history),
+            }
+            for name in names
+            for preview in [self.previews[name]]
+        }
+
+scaling_advisor = ScalingAdvisor()
@@ -0,0 +1,233 @@
+import logging
+import os
+import shutil
+import uuid
+from typing import List
+from .explorer import list_tree
+from .files import read_inline_content
+from .patch import PatchError, apply_hunks, parse_unified_diff
+from ...utils.trash import trash_bin
+
+logger = logging.getLogger(__name__)
+
+BATCH_ACTIONS = ("explore", "modify", "create", "remove", "patch")
+
+class _Overlay:
+    """The repository as the operations so far have left it, without touching disk."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.files = {}  # key: relative path, value: new content
+        self.removed = set()
+
+    def _removed(self, relative_path):
+        path = relative_path
+        while path:
+            if path in self.removed:
+                return True
+            path = os.path.dirname(path)
+        return False
+
+    def exists(self, relative_path):
+        if relative_path in self.files:
+            return True
+        if self._removed(relative_path):
+            return False
+        return os.path.lexists(os.path.join(self.root, relative_path))
+
+    def is_dir(self, relative_path):
+        if relative_path in self.files or self._removed(relative_path):
+            return False
+        return os.path.isdir(os.path.join(self.root, relative_path))
+
+    def read(self, relative_path):
+        if relative_path in self.files:
+            return self.files[relative_path]
+        if self._removed(relative_path):
+            raise FileNotFoundError(relative_path)
+        with open(os.path.join(self.root, relative_path), "r", encoding="utf-8", newline="") as f:
+            return f.read()
+
+    def write(self, relative_path, content):
+        parent = os.path.dirname(relative_path)
+        while parent:
+            if self.exists(parent) and not self.is_dir(parent):
+                raise ValueError(f"Parent path is not a directory: {parent}")
+            parent = os.path.dirname(parent)
+        self.files[relative_path] = content
+
+    def remove(self, relative_path):
+        prefix = relative_path + "/"
+        for path in [path for path in self.files if path == relative_path or path.startswith(prefix)]:
+            del self.files[path]
+        self.removed.add(relative_path)
+
+def _relative(root: str, path: str) -> str:
+    full_path = os.path.realpath(os.path.join(root, path or ""))
+    if os.path.commonpath([root, full_path]) != root or full_path == root:
+        raise ValueError("Path must be a file or directory inside the repository")
+    relative_path = os.path.relpath(full_path, root).replace(os.sep, "/")
+    if relative_path.split("/")[0] == ".git":
+        raise ValueError("Paths inside .git cannot be changed")
+    return relative_path
+
+def _plan(root: str, operations: List[dict]):
+    """
+    Runs the operations against the overlay until one fails.
+
+    Returns:
+        tuple: Per-operation results, the ordered disk changes and the index of
+        the failed operation (None if all succeeded).
+    """
+    overlay = _Overlay(root)
+    results = []
+    changes = []  # ("write", relative path, content) or ("remove", relative path)
+
+    for index, operation in enumerate(operations):
+        action = operation.get("action")
+        try:
+            if action not in BATCH_ACTIONS:
+                raise ValueError(f"Invalid action: {action}")
+
+            if action == "patch":
+                patches = parse_unified_diff(operation.get("diff") or "", operation.get("path") or None)
+                paths = []
+                for file_patch in patches:
+                    relative_path = _relative(root, file_patch.path)
+                    if file_patch.is_new:
+                        if overlay.exists(relative_path):
+                            raise ValueError(f"File already exists: {relative_path}")
+                        original = ""
+                    else:
+                        if not overlay.exists(relative_path) or overlay.is_dir(relative_path):
+                            raise ValueError(f"File does not exist: {relative_path}")
+                        original = overlay.read(relative_path)
+                    patched = apply_hunks(original, file_patch.hunks)
+                    if file_patch.is_deleted:
+                        if patched:
+                            raise ValueError(f"Deletion patch leaves content in {relative_path}")
+                        overlay.remove(relative_path)
+                        changes.append(("remove", relative_path))
+                    else:
+                        overlay.write(relative_path, patched)
+                        changes.append(("write", relative_path, patched))
+                    paths.append(relative_path)
+                results.append({"index": index, "action": action, "status": "ok", "paths": paths,
+                                "hunks": sum(len(file_patch.hunks) for file_patch in patches)})
+                continue
+
+            relative_path = _relative(root, operation.get("path"))
+            result = {"index": index, "action": action, "path": relative_path, "status": "ok"}
+
+            if action == "explore":
+                if not overlay.exists(relative_path):
+                    raise FileNotFoundError("Path does not exist")
+                if relative_path in overlay.files:
+                    content = overlay.files[relative_path]
+                    result.update({"type": "file", "binary": False, "size": len(content.encode()), "content": content})
+                elif overlay.is_dir(relative_path):
+                    # Directory listings show the repository as it was before the batch
+                    result.update({"type": "directory", **list_tree(root, relative_path)})
+                else:
+                    result.update(read_inline_content(os.path.join(root, relative_path)))
+            elif action in ("modify", "create"):
+                if overlay.is_dir(relative_path):
+                    raise ValueError("Path is a directory")
+                content = operation.get("content") or ""
+                overlay.write(relative_path, content)
+                changes.append(("write", relative_path, content))
+            elif action == "remove":
+                if not overlay.exists(relative_path):
+                    raise FileNotFoundError("Path does not exist")
+                overlay.remove(relative_path)
+                changes.append(("remove", relative_path))
+            results.append(result)
+        except (ValueError, PatchError, OSError) as e:
+            message = "Path does not exist" if isinstance(e, FileNotFoundError) else str(e)
+            results.append({"index": index, "action": action, "status": "error", "detail": message})
+            results.extend(
+                {"index": skipped, "action": operations[skipped].get("action"), "status": "skipped"}
+                for skipped in range(index + 1, len(operations))
+            )
+            return results, changes, index
+    return results, changes, None
+
+def _commit(root: str, staging: str, changes):
+    """
+    Stages every new file, then renames them into place in order. Replaced and
+    removed paths are moved into ``staging`` first so a failure can be undone.
+    """
+    staged = []
+    for number, change in enumerate(changes):
+        if change[0] == "write":
+            staged_path = os.path.join(staging, "new", str(number))
+            os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+            with open(staged_path, "w", encoding="utf-8", newline="") as f:
+                f.write(change[2])
+            staged.append(staged_path)
+        else:
+            staged.append(None)
+
+    undo = []
+    try:
+        for number, change in enumerate(changes):
+            target = os.path.join(root, change[1])
+            backup = os.path.join(staging, "old", str(number))
+            if os.path.lexists(target):
+                os.makedirs(os.path.dirname(backup), exist_ok=True)
+                os.rename(target, backup)
+                undo.append(("restore", target, backup))
+            if change[0] == "write":
+                parent = os.path.dirname(target)
+                if not os.path.isdir(parent):
+                    missing = parent
+                    while not os.path.isdir(os.path.dirname(missing)):
+                        missing = os.path.dirname(missing)
+                    os.makedirs(parent)
+                    undo.append(("rmtree", missing, None))
+                os.rename(staged[number], target)
+                undo.append(("unlink", target, None))
+    except OSError:
+        for kind, target, backup in reversed(undo):
+            try:
+                if kind == "unlink":
+                    os.remove(target)
+                elif kind == "rmtree":
+                    shutil.rmtree(target, ignore_errors=True)
+                else:
+                    os.rename(backup, target)
+            except OSError as e:
+                logger.error(f"Error rolling back {target}: {e}")
+        raise
+
+def apply_batch(root: str, operations: List[dict]):
+    """
+    Applies file operations to the repository at ``root`` all or nothing.
+
+    Operations run in order against an in-memory view, so later operations see
+    the effect of earlier ones. If all succeed, the new files are written to a
+    staging directory next to the repository and renamed into place; otherwise
+    nothing on disk changes.
+
+    Args:
+        root (str): Repository directory.
+        operations (list): Dicts with action (explore, modify, create, remove or
+            patch), path, content and, for patch, a unified diff.
+
+    Returns:
+        dict: Whether the batch was applied, the index of the operation that
+        stopped it if not, and the result of each operation.
+    """
+    root = os.path.realpath(root)
+    results, changes, failed = _plan(root, operations)
+    if failed is not None:
+        return {"applied": False, "failed": failed, "changed": 0, "results": results}
+
+    if changes:
+        staging = os.path.join(os.path.dirname(root), f".{os.path.basename(root)}.staging-{uuid.uuid4().hex}")
+        try:
+            _commit(root, staging, changes)
+        finally:
+            if os.path.lexists(staging):
+                trash_bin.discard(staging)
+    return {"applied": True, "changed": len(changes), "results": results}
@@ -0,0 +1,110 @@
+import os
+import re
+import shutil
+import subprocess
+import time
+from ...utils.ignore import DockerignoreRules
+
+# Always part of the context: the builder reads them even when untracked,
+# and deploy_app may have just written fly.toml
+CONTEXT_REQUIRED_FILES = ["Dockerfile", ".dockerignore", "fly.toml"]
+
+# BuildKit progress line for the context upload, e.g. "#5 transferring context: 35.53MB 2.1s done"
+TRANSFER_PATTERN = re.compile(r"transferring context:\s*([\d.]+)\s*([kMG]?B)\s+([\d.]+)s")
+TRANSFER_UNITS = {"B": 1, "kB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3}
+
+def tracked_files(repo_dir):
+    """
+    Files git tracks in ``repo_dir``, or every file outside ``.git`` when it is
+    not a git checkout.
+
+    Returns:
+        list: Paths relative to ``repo_dir``, "/"-separated.
+    """
+    try:
+        output = subprocess.run(
+            ["git", "ls-files", "-z", "--cached"], cwd=repo_dir, check=True,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        ).stdout
+        return [path for path in output.decode("utf-8", errors="surrogateescape").split("\0") if path]
+    except (OSError, subprocess.CalledProcessError):
+        files = []
+        for directory, dirnames, filenames in os.walk(repo_dir):
+            dirnames[:] = [name for name in dirnames if name != ".git"]
+            relative_dir = os.path.relpath(directory, repo_dir)
+            for name in filenames:
+                path = name if relative_dir == "." else os.path.join(relative_dir, name)
+                files.append(path.replace(os.sep, "/"))
+        return files
+
+def _link(source, target):
+    """Hardlinks ``source`` to ``target``, copying when a link is not possible (e.g. across filesystems)."""
+    if os.path.islink(source):
+        os.symlink(os.readlink(source), target)
+        return "symlink"
+    try:
+        os.link(source, target)
+        return "link"
+    except OSError:
+        shutil.copy2(source, target)
+        return "copy"
+
+def stage_build_context(repo_dir: str, staging_dir: str, dockerfile: str = "Dockerfile"):
+    """
+    Materializes the minimal build context of ``repo_dir`` in ``staging_dir``:
+    git-tracked files minus the ``.dockerignore`` patterns, never ``.git``.
+    Files are hardlinked, so staging costs no data copies on the same filesystem.
+
+    Args:
+        repo_dir (str): The checkout to deploy.
+        staging_dir (str): Directory to create; must not exist.
+        dockerfile (str): Dockerfile path relative to ``repo_dir``; always staged.
+
+    Returns:
+        dict: Files and bytes staged, files and bytes left out, how files
+        were staged and the time it took.
+    """
+    started = time.perf_counter()
+    rules = DockerignoreRules.from_file(os.path.join(repo_dir, ".dockerignore"))
+    required = set(CONTEXT_REQUIRED_FILES) | {dockerfile.replace(os.sep, "/")}
+    candidates = set(tracked_files(repo_dir)) | {
+        path for path in required if os.path.lexists(os.path.join(repo_dir, path))
+    }
+
+    os.makedirs(staging_dir)
+    stats = {"files": 0, "bytes": 0, "excluded_files": 0, "excluded_bytes": 0, "link": 0, "copy": 0, "symlink": 0}
+    for path in sorted(candidates):
+        source = os.path.join(repo_dir, path)
+        try:
+            info = os.lstat(source)
+        except OSError:
+            # Deleted in the working tree since it was committed
+            continue
+        if os.path.isdir(source) and not os.path.islink(source):
+            # Submodule gitlinks show up as directories; their content is not tracked here
+            continue
+        if path.split("/", 1)[0] == ".git" or (path not in required and rules is not None and rules.match(path)):
+            stats["excluded_files"] += 1
+            stats["excluded_bytes"] += info.st_size
+            continue
+        target = os.path.join(staging_dir, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        stats[_link(source, target)] += 1
+        stats["files"] += 1
+        stats["bytes"] += info.st_size
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
+
+def parse_context_transfer(output: str):
+    """
+    Reads the context upload from BuildKit progress output.
+
+    Returns:
+        dict: ``bytes`` and ``seconds`` of the last "transferring context"
+        line, or None when the output has none.
+    """
+    matches = TRANSFER_PATTERN.findall(output or "")
+    if not matches:
+        return None
+    size, unit, seconds = matches[-1]
+    return {"bytes": int(float(size) * TRANSFER_UNITS.get(unit, 1)), "seconds": float(seconds)}
@@ -0,0 +1,441 @@
+import ast
+import json
+import os
+import re
+import sys
+import sysconfig
+import time
+from typing import Optional
+
+# Matches the internal_port of the fly.toml that deploy_app writes
+DEFAULT_PORT = 8080
+DEFAULT_PYTHON_VERSION = "3.11"
+DEFAULT_NODE_VERSION = "20"
+DEFAULT_GO_VERSION = "1.22"
+
+PYTHON_ENTRYPOINTS = [
+    "main.py", "app.py", "server.py", "asgi.py", "wsgi.py",
+    "app/main.py", "src/main.py", "src/app.py", "api/main.py"
+]
+ASGI_FACTORIES = {"FastAPI": "fastapi", "Starlette": "starlette", "Quart": "quart"}
+WSGI_FACTORIES = {"Flask": "flask"}
+
+# Import names whose distribution is published under a different name
+IMPORT_DISTRIBUTIONS = {
+    "jwt": "pyjwt",
+    "yaml": "pyyaml",
+    "PIL": "pillow",
+    "cv2": "opencv-python-headless",
+    "sklearn": "scikit-learn",
+    "bs4": "beautifulsoup4",
+    "dotenv": "python-dotenv",
+    "jose": "python-jose",
+    "multipart": "python-multipart",
+    "dateutil": "python-dateutil",
+    "psycopg2": "psycopg2-binary",
+    "attr": "attrs",
+    "magic": "python-magic",
+    "docx": "python-docx",
+    "github": "pygithub",
+}
+
+NODE_LOCKFILES = [
+    ("pnpm-lock.yaml", "pnpm install --frozen-lockfile", "pnpm prune --prod"),
+    ("yarn.lock", "yarn install --frozen-lockfile", "yarn install --frozen-lockfile --production"),
+    ("package-lock.json", "npm ci", "npm prune --omit=dev"),
+    ("npm-shrinkwrap.json", "npm ci", "npm prune --omit=dev"),
+]
+
+VERSION_PATTERN = re.compile(r"(\d+)(?:\.(\d+))?")
+REQUIREMENT_NAME_PATTERN = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+
+class GeneratedDockerfile:
+    def __init__(self, content, stack, entrypoint, notes, seconds):
+        self.content = content
+        self.stack = stack
+        self.entrypoint = entrypoint
+        self.notes = notes
+        self.seconds = seconds
+
+    def info(self):
+        return {
+            "stack": self.stack,
+            "entrypoint": self.entrypoint,
+            "notes": self.notes,
+            "seconds": round(self.seconds, 4)
+        }
+
+def _read(root, name):
+    try:
+        with open(os.path.join(root, name), encoding="utf-8") as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+def _exists(root, name):
+    return os.path.isfile(os.path.join(root, name))
+
+def _stdlib_modules():
+    names = getattr(sys, "stdlib_module_names", None)
+    if names:
+        return set(names)
+    # Python < 3.10: list the standard library directory instead
+    stdlib = sysconfig.get_paths()["stdlib"]
+    modules = set(sys.builtin_module_names)
+    for entry in os.listdir(stdlib):
+        name, extension = os.path.splitext(entry)
+        if extension in ("", ".py"):
+            modules.add(name)
+    return modules
+
+def _version(text, default, parts=2):
+    """The first ``major[.minor]`` in a version constraint such as ``^3.9`` or ``>=18``."""
+    match = VERSION_PATTERN.search(text or "")
+    if not match:
+        return default
+    if parts == 1:
+        return match.group(1)
+    return f"{match.group(1)}.{match.group(2)}" if match.group(2) else default
+
+def _requirement_names(text):
+    names = set()
+    for line in (text or "").splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line or line.startswith("-"):
+            continue
+        match = REQUIREMENT_NAME_PATTERN.match(line)
+        if match:
+            names.add(match.group(1).lower().replace("_", "-"))
+    return names
+
+def _toml_section(text, name):
+    """Body of the ``[name]`` table in a TOML document, without a TOML parser."""
+    match = re.search(rf"^\[{re.escape(name)}\]\s*$(.*?)(?=^\[|\Z)", text or "", re.M | re.S)
+    return match.group(1) if match else None
+
+def _toml_value(section, key):
+    match = re.search(rf"^\s*{re.escape(key)}\s*=\s*[\"']([^\"']*)[\"']", section or "", re.M)
+    return match.group(1) if match else None
+
+def _toml_strings(section, key):
+    """Items of a string array such as ``dependencies = ["uvicorn[standard]"]``."""
+    match = re.search(rf"^\s*{re.escape(key)}\s*=\s*\[", section or "", re.M)
+    if not match:
+        return []
+    items = []
+    # Brackets inside quoted items (extras) must not end the array
+    for token in re.finditer(r"\"([^\"]*)\"|'([^']*)'|(\])", section[match.end():]):
+        if token.group(3):
+            break
+        items.append(token.group(1) if token.group(1) is not None else token.group(2))
+    return items
+
+def _python_tree(root):
+    """Top-level Python files and packages: the ones an entrypoint or inferred import can refer to."""
+    files, local = [], set()
+    for entry in sorted(os.listdir(root)):
+        path = os.path.join(root, entry)
+        if entry.endswith(".py") and os.path.isfile(path):
+            files.append(entry)
+            local.add(entry[:-3])
+        elif os.path.isfile(os.path.join(path, "__init__.py")):
+            local.add(entry)
+    return files, local
+
+def _parse(root, name):
+    source = _read(root, name)
+    if source is None:
+        return None
+    try:
+        return ast.parse(source)
+    except SyntaxError:
+        return None
+
+def _find_app(tree):
+    """Returns (variable, framework, kind) for a module-level ``app = FastAPI()``-style assignment."""
+    for node in tree.body:
+        if not isinstance(node, ast.Assign) or not isinstance(node.value, ast.Call):
+            continue
+        func = node.value.func
+        factory = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+        target = node.targets[0]
+        if not isinstance(target, ast.Name):
+            continue
+        if factory in ASGI_FACTORIES:
+            return target.id, ASGI_FACTORIES[factory], "asgi"
+        if factory in WSGI_FACTORIES:
+            return target.id, WSGI_FACTORIES[factory], "wsgi"
+    return None
+
+def _has_main_guard(tree):
+    for node in tree.body:
+        if isinstance(node, ast.If) and isinstance(node.test, ast.Compare):
+            left = node.test.left
+            if isinstance(left, ast.Name) and left.id == "__name__":
+                return True
+    return False
+
+def _imports(tree):
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module.split(".")[0])
+    return names
+
+def _python_entrypoint(root, files):
+    """
+    Finds how to start a Python service.
+
+    Returns:
+        tuple: (command, server package or None, description), or None.
+    """
+    port = str(DEFAULT_PORT)
+    if _exists(root, "manage.py"):
+        for entry in sorted(os.listdir(root)):
+            if _exists(root, os.path.join(entry, "wsgi.py")):
+                return (
+                    ["gunicorn", "--bind", f"0.0.0.0:{port}", f"{entry}.wsgi"], "gunicorn", f"django {entry}.wsgi"
+                )
+    candidates = [name for name in PYTHON_ENTRYPOINTS if _exists(root, name)]
+    candidates += [name for name in files if name not in candidates]
+    scripts = []
+    for name in candidates:
+        tree = _parse(root, name)
+        if tree is None:
+            continue
+        module = name[:-3].replace("/", ".")
+        app = _find_app(tree)
+        if app:
+            variable, framework, kind = app
+            if kind == "asgi":
+                command = ["uvicorn", f"{module}:{variable}", "--host", "0.0.0.0", "--port", port]
+                return command, "uvicorn", f"{framework} {module}:{variable}"
+            command = ["gunicorn", "--bind", f"0.0.0.0:{port}", f"{module}:{variable}"]
+            return command, "gunicorn", f"{framework} {module}:{variable}"
+        if _has_main_guard(tree):
+            scripts.append(name)
+    if scripts:
+        return ["python", scripts[0]], None, f"script {scripts[0]}"
+    return None
+
+def _inferred_requirements(root, files, local):
+    stdlib = _stdlib_modules()
+    packages = set()
+    for name in files:
+        tree = _parse(root, name)
+        if tree is None:
+            continue
+        for module in _imports(tree):
+            if module in stdlib or module in local or module.startswith("_"):
+                continue
+            packages.add(IMPORT_DISTRIBUTIONS.get(module, module).lower())
+    return packages
+
+def _python_dockerfile(root):
+    files, local = _python_tree(root)
+    pyproject = _read(root, "pyproject.toml")
+    requirements = _read(root, "requirements.txt")
+    poetry = _toml_section(pyproject, "tool.poetry") is not None and _exists(root, "poetry.lock")
+    project = _toml_section(pyproject, "project")
+    if not (files or requirements is not None or poetry or project is not None):
+        return None
+    entry = _python_entrypoint(root, files)
+    if entry is None:
+        return None
+    command, server, description = entry
+    notes = []
+
+    version_source = (
+        (_read(root, ".python-version") or "").strip()
+        or _toml_value(project, "requires-python")
+        or _toml_value(_toml_section(pyproject, "tool.poetry.dependencies"), "python")
+        or (_read(root, "runtime.txt") or "").replace("python-", "")
+    )
+    version = _version(version_source, DEFAULT_PYTHON_VERSION)
+
+    # Dependencies are installed from the manifest alone, before the sources
+    # are copied, so editing code does not invalidate the dependency layer
+    if requirements is not None:
+        declared = _requirement_names(requirements)
+        install = [
+            "COPY requirements.txt ./",
+            "RUN pip install --no-cache-dir -r requirements.txt",
+        ]
+        manifest = "requirements.txt"
+    elif poetry:
+        declared = {
+            name.lower() for name in re.findall(
+                r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*=", _toml_section(pyproject, "tool.poetry.dependencies") or "", re.M
+            )
+        }
+        install = [
+            "RUN pip install --no-cache-dir \"poetry>=1.2\" \"poetry-plugin-export\"",
+            "COPY pyproject.toml poetry.lock ./",
+            "RUN poetry export --without-hashes --only main -f requirements.txt -o requirements.lock"
+            " && pip install --no-cache-dir -r requirements.lock",
+        ]
+        manifest = "poetry"
+    elif project is not None:
+        listed = _toml_strings(project, "dependencies")
+        declared = _requirement_names("\n".join(listed))
+        install = ["RUN pip install --no-cache-dir " + " ".join(json.dumps(item) for item in listed)] if listed else []
+        manifest = "pyproject"
+    else:
+        declared = _inferred_requirements(root, files, local)
+        install = ["RUN pip install --no-cache-dir " + " ".join(sorted(declared))] if declared else []
+        manifest = "imports"
+        notes.append("No dependency manifest; packages were inferred from imports: " + ", ".join(sorted(declared)))
+
+    if server and server not in declared:
+        install.append(f"RUN pip install --no-cache-dir {server}")
+        notes.append(f"{server} is not a declared dependency and is installed separately")
+
+    lines = [
+        f"# Generated for a Python project ({description}, dependencies from {manifest})",
+        f"FROM python:{version}-slim AS builder",
+        "ENV PIP_DISABLE_PIP_VERSION_CHECK=1 PYTHONDONTWRITEBYTECODE=1",
+        "RUN python -m venv /opt/venv",
+        "ENV PATH=\"/opt/venv/bin:$PATH\"",
+        "WORKDIR /app",
+        *install,
+        "",
+        f"FROM python:{version}-slim",
+        "ENV PATH=\"/opt/venv/bin:$PATH\" PYTHONUNBUFFERED=1 PYTHONDONTWRITEBYTECODE=1 "
+        f"PORT={DEFAULT_PORT}",
+        "RUN useradd --create-home --uid 1000 app",
+        "WORKDIR /app",
+        "COPY --from=builder /opt/venv /opt/venv",
+        "COPY --chown=app:app . .",
+        "USER app",
+        f"EXPOSE {DEFAULT_PORT}",
+        f"CMD {json.dumps(command)}",
+    ]
+    return lines, f"python-{manifest}", description, notes
+
+def _node_dockerfile(root):
+    text = _read(root, "package.json")
+    if text is None:
+        return None
+    try:
+        package = json.loads(text)
+    except ValueError:
+        return None
+    scripts = package.get("scripts") or {}
+    version = _version((package.get("engines") or {}).get("node"), DEFAULT_NODE_VERSION, parts=1)
+    if "start" in scripts:
+        command, description = ["npm", "start"], "npm start"
+    else:
+        main = package.get("main") or next(
+            (name for name in ("server.js", "index.js", "app.js", "main.js") if _exists(root, name)), None
+        )
+        if not main or not _exists(root, main):
+            return None
+        command, description = ["node", main], f"node {main}"
+
+    notes = []
+    lockfile = next((entry for entry in NODE_LOCKFILES if _exists(root, entry[0])), None)
+    if lockfile:
+        name, install, prune = lockfile
+        manifests = f"package.json {name}"
+    else:
+        install, prune, manifests = "npm install", "npm prune --omit=dev", "package.json"
+        notes.append("No lockfile; dependency versions are resolved at build time")
+    corepack = ["RUN corepack enable"] if install.split()[0] in ("pnpm", "yarn") else []
+    build = ["RUN npm run build"] if "build" in scripts else []
+
+    lines = [
+        f"# Generated for a Node.js project ({description})",
+        f"FROM node:{version}-slim AS builder",
+        "WORKDIR /app",
+        *corepack,
+        f"COPY {manifests} ./",
+        f"RUN {install}",
+        "COPY . .",
+        *build,
+        f"RUN {prune}",
+        "",
+        f"FROM node:{version}-slim",
+        f"ENV NODE_ENV=production PORT={DEFAULT_PORT}",
+        "WORKDIR /app",
+        "COPY --from=builder --chown=node:node /app /app",
+        "USER node",
+        f"EXPOSE {DEFAULT_PORT}",
+        f"CMD {json.dumps(command)}",
+    ]
+    return lines, "node", description, notes
+
+def _go_main_package(root):
+    def is_main(directory):
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return False
+        for name in names:
+            if name.endswith(".go") and not name.endswith("_test.go"):
+                source = _read(directory, name) or ""
+                if re.search(r"^package\s+main\b", source, re.M):
+                    return True
+        return False
+
+    if is_main(root):
+        return "."
+    commands = os.path.join(root, "cmd")
+    if os.path.isdir(commands):
+        for name in sorted(os.listdir(commands)):
+            if is_main(os.path.join(commands, name)):
+                return f"./cmd/{name}"
+    return None
+
+def _go_dockerfile(root):
+    gomod = _read(root, "go.mod")
+    if gomod is None:
+        return None
+    package = _go_main_package(root)
+    if package is None:
+        return None
+    version_line = re.search(r"^go\s+(\S+)", gomod, re.M)
+    version = _version(version_line.group(1) if version_line else None, DEFAULT_GO_VERSION)
+    manifests = "go.mod go.sum" if _exists(root, "go.sum") else "go.mod"
+    lines = [
+        f"# Generated for a Go project (package {package})",
+        f"FROM golang:{version} AS builder",
+        "WORKDIR /src",
+        f"COPY {manifests} ./",
+        "RUN go mod download",
+        "COPY . .",
+        f"RUN CGO_ENABLED=0 go build -trimpath -ldflags=\"-s -w\" -o /out/app {package}",
+        "",
+        "FROM gcr.io/distroless/static-debian12:nonroot",
+        f"ENV PORT={DEFAULT_PORT}",
+        "COPY --from=builder /out/app /app",
+        f"EXPOSE {DEFAULT_PORT}",
+        "ENTRYPOINT [\"/app\"]",
+    ]
+    return lines, "go", f"go build {package}", []
+
+# Checked in order; the first detector that recognises the project wins
+DETECTORS = [_go_dockerfile, _node_dockerfile, _python_dockerfile]
+
+def generate_dockerfile(root: str) -> Optional[GeneratedDockerfile]:
+    """
+    Builds a multi-stage Dockerfile for a Go, Node.js or Python project
+    from its manifests and entrypoint, without calling a model.
+
+    Args:
+        root (str): Project directory.
+
+    Returns:
+        GeneratedDockerfile: The Dockerfile and what was detected, or None
+        when the stack or entrypoint cannot be determined.
+    """
+    started = time.perf_counter()
+    for detector in DETECTORS:
+        result = detector(root)
+        if result:
+            lines, stack, entrypoint, notes = result
+            return GeneratedDockerfile(
+                "\n".join(lines) + "\n", stack, entrypoint, notes, time.perf_counter() - started
+            )
+    return None
@@ -0,0 +1,563 @@
+import glob
+import json
+import os
+import posixpath
+import re
+import shlex
+from typing import Optional
+from ...utils.ignore import DockerignoreRules
+
+# Build contexts above this size are reported; remote builders upload the whole context
+CONTEXT_WARN_BYTES = int(os.environ.get("DOCKERFILE_CONTEXT_WARN_BYTES", str(50 * 1024 * 1024)))
+CONTEXT_LARGEST_ENTRIES = 5
+
+# Candidate .dockerignore entries; only those that exclude something, and
+# nothing a COPY names explicitly, are suggested
+SUGGESTED_DOCKERIGNORE = [
+    ".git",
+    ".env",
+    "**/__pycache__",
+    "**/*.py[cod]",
+    "**/.pytest_cache",
+    "**/.mypy_cache",
+    ".venv",
+    "venv",
+    "**/node_modules",
+    ".cache",
+    "**/*.db",
+    "**/*.sqlite3",
+    "**/*.zip",
+    "**/*.tar.gz",
+    "**/.DS_Store",
+]
+
+# Instructions that do not touch the filesystem, so moving a step past them is safe
+METADATA_INSTRUCTIONS = {"EXPOSE", "LABEL", "CMD", "ENTRYPOINT", "HEALTHCHECK", "STOPSIGNAL", "MAINTAINER", "VOLUME"}
+# Instructions that can move above a COPY of the context without changing the result
+HOISTABLE_INSTRUCTIONS = {"ENV", "ARG", "WORKDIR"}
+
+# Shell segments that neither read sources nor install anything
+NEUTRAL_COMMAND_PATTERN = re.compile(r"^(?:(?:if|then|else|elif|fi|test|echo|true|set|export|cd)\b|\[|:)")
+SEGMENT_SPLIT_PATTERN = re.compile(r"&&|\|\||;|\bthen\b|\belse\b|\belif\b|\bfi\b")
+HEREDOC_PATTERN = re.compile(r"<<-?\s*[\"']?([A-Za-z_][A-Za-z0-9_]*)[\"']?")
+FROM_PATTERN = re.compile(r"^(?:--\S+\s+)*(\S+)(?:\s+AS\s+(\S+))?", re.I)
+
+NODE_MANIFESTS = ["package.json", "package-lock.json", "npm-shrinkwrap.json", ".npmrc"]
+
+class Instruction:
+    def __init__(self, keyword, value, line, lines, comments):
+        self.keyword = keyword
+        self.value = value
+        self.line = line
+        self.lines = lines
+        self.comments = comments
+
+    @classmethod
+    def new(cls, text, comments=()):
+        keyword, _, value = text.partition(" ")
+        return cls(keyword.upper(), value, None, [text + "\n"], [comment + "\n" for comment in comments])
+
+    def render(self):
+        return "".join(self.comments) + "".join(self.lines)
+
+def parse_dockerfile(text):
+    """
+    Splits a Dockerfile into instructions, keeping each one's original lines
+    and the comments above it so the file can be reassembled unchanged.
+
+    Returns:
+        tuple: (list of Instruction, trailing comment lines).
+    """
+    escape = "\\"
+    directive = re.match(r"\s*#\s*escape\s*=\s*(\S)", text)
+    if directive:
+        escape = directive.group(1)
+    lines = text.splitlines(keepends=True)
+    instructions, comments = [], []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            comments.append(line)
+            i += 1
+            continue
+        start = i
+        raw = [line]
+        logical = []
+        current = line.rstrip("\r\n")
+        while True:
+            if current.rstrip().endswith(escape) and i + 1 < len(lines):
+                logical.append(current.rstrip()[:-1])
+                i += 1
+                raw.append(lines[i])
+                current = lines[i].rstrip("\r\n")
+                # Comment lines inside a continuation are dropped by the builder
+                while current.strip().startswith("#") and i + 1 < len(lines):
+                    i += 1
+                    raw.append(lines[i])
+                    current = lines[i].rstrip("\r\n")
+                continue
+            logical.append(current)
+            break
+        value = " ".join(part.strip() for part in logical)
+        for terminator in HEREDOC_PATTERN.findall(value):
+            while i + 1 < len(lines):
+                i += 1
+                raw.append(lines[i])
+                if lines[i].strip() == terminator:
+                    break
+        keyword, _, rest = value.partition(" ")
+        instructions.append(Instruction(keyword.upper(), rest.strip(), start + 1, raw, comments))
+        comments = []
+        i += 1
+    return instructions, comments
+
+def _arguments(value):
+    """Arguments of COPY/ADD in either JSON or shell form, flags separated out."""
+    if value.startswith("["):
+        try:
+            args = json.loads(value)
+        except ValueError:
+            args = []
+        flags = {}
+    else:
+        try:
+            args = shlex.split(value)
+        except ValueError:
+            args = value.split()
+        flags = {}
+        while args and args[0].startswith("--"):
+            name, _, flag_value = args.pop(0)[2:].partition("=")
+            flags[name] = flag_value
+    return flags, args[:-1], args[-1] if args else None
+
+def _resolve(workdir, path):
+    if workdir is None and not path.startswith("/"):
+        return None
+    return posixpath.normpath(posixpath.join(workdir or "/", path))
+
+def _install_kind(command):
+    """
+    Classifies a RUN command.
+
+    Returns:
+        tuple: (kind, manifests) where kind is "tool" for installs that need no
+        project files, "deps" for installs from the listed manifests, or
+        "other" for anything that may read the sources.
+    """
+    kinds, manifests = set(), []
+    for segment in SEGMENT_SPLIT_PATTERN.split(command):
+        segment = segment.strip()
+        if not segment or NEUTRAL_COMMAND_PATTERN.match(segment):
+            continue
+        words = segment.split()
+        if words[0] in ("pip", "pip3") or words[:3] in (["python", "-m", "pip"], ["python3", "-m", "pip"]):
+            rest = words[words.index("pip") + 1:] if "pip" in words else words[1:]
+            if rest[:1] != ["install"]:
+                kinds.add("tool")
+            elif "-e" in rest or "--editable" in rest or any(arg in (".", "./") or arg.startswith(("./", "/")) for arg in rest):
+                kinds.add("other")
+            elif "-r" in rest or "--requirement" in rest or any(arg.startswith(("-r", "--requirement=")) for arg in rest):
+                kinds.add("deps")
+                for index, arg in enumerate(rest):
+                    if arg in ("-r", "--requirement") and index + 1 < len(rest):
+                        manifests.append(rest[index + 1])
+                    elif arg.startswith("--requirement="):
+                        manifests.append(arg.split("=", 1)[1])
+                    elif arg.startswith("-r") and len(arg) > 2:
+                        manifests.append(arg[2:])
+            else:
+                kinds.add("tool")
+        elif words[0] == "poetry":
+            if words[1:2] == ["install"]:
+                kinds.add("deps")
+                manifests += ["pyproject.toml", "poetry.lock"]
+            elif words[1:2] in (["config"], ["self"]):
+                kinds.add("tool")
+            else:
+                kinds.add("other")
+        elif words[0] == "pipenv" and words[1:2] in (["install"], ["sync"]):
+            kinds.add("deps")
+            manifests += ["Pipfile", "Pipfile.lock"]
+        elif words[0] == "npm" and words[1:2] in (["ci"], ["install"], ["i"]):
+            packages = [arg for arg in words[2:] if not arg.startswith("-")]
+            if "-g" in words or "--global" in words:
+                kinds.add("tool")
+            elif packages:
+                kinds.add("other")
+            else:
+                kinds.add("deps")
+                manifests += NODE_MANIFESTS
+        elif words[0] == "yarn" and (len(words) == 1 or words[1] == "install" or words[1].startswith("-")):
+            kinds.add("deps")
+            manifests += ["package.json", "yarn.lock", ".yarnrc.yml", ".yarnrc"]
+        elif words[0] == "pnpm" and words[1:2] in (["install"], ["i"]):
+            kinds.add("deps")
+            manifests += ["package.json", "pnpm-lock.yaml", ".npmrc"]
+        elif words[0] == "go" and words[1:3] == ["mod", "download"]:
+            kinds.add("deps")
+            manifests += ["go.mod", "go.sum"]
+        elif words[0] == "bundle" and words[1:2] == ["install"]:
+            kinds.add("deps")
+            manifests += ["Gemfile", "Gemfile.lock"]
+        elif words[0] == "composer" and words[1:2] == ["install"]:
+            kinds.add("deps")
+            manifests += ["composer.json", "composer.lock"]
+        elif words[0] in ("apt-get", "apt", "apk", "yum", "dnf", "corepack", "useradd", "adduser", "groupadd", "mkdir"):
+            kinds.add("tool")
+        else:
+            kinds.add("other")
+    if "other" in kinds or not kinds:
+        return "other", []
+    return ("deps" if "deps" in kinds else "tool"), list(dict.fromkeys(manifests))
+
+def _stages(instructions):
+    stages, current = [], []
+    for instruction in instructions:
+        if instruction.keyword == "FROM" and current and any(item.keyword == "FROM" for item in current):
+            stages.append(current)
+            current = []
+        current.append(instruction)
+    if current:
+        stages.append(current)
+    return stages
+
+def _context_copy(instruction):
+    """(sources, dest) for a COPY/ADD from the build context, or None for other instructions."""
+    if instruction.keyword not in ("COPY", "ADD"):
+        return None
+    flags, sources, dest = _arguments(instruction.value)
+    if "from" in flags or dest is None:
+        return None
+    return sources, dest
+
+def _is_whole_context(sources):
+    return any(posixpath.normpath(source) == "." for source in sources)
+
+def _walk_context(root, rules, candidates=()):
+    """
+    Sizes the build context: what the builder would upload given ``rules``.
+
+    Returns:
+        tuple: (total bytes, file count, {top-level entry: bytes}, {candidate index: bytes it would exclude})
+    """
+    total, files, entries, savings = 0, 0, {}, {}
+
+    def visit(directory, relative_dir, excluded_by):
+        nonlocal total, files
+        try:
+            iterator = os.scandir(directory)
+        except OSError:
+            return
+        with iterator:
+            for entry in iterator:
+                relative = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if rules is not None:
+                    if is_dir and rules.skips_directory(relative):
+                        continue
+                    if not is_dir and rules.match(relative):
+                        continue
+                candidate = excluded_by
+                if candidate is None:
+                    candidate = next((index for index, rule in candidates if rule.match(relative)), None)
+                if is_dir:
+                    visit(entry.path, relative, candidate)
+                    continue
+                try:
+                    size = entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+                total += size
+                files += 1
+                top = relative.split("/", 1)[0]
+                entries[top] = entries.get(top, 0) + size
+                if candidate is not None:
+                    savings[candidate] = savings.get(candidate, 0) + size
+
+    visit(root, "", None)
+    return total, files, entries, savings
+
+def _format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+
+def _finding(rule, severity, line, message):
+    return {"rule": rule, "severity": severity, "line": line, "message": message}
+
+def _lint_stage(instructions, root, findings, stage_names):
+    workdir = None
+    whole_copy = None
+    whole_dest = None
+    for instruction in instructions:
+        keyword = instruction.keyword
+        if keyword == "FROM":
+            match = FROM_PATTERN.match(instruction.value)
+            image = match.group(1) if match else ""
+            name = image.rsplit("/", 1)[-1]
+            if match and match.group(2):
+                stage_names.add(match.group(2).lower())
+            if image.lower() not in stage_names and image != "scratch" and "$" not in image and "@" not in name and (":" not in name or name.endswith(":latest")):
+                findings.append(_finding(
+                    "unpinned-base", "info", instruction.line,
+                    f"Base image {image} is not pinned to a version; builds can change without any edit"
+                ))
+        elif keyword == "WORKDIR":
+            workdir = _resolve(workdir or "/", instruction.value.strip().strip("\"'"))
+        elif keyword in ("COPY", "ADD"):
+            copy = _context_copy(instruction)
+            if copy is None:
+                continue
+            sources, dest = copy
+            target = _resolve(workdir, dest)
+            if _is_whole_context(sources):
+                if whole_copy is None:
+                    whole_copy, whole_dest = instruction, target
+                continue
+            for source in sources:
+                if re.match(r"^[a-z]+://", source):
+                    continue
+                if root is not None and not glob.glob(os.path.join(root, source)):
+                    findings.append(_finding(
+                        "copy-source-missing", "error", instruction.line,
+                        f"{keyword} source {source} does not exist in the build context"
+                    ))
+                elif whole_copy is not None and whole_dest and target and len(sources) == 1 and \
+                        target.rstrip("/") == posixpath.join(whole_dest, posixpath.normpath(source)):
+                    findings.append(_finding(
+                        "redundant-copy", "warning", instruction.line,
+                        f"{source} was already copied by line {whole_copy.line}; this adds a duplicate layer"
+                    ))
+        elif keyword == "RUN":
+            command = instruction.value
+            kind, manifests = _install_kind(command)
+            if whole_copy is not None and kind == "deps":
+                findings.append(_finding(
+                    "copy-before-install", "warning", instruction.line,
+                    f"Dependencies are installed after line {whole_copy.line} copies the whole context, so any "
+                    f"source change reinstalls them; copy {', '.join(manifests[:3])} first and install before "
+                    "copying the rest"
+                ))
+            elif whole_copy is not None and kind == "tool":
+                findings.append(_finding(
+                    "tool-after-copy", "warning", instruction.line,
+                    f"This step does not need the sources but runs after line {whole_copy.line} copies them, "
+                    "so it reruns on every source change"
+                ))
+            if re.search(r"\bpip3?\s+install\b", command) and "--no-cache-dir" not in command \
+                    and "PIP_NO_CACHE_DIR" not in command:
+                findings.append(_finding(
+                    "pip-cache", "info", instruction.line, "pip install without --no-cache-dir keeps the download cache in the layer"
+                ))
+            if "apt-get update" in command and "apt-get install" not in command:
+                findings.append(_finding(
+                    "apt-update-alone", "warning", instruction.line,
+                    "apt-get update in its own layer is cached separately and goes stale; run it with apt-get install"
+                ))
+            elif "apt-get install" in command and "/var/lib/apt/lists" not in command:
+                findings.append(_finding(
+                    "apt-lists", "info", instruction.line, "apt-get install without removing /var/lib/apt/lists leaves the package index in the layer"
+                ))
+
+def _optimize_stage(instructions, root, changes):
+    """Moves steps that only need manifests above the stage's COPY of the whole context."""
+    workdir = None
+    for index, instruction in enumerate(instructions):
+        if instruction.keyword == "WORKDIR":
+            workdir = _resolve(workdir or "/", instruction.value.strip().strip("\"'"))
+        copy = _context_copy(instruction)
+        if copy and _is_whole_context(copy[0]):
+            break
+    else:
+        return instructions
+    copy_index, copy_instruction = index, instructions[index]
+    flags, sources, dest = _arguments(copy_instruction.value)
+    base = _resolve(workdir, dest)
+    if base is None:
+        return instructions
+
+    hoisted, kept, dropped = [], [], []
+    moved_steps = 0
+    hoisting = True
+    for instruction in instructions[copy_index + 1:]:
+        keyword = instruction.keyword
+        if not hoisting or keyword in METADATA_INSTRUCTIONS:
+            kept.append(instruction)
+            continue
+        if keyword in HOISTABLE_INSTRUCTIONS:
+            if keyword == "WORKDIR":
+                workdir = _resolve(workdir or "/", instruction.value.strip().strip("\"'"))
+            hoisted.append(instruction)
+            continue
+        copy = _context_copy(instruction)
+        if copy and len(copy[0]) == 1 and not _is_whole_context(copy[0]):
+            target = _resolve(workdir, copy[1])
+            if target and target.rstrip("/") == posixpath.join(base, posixpath.normpath(copy[0][0])):
+                dropped.append(instruction)
+                changes.append(f"Removed line {instruction.line}: {copy[0][0]} is already part of line {copy_instruction.line}")
+                continue
+        if keyword == "RUN":
+            kind, manifests = _install_kind(instruction.value)
+            if kind == "tool":
+                hoisted.append(instruction)
+                moved_steps += 1
+                changes.append(f"Moved line {instruction.line} above the COPY of the context; it does not read the sources")
+                continue
+            relative_dir = posixpath.relpath(workdir or "/", base)
+            if kind == "deps" and root is not None and not relative_dir.startswith(".."):
+                relative_dir = "" if relative_dir == "." else relative_dir
+                present = [
+                    posixpath.join(relative_dir, manifest) for manifest in manifests
+                    if os.path.isfile(os.path.join(root, relative_dir, manifest))
+                ]
+                if present:
+                    run = instruction
+                    if re.search(r"\bpoetry\s+install\b", run.value) and "--no-root" not in run.value:
+                        # The project itself is not copied yet; it is importable from the working directory
+                        run = Instruction(
+                            run.keyword, run.value, run.line,
+                            [re.sub(r"\bpoetry\s+install\b", "poetry install --no-root", line, count=1) for line in run.lines],
+                            run.comments
+                        )
+                        changes.append(f"Added --no-root to poetry install on line {instruction.line}; the sources are copied afterwards")
+                    target = posixpath.join(workdir or base, "")
+                    hoisted.append(Instruction.new(
+                        "COPY " + " ".join(present) + " " + target,
+                        ["", "# Copy the dependency manifests alone so source changes keep the install layer cached"]
+                    ))
+                    hoisted.append(run)
+                    moved_steps += 1
+                    changes.append(
+                        f"Copied {', '.join(present)} and moved the install on line {instruction.line} above the COPY of the context"
+                    )
+                    continue
+        hoisting = False
+        kept.append(instruction)
+
+    if not moved_steps:
+        return [instruction for instruction in instructions if instruction not in dropped]
+    if not dest.startswith("/") and any(item.keyword == "WORKDIR" for item in hoisted):
+        # A WORKDIR moved above a relative destination would change where the context lands
+        copy_instruction = Instruction.new(f"COPY {' '.join(shlex.quote(source) for source in sources)} {base}", [
+            line.rstrip("\n") for line in copy_instruction.comments
+        ])
+    return instructions[:copy_index] + hoisted + [copy_instruction] + kept
+
+def lint_dockerfile(root: str, dockerfile: str = "Dockerfile", context_rules: Optional[DockerignoreRules] = None):
+    """
+    Checks a Dockerfile for layer-cache and build-context problems before a
+    remote build, and proposes an optimized version.
+
+    Args:
+        root (str): Build context directory.
+        dockerfile (str): Dockerfile path relative to ``root``.
+        context_rules (DockerignoreRules): Rules to size the context with;
+            defaults to the context's ``.dockerignore``.
+
+    Returns:
+        dict: ``findings``, ``context`` (size, largest entries, suggested
+        .dockerignore and the bytes it would save), and ``optimized`` (the
+        rewritten Dockerfile, or None when the order is already cache-friendly)
+        with the list of ``changes``.
+    """
+    with open(os.path.join(root, dockerfile), encoding="utf-8") as f:
+        text = f.read()
+    instructions, trailing = parse_dockerfile(text)
+    findings = []
+    stage_names = set()
+    for stage in _stages(instructions):
+        _lint_stage(stage, root, findings, stage_names)
+
+    dockerignore_path = os.path.join(root, ".dockerignore")
+    rules = context_rules or DockerignoreRules.from_file(dockerignore_path)
+    referenced = [
+        source for instruction in instructions
+        for source in (_context_copy(instruction) or ((), None))[0] if not _is_whole_context([source])
+    ]
+    candidates = []
+    for index, pattern in enumerate(SUGGESTED_DOCKERIGNORE):
+        rule = DockerignoreRules([pattern])
+        if not any(rule.match(posixpath.normpath(source)) for source in referenced):
+            candidates.append((index, rule))
+    total, files, entries, savings = _walk_context(root, rules, candidates)
+    suggested = [SUGGESTED_DOCKERIGNORE[index] for index in sorted(savings)]
+    bytes_saved = sum(savings.values())
+    largest = sorted(entries.items(), key=lambda item: -item[1])[:CONTEXT_LARGEST_ENTRIES]
+
+    if rules is None:
+        findings.append(_finding(
+            "missing-dockerignore", "warning", None,
+            "No .dockerignore: the whole directory, including "
+            + (", ".join(suggested[:4]) or "any local artifacts") + ", is sent to the builder"
+        ))
+    elif suggested:
+        findings.append(_finding(
+            "dockerignore-gaps", "info", None,
+            f".dockerignore does not exclude {', '.join(suggested)} ({_format_bytes(bytes_saved)})"
+        ))
+    if total > CONTEXT_WARN_BYTES:
+        findings.append(_finding(
+            "large-context", "warning", None,
+            f"Build context is {_format_bytes(total)} in {files} files; largest entries: "
+            + ", ".join(f"{name} ({_format_bytes(size)})" for name, size in largest)
+        ))
+
+    changes = []
+    optimized_instructions = []
+    for stage in _stages(instructions):
+        optimized_instructions += _optimize_stage(stage, root, changes)
+    optimized = "".join(instruction.render() for instruction in optimized_instructions) + "".join(trailing)
+    if optimized and not optimized.endswith("\n"):
+        optimized += "\n"
+
+    return {
+        "dockerfile": dockerfile,
+        "findings": sorted(findings, key=lambda finding: (finding["line"] is None, finding["line"] or 0)),
+        "context": {
+            "bytes": total,
+            "files": files,
+            "largest": [{"path": name, "bytes": size} for name, size in largest],
+            "dockerignore": rules is not None,
+            "suggested_dockerignore": suggested,
+            "bytes_saved": bytes_saved
+        },
+        "optimized": optimized if changes else None,
+        "changes": changes
+    }
+
+def dockerignore_content(patterns, existing: Optional[str] = None):
+    """A .dockerignore with ``patterns`` appended to ``existing`` content."""
+    lines = [existing.rstrip("\n")] if existing else ["# Keep the build context to what the image needs"]
+    lines += patterns
+    return "\n".join(lines) + "\n"
+
+def apply_lint_fixes(root: str, report):
+    """
+    Writes the optimized Dockerfile and the suggested .dockerignore entries
+    from a ``lint_dockerfile`` report.
+
+    Returns:
+        list: Paths, relative to ``root``, that were written.
+    """
+    written = []
+    if report["optimized"]:
+        with open(os.path.join(root, report["dockerfile"]), "w", encoding="utf-8") as f:
+            f.write(report["optimized"])
+        written.append(report["dockerfile"])
+    suggested = report["context"]["suggested_dockerignore"]
+    if suggested:
+        path = os.path.join(root, ".dockerignore")
+        existing = None
+        if os.path.exists(path):
+            with open(path, encoding="utf-8", errors="replace") as f:
+                existing = f.read()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(dockerignore_content(suggested, existing))
+        written.append(".dockerignore")
+    return written
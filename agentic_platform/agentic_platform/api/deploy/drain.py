@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+from ...utils.paths import data_path
+
+logger = logging.getLogger(__name__)
+
+# Seconds shutdown waits for running builds before cancelling them
+SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get("SHUTDOWN_DRAIN_TIMEOUT", "300"))
+# Destroy every preview on shutdown instead of handing them to the next instance
+SHUTDOWN_TEARDOWN = os.environ.get("SHUTDOWN_TEARDOWN", "false").lower() in ("1", "true", "yes")
+SHUTDOWN_TEARDOWN_CONCURRENCY = int(os.environ.get("SHUTDOWN_TEARDOWN_CONCURRENCY", "8"))
+DEPLOY_STATE_PATH = os.environ.get("DEPLOY_STATE_PATH", data_path("deploy", "state.json"))
+
+class DeployDrainer:
+    """
+    Shuts the deploy service down without taking previews with it.
+
+    While draining, new deploys are refused and the builds already running
+    get until the deadline to finish. The registries and each preview's
+    expiry time are then written to a state file, which the next instance
+    loads on startup to rearm the stop timers. Previews the next instance
+    cannot take over, such as builds cancelled at the deadline, are torn down
+    concurrently, at most ``concurrency`` at a time.
+    """
+
+    def __init__(self, timeout=SHUTDOWN_DRAIN_TIMEOUT, concurrency=SHUTDOWN_TEARDOWN_CONCURRENCY,
+                 state_path=DEPLOY_STATE_PATH):
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.state_path = state_path
+        self.draining = False
+        self.draining_since = None
+        # Set once shutdown has handed off or torn down the previews
+        self.finished = False
+        self.builds = {}
+        self.metrics = {
+            "builds_finished": 0,
+            "builds_cancelled": 0,
+            "handed_off": 0,
+            "restored": 0,
+            "torn_down": 0,
+            "teardown_failures": 0,
+            "drain_seconds": None,
+        }
+
+    def track(self, app_name: str, task: asyncio.Task):
+        """Registers a running deploy_app task so the drain can wait for it."""
+        self.builds[app_name] = task
+        task.add_done_callback(lambda _: self.builds.pop(app_name, None))
+
+    def start_draining(self):
+        if not self.draining:
+            self.draining = True
+            self.draining_since = time.time()
+            logger.info(f"Draining: refusing new deploys, {len(self.builds)} builds in progress")
+
+    async def wait_for_builds(self, timeout: Optional[float] = None):
+        """
+        Waits for the running builds, up to ``timeout`` seconds, then cancels
+        the rest.
+
+        Returns:
+            list: Names of the apps whose builds were cancelled.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        tasks = dict(self.builds)
+        if not tasks:
+            return []
+        done, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+        self.metrics["builds_finished"] += len(done)
+        cancelled = [app_name for app_name, task in tasks.items() if task in pending]
+        for app_name in cancelled:
+            logger.warning(f"Build of {app_name} did not finish within {timeout}s; cancelling it")
+            tasks[app_name].cancel()
+        if pending:
+            await asyncio.wait(pending)
+        self.metrics["builds_cancelled"] += len(cancelled)
+        return cancelled
+
+    async def teardown(self, app_names: Iterable[str], release: Callable[[str], Awaitable]):
+        """
+        Runs ``release`` for every app, at most ``concurrency`` at a time.
+
+        Returns:
+            list: Names of the apps that were released.
+        """
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+
+        async def release_one(app_name):
+            async with semaphore:
+                try:
+                    await release(app_name)
+                    self.metrics["torn_down"] += 1
+                    return app_name
+                except Exception as e:
+                    self.metrics["teardown_failures"] += 1
+                    logger.error(f"Error tearing down {app_name}: {e}")
+                    return None
+
+        results = await asyncio.gather(*[release_one(app_name) for app_name in app_names])
+        return [app_name for app_name in results if app_name]
+
+    def save(self, state: Dict):
+        """Writes the state for the next instance; replaced atomically so a crash never leaves half a file."""
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        with open(f"{self.state_path}.tmp", "w") as f:
+            json.dump({**state, "saved_at": datetime.utcnow().isoformat()}, f)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+        self.metrics["handed_off"] = len(state.get("deployments", {}))
+        logger.info(f"Handed off {self.metrics['handed_off']} deployments in {self.state_path}")
+
+    def load(self):
+        """
+        Reads and removes the state left by the previous instance, so it is
+        taken over once.
+
+        Returns:
+            dict: The saved state, or None when there is none.
+        """
+        try:
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.error(f"Ignoring unreadable deploy state {self.state_path}: {e}")
+            return None
+        os.remove(self.state_path)
+        self.metrics["restored"] = len(state.get("deployments", {}))
+        return state
+
+    def snapshot(self):
+        return {
+            "draining": self.draining,
+            "draining_since": self.draining_since,
+            "builds_in_progress": sorted(self.builds),
+            "timeout": self.timeout,
+            "teardown": SHUTDOWN_TEARDOWN,
+            **self.metrics,
+        }
+
+deploy_drainer = DeployDrainer()
@@ -1,22 +1,40 @@
-from fastapi import APIRouter, HTTPException, Body, Query, Depends, status
+from fastapi import APIRouter, HTTPException, Body, Query, Depends, Request, status
 from fastapi.responses import StreamingResponse, JSONResponse
 from sqlalchemy.orm import Session
 from typing import Dict, Any, List, Optional
-from .models import DeployRequest, CloneRequest, UpdateProjectRequest, ExploreRequest
+from .models import (
+    DeployRequest, CloneRequest, UpdateProjectRequest, ExploreRequest, BatchExploreRequest, DockerfileLintRequest,
+    AutoscaleRegisterRequest
+)
 from .utils import execute_command
 from .utils import execute_command
 from .services import (
     deploy_app, stop_instance, explore_directory, modify_file,
     create_file, remove_file, create_dockerfile, stop_app, stream_aider_output,
-    get_flyctl_help
+    get_flyctl_help, apply_config, apply_secrets, release_app
 )
 from .utils import get_project_directory, is_fly_installed
+from .files import resolve_repo_file, file_response, read_line_range
+from .batch import apply_batch
+from .dockerfile import generate_dockerfile
+from .dockerlint import lint_dockerfile, apply_lint_fixes
+from .autoscale import scaling_advisor
+from .pool import app_pool
+from .providers import preview_provider
+from .drain import deploy_drainer, SHUTDOWN_TEARDOWN
+from .fly_config import FlyConfigError, generate_fly_config, validate_fly_config, list_fly_profiles
 from ...crud import get_db
 from ...models import Project
+from ...utils.file_io import file_io, loop_lag_monitor
+from ...search_index import search_indexes
+from ...context_packer import context_packer
+from ...workspace_gc import workspace_gc
 import logging
 import json
 import traceback
 import asyncio
+import functools
+import time
 from datetime import datetime
 import uuid
 import os
@@ -39,20 +57,35 @@ router = APIRouter()
 # Remove any existing router.include_router() calls if present
 logger = logging.getLogger(__name__)
 
+DOCKER_CONTEXT_TOKENS = int(os.environ.get("DOCKER_CONTEXT_TOKENS", "2000"))
+
 deployments = {}
 cloned_repos = {}
+# Registered clones stay until they are removed through the API, whatever their size or age
+workspace_gc.protect(lambda: list(cloned_repos.values()))
 
 @router.post("/deploy", response_model=Dict[str, str], tags=["Deployment"])
 async def deploy(deploy_request: DeployRequest = Body(...)):
+    if deploy_drainer.draining:
+        raise HTTPException(
+            status_code=503, detail="The deploy service is shutting down; retry shortly.", headers={"Retry-After": "30"}
+        )
     app_name: Optional[str] = None
     repo_dir: Optional[str] = None
     try:
         repo = deploy_request.repo
         branch = deploy_request.branch
         args = deploy_request.args or []
-        memory = deploy_request.memory or 2048
+        memory = deploy_request.memory
+        profile = deploy_request.profile
 
-        logger.info(f"Deploying repository: {repo}, branch: {branch}, args: {args}, memory: {memory}MB")
+        logger.info(f"Deploying repository: {repo}, branch: {branch}, args: {args}, profile: {profile}, memory: {memory}MB")
+
+        # Reject a memory size the profile's VM cannot have before cloning anything
+        try:
+            validate_fly_config(generate_fly_config("preview", profile, memory))
+        except FlyConfigError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
         # Clone the repository
         repo_name = repo.split('/')[-1]
@@ -75,7 +108,8 @@ async def deploy(deploy_request: DeployRequest = Body(...)):
                 logger.error(f"Branch '{branch}' not found in repository '{repo}'.")
                 raise HTTPException(status_code=400, detail=f"Branch '{branch}' not found in repository '{repo}'.")
 
-        # Clone the repository
+        # Clone the repository; pinned so the workspace GC leaves it alone until deploy_app removes it
+        workspace_gc.pin(repo_dir)
         await execute_command(['git', 'clone', '-b', branch, clone_url, repo_dir])
 
         # Check if Dockerfile exists; if not, return an error
@@ -84,27 +118,38 @@ async def deploy(deploy_request: DeployRequest = Body(...)):
             error_msg = f"Dockerfile not found in repository '{repo}'. A Dockerfile is required for deployment."
             logger.error(error_msg)
             # Clean up the cloned repository
-            shutil.rmtree(repo_dir, ignore_errors=True)
+            await file_io.run(shutil.rmtree, repo_dir, ignore_errors=True)
             logger.info(f"Cleaned up repository directory: {repo_dir}")
             raise HTTPException(status_code=400, detail=error_msg)
 
-        # Generate a unique app name
-        app_name = f"preview-{repo_name.lower()}-{branch.lower() if branch else 'default'}-{timestamp}"
-        logger.info(f"Generated app name: {app_name}")
+        # Generate a unique app name; a pre-created app from the pool keeps its own name and takes this as its label
+        label = f"preview-{repo_name.lower()}-{branch.lower() if branch else 'default'}-{timestamp}"
+        pooled_app = app_pool.acquire(label) if preview_provider.uses_app_pool else None
+        app_name = pooled_app or label
+        logger.info(f"Generated app name: {label}" + (f" (pooled app {pooled_app})" if pooled_app else ""))
 
         # Start the deployment in the background
-        deployment_task = asyncio.create_task(deploy_app(repo, branch, args, app_name, repo_dir, memory))
+        deployment_task = asyncio.create_task(
+            deploy_app(
+                repo, branch, args, app_name, repo_dir, memory, profile,
+                pooled=pooled_app is not None, on_stopped=mark_stopped
+            )
+        )
 
         # Store the deployment status
         deployments[app_name] = {
             "status": "Deploying",
+            "label": label,
             "preview_url": None,
             "message": "Deployment started.",
             "timestamp": datetime.utcnow().isoformat()
         }
+        deployment_task.add_done_callback(lambda task: record_deployment(app_name, task))
+        deploy_drainer.track(app_name, deployment_task)
 
         return {
             "app_name": app_name,
+            "label": label,
             "message": "Deployment started.",
             "status_url": f"/status/{app_name}"
         }
@@ -112,29 +157,64 @@ async def deploy(deploy_request: DeployRequest = Body(...)):
     except HTTPException as http_exc:
         logger.error(f"HTTP exception occurred: {http_exc.detail}")
         # Clean up in case of HTTPException
+        if repo_dir:
+            workspace_gc.unpin(repo_dir)
         if repo_dir and os.path.exists(repo_dir):
-            shutil.rmtree(repo_dir, ignore_errors=True)
+            await file_io.run(shutil.rmtree, repo_dir, ignore_errors=True)
             logger.info(f"Cleaned up repository directory: {repo_dir}")
         raise http_exc
     except Exception as e:
         logger.error(f"Unexpected error occurred: {e}")
         # Clean up in case of general Exception
+        if repo_dir:
+            workspace_gc.unpin(repo_dir)
         if repo_dir and os.path.exists(repo_dir):
-            shutil.rmtree(repo_dir, ignore_errors=True)
+            await file_io.run(shutil.rmtree, repo_dir, ignore_errors=True)
             logger.info(f"Cleaned up repository directory: {repo_dir}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def record_deployment(app_name: str, task: asyncio.Task):
+    """Stores the outcome of a background deploy_app task, including its build context stats."""
+    if task.cancelled():
+        deployments[app_name].update({"status": "Cancelled", "timestamp": datetime.utcnow().isoformat()})
+    elif task.exception() is not None:
+        deployments[app_name].update({
+            "status": "Failed",
+            "message": str(task.exception()),
+            "timestamp": datetime.utcnow().isoformat()
+        })
+    else:
+        deployments[app_name] = {"label": deployments[app_name].get("label"), **task.result()}
+
+def mark_stopped(app_name: str, outcome: str):
+    """Records that the run time limit ended a preview, so its status no longer reports it as deployed."""
+    deployment = deployments.get(app_name)
+    if deployment is not None:
+        deployment.update({
+            "status": "Stopped",
+            "preview_url": None,
+            "expires_at": None,
+            "message": f"Run time limit reached; the app was {outcome}.",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+
+@router.get("/profiles", response_model=Dict[str, Any], tags=["Deployment"])
+async def get_fly_profiles():
+    return list_fly_profiles()
+
 @router.get("/status/{app_name}", response_model=Dict[str, Any], tags=["Deployment"])
 async def check_status(app_name: str):
     try:
         logger.info(f"Checking status for app: {app_name}")
-        status_output = await execute_command(['flyctl', 'status', '-a', app_name, '--json'])
-        status_data = json.loads(status_output)
+        status_data = await preview_provider.status(app_name)
         
         return {
             "app_name": app_name,
-            "status": status_data
+            "status": status_data,
+            "deployment": deployments.get(app_name)
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error checking app status: {e}")
         raise HTTPException(status_code=500, detail=f"Error checking app status: {str(e)}")
@@ -147,17 +227,7 @@ async def stream_logs(app_name: str):
 
     async def log_streamer():
         try:
-            process = await asyncio.create_subprocess_exec(
-                'flyctl', 'logs', '--app', app_name,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            while True:
-                line = await process.stdout.readline()
-                if not line:
-                    break
-                log_entry = line.decode('utf-8').strip()
-
+            async for log_entry in preview_provider.logs(app_name):
                 formatted_response = {
                     "choices": [
                         {
@@ -224,6 +294,7 @@ async def clone_repo(request: CloneRequest = Body(...)):
             raise HTTPException(status_code=400, detail=error_message)
 
         cloned_repos[repo_id] = str(project_dir)
+        search_indexes.schedule_build(repo_id, str(project_dir))
 
         logger.info(f"Repository cloned successfully with ID: {repo_id}")
         return {"repo_id": repo_id, "message": "Repository cloned successfully and project created"}
@@ -254,21 +325,105 @@ async def explore_repo(request: ExploreRequest = Body(...)):
 
     repo_path = cloned_repos[request.repo_id]
     full_path = os.path.join(repo_path, request.path or "")
+    workspace_gc.touch(repo_path)
 
     if request.action == "explore":
-        return await explore_directory(full_path)
+        return await explore_directory(
+            full_path, repo_path, request.depth, request.glob, request.gitignore, request.cursor, request.limit
+        )
     elif request.action == "modify":
-        return await modify_file(full_path, request.content)
+        result = await modify_file(full_path, request.content)
     elif request.action == "create":
-        return await create_file(full_path, request.content)
+        result = await create_file(full_path, request.content)
     elif request.action == "remove":
-        return await remove_file(full_path)
+        result = await remove_file(full_path)
     elif request.action == "create_dockerfile":
-        return await create_dockerfile(repo_path)
+        result = await create_dockerfile(repo_path)
+        full_path = os.path.join(repo_path, "Dockerfile")
     else:
         logger.error(f"Invalid action: {request.action}")
         raise HTTPException(status_code=400, detail="Invalid action")
 
+    await reindex_paths(request.repo_id, repo_path, [os.path.relpath(full_path, repo_path)])
+    return result
+
+async def reindex_paths(repo_id: str, repo_path: str, paths: List[str]):
+    try:
+        await file_io.run(search_indexes.update_paths, repo_id, repo_path, paths)
+    except Exception as e:
+        logger.error(f"Error updating search index for {repo_id}: {e}")
+
+@router.post("/explore/batch", response_model=Dict[str, Any], tags=["File Operations"])
+async def explore_batch(request: BatchExploreRequest = Body(...)):
+    if request.repo_id not in cloned_repos:
+        logger.warning(f"Repository not found for ID: {request.repo_id}")
+        raise HTTPException(status_code=404, detail="Repository not found")
+
+    repo_path = cloned_repos[request.repo_id]
+    workspace_gc.touch(repo_path)
+    operations = [operation.dict() for operation in request.operations]
+    try:
+        result = await file_io.run(apply_batch, repo_path, operations)
+    except Exception as e:
+        logger.error(f"Error applying batch to {repo_path}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if not result["applied"]:
+        return JSONResponse(status_code=status.HTTP_409_CONFLICT, content=result)
+    changed_paths = [
+        path
+        for item in result["results"] if item["action"] != "explore"
+        for path in item.get("paths", [item.get("path")])
+    ]
+    await reindex_paths(request.repo_id, repo_path, changed_paths)
+    logger.info(f"Applied {len(operations)} file operations to {repo_path}")
+    return result
+
+@router.post("/dockerfile/lint", response_model=Dict[str, Any], tags=["File Operations"])
+async def lint_repo_dockerfile(request: DockerfileLintRequest = Body(...)):
+    if request.repo_id not in cloned_repos:
+        logger.warning(f"Repository not found for ID: {request.repo_id}")
+        raise HTTPException(status_code=404, detail="Repository not found")
+
+    repo_path = cloned_repos[request.repo_id]
+    workspace_gc.touch(repo_path)
+    full_path = await file_io.run(resolve_repo_file, repo_path, request.dockerfile)
+    dockerfile = os.path.relpath(full_path, await file_io.run(os.path.realpath, repo_path))
+    try:
+        report = await file_io.run(lint_dockerfile, repo_path, dockerfile)
+        report["written"] = await file_io.run(apply_lint_fixes, repo_path, report) if request.fix else []
+    except Exception as e:
+        logger.error(f"Error linting {dockerfile} in {repo_path}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if report["written"]:
+        await reindex_paths(request.repo_id, repo_path, report["written"])
+    return report
+
+@router.get("/explore/{repo_id}/file", tags=["File Operations"])
+async def read_repo_file(
+    repo_id: str,
+    request: Request,
+    path: str = Query(..., description="File path within the repository"),
+    start_line: Optional[int] = Query(None, ge=1, description="Return lines from this line (1-based) as JSON instead of the raw file"),
+    end_line: Optional[int] = Query(None, ge=1, description="Last line to return with start_line")
+):
+    if repo_id not in cloned_repos:
+        logger.warning(f"Repository not found for ID: {repo_id}")
+        raise HTTPException(status_code=404, detail="Repository not found")
+
+    repo_path = cloned_repos[repo_id]
+    workspace_gc.touch(repo_path)
+    full_path = await file_io.run(resolve_repo_file, repo_path, path)
+    try:
+        if start_line is not None:
+            return {"path": path, **await file_io.run(read_line_range, full_path, start_line, end_line)}
+        # Raw content is streamed from disk with Range and conditional request support
+        return await file_io.run(file_response, request, full_path)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error reading file {full_path}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/projects", response_model=Dict[str, Any], tags=["Project"])
 async def list_projects(db: Session = Depends(get_db)):
     try:
@@ -332,7 +487,8 @@ async def delete_project(
     
     project_dir = os.path.join("projects", project_id)
     if os.path.exists(project_dir):
-        shutil.rmtree(project_dir)
+        await file_io.run(shutil.rmtree, project_dir)
+    search_indexes.drop(project_id)
     
     db.delete(project)
     db.commit()
@@ -351,7 +507,11 @@ async def stop_application(app_name: str, signal: str = "SIGINT", timeout: int =
         raise HTTPException(status_code=500, detail=f"Error stopping app: {str(e)}")
 
 @router.post("/docker", response_model=Dict[str, Any], tags=["File Operations"])
-async def create_dockerfile_endpoint(repo_id: str = Body(..., embed=True), db: Session = Depends(get_db)):
+async def create_dockerfile_endpoint(
+    repo_id: str = Body(..., embed=True),
+    use_llm: bool = Body(False, embed=True, description="Skip stack detection and have Aider write the Dockerfile"),
+    db: Session = Depends(get_db)
+):
     debug_info = {}
     try:
         project = db.query(Project).filter(Project.id == repo_id).first()
@@ -367,7 +527,7 @@ async def create_dockerfile_endpoint(repo_id: str = Body(..., embed=True), db: S
         project_dir = get_project_directory(project.id)
         debug_info["project_dir"] = str(project_dir)
         
-        if not project_dir.exists():
+        if not await file_io.run(project_dir.exists):
             error_message = f"Project directory not found: {project_dir}"
             debug_info["error"] = error_message
             logger.error(error_message)
@@ -377,31 +537,58 @@ async def create_dockerfile_endpoint(repo_id: str = Body(..., embed=True), db: S
         debug_info["project_contents"] = project_contents
         
         dockerfile_path = project_dir / "Dockerfile"
-        if dockerfile_path.exists():
+        if await file_io.run(dockerfile_path.exists):
             return {"message": "Dockerfile already exists", "debug_info": debug_info}
-        
-        aider_command = [
-            "aider",
-            "--yes-always",
-            f"--file={project_dir}",
-            "--message=Review the files and folder structure in this project. The project contents are: " + 
-            ", ".join(project_contents) + 
-            ". Identify the main application, its dependencies, and any specific requirements. " +
+
+        # Common stacks get a Dockerfile from their manifests in milliseconds;
+        # Aider only runs when the stack or entrypoint cannot be detected
+        generated = None if use_llm else await file_io.run(generate_dockerfile, str(project_dir))
+        if generated is not None:
+            await file_io.write_text(str(dockerfile_path), generated.content)
+            await reindex_paths(str(project.id), str(project_dir), ["Dockerfile"])
+            debug_info["generator"] = generated.info()
+            return {
+                "message": "Dockerfile created successfully",
+                "content": generated.content,
+                "debug_info": debug_info
+            }
+        debug_info["generator"] = "aider"
+
+        # Ranked files, summaries and a file list under a token budget replace
+        # the bare listing, so the model sees the manifests and entrypoints
+        packed = await file_io.run(
+            context_packer.pack, str(project_dir), DOCKER_CONTEXT_TOKENS, task="Dockerfile dependencies entrypoint"
+        )
+        debug_info["context"] = packed.stats()
+
+        message = (
+            "Review the files and folder structure in this project. " +
+            "Identify the main application, its dependencies, and any specific requirements. " +
             "If a requirements.txt file exists, use it to determine dependencies. " +
             "If you can't find enough information to create a complete Dockerfile, " +
             "create a basic Dockerfile with placeholders and comments explaining what additional information is needed. " +
             "Then, create a Dockerfile that can build and run this application. " +
             "The Dockerfile should be optimized for production use and follow best practices. " +
-            "Include comments in the Dockerfile to explain each step."
+            "Include comments in the Dockerfile to explain each step.\n\n" +
+            (packed.text or "The project contents are: " + ", ".join(project_contents))
+        )
+        # The packed context can be far larger than an argv entry allows, so
+        # the message goes to Aider on stdin
+        aider_command = [
+            "aider",
+            "--yes-always",
+            f"--file={project_dir}",
+            "--message-file", "/dev/stdin"
         ]
         debug_info["aider_command"] = " ".join(aider_command)
         
         process = await asyncio.create_subprocess_exec(
             *aider_command,
+            stdin=asyncio.subprocess.PIPE,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
-        stdout, stderr = await process.communicate()
+        stdout, stderr = await process.communicate(input=message.encode())
         debug_info["aider_stdout"] = stdout.decode()
         debug_info["aider_stderr"] = stderr.decode()
         
@@ -471,6 +658,7 @@ async def create_app(app_name: str = Body(...)):
 async def delete_app(app_name: str):
     try:
         await execute_command(['flyctl', 'apps', 'destroy', app_name, '--yes'])
+        scaling_advisor.unregister(app_name)
         return {"message": f"App {app_name} deleted successfully"}
     except Exception as e:
         logger.error(f"Error deleting app: {e}")
@@ -485,22 +673,26 @@ async def get_config(app_name: str):
         logger.error(f"Error getting config: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.put("/config/{app_name}", response_model=Dict[str, str], tags=["Configuration"])
+@router.put("/config/{app_name}", response_model=Dict[str, Any], tags=["Configuration"])
 async def update_config(app_name: str, config: Dict[str, Any] = Body(...)):
     try:
-        for key, value in config.items():
-            await execute_command(['flyctl', 'config', 'set', f"{key}={value}", '--app', app_name])
-        return {"message": f"Configuration for {app_name} updated successfully"}
+        result = await apply_config(app_name, config)
+        return {"message": f"Configuration for {app_name} updated successfully", **result}
     except Exception as e:
         logger.error(f"Error updating config: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/secrets/{app_name}", response_model=Dict[str, str], tags=["Configuration"])
-async def set_secrets(app_name: str, secrets: Dict[str, str] = Body(...)):
+@router.post("/secrets/{app_name}", response_model=Dict[str, Any], tags=["Configuration"])
+async def set_secrets(
+    app_name: str,
+    secrets: Dict[str, str] = Body(...),
+    stage: bool = Query(False, description="Store the secrets without restarting machines; the next deploy applies them")
+):
     try:
-        for key, value in secrets.items():
-            await execute_command(['flyctl', 'secrets', 'set', f"{key}={value}", '--app', app_name])
-        return {"message": f"Secrets for {app_name} set successfully"}
+        result = await apply_secrets(app_name, secrets, stage)
+        return {"message": f"Secrets for {app_name} set successfully", **result}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error setting secrets: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -527,6 +719,39 @@ async def update_scale(app_name: str, scale: Dict[str, Any] = Body(...)):
         logger.error(f"Error updating scale: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/autoscale", response_model=Dict[str, Any], tags=["Scaling"])
+async def autoscale_report():
+    return scaling_advisor.report()
+
+@router.get("/autoscale/{app_name}", response_model=Dict[str, Any], tags=["Scaling"])
+async def autoscale_app_report(app_name: str):
+    if app_name not in scaling_advisor.previews:
+        raise HTTPException(status_code=404, detail="App is not tracked by the autoscaler")
+    return scaling_advisor.report(app_name)[app_name]
+
+@router.post("/autoscale/{app_name}", response_model=Dict[str, Any], tags=["Scaling"])
+async def autoscale_register(app_name: str, request: AutoscaleRegisterRequest = Body(...)):
+    scaling_advisor.register(app_name, request.url, request.profile, request.memory, request.machines, request.source)
+    return scaling_advisor.report(app_name)[app_name]
+
+@router.post("/autoscale/{app_name}/evaluate", response_model=Dict[str, Any], tags=["Scaling"])
+async def autoscale_evaluate(app_name: str, apply: bool = Query(False, description="Run the recommended scale command")):
+    if app_name not in scaling_advisor.previews:
+        raise HTTPException(status_code=404, detail="App is not tracked by the autoscaler")
+    try:
+        await scaling_advisor.sample(app_name)
+        recommendation = scaling_advisor.evaluate(app_name)
+        command = await scaling_advisor.apply(app_name, recommendation) if apply else None
+        return {**recommendation, "applied": command is not None, "command": command}
+    except Exception as e:
+        logger.error(f"Error evaluating autoscale for {app_name}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/autoscale/{app_name}", response_model=Dict[str, str], tags=["Scaling"])
+async def autoscale_unregister(app_name: str):
+    scaling_advisor.unregister(app_name)
+    return {"message": f"Stopped autoscaling {app_name}"}
+
 @router.get("/releases/{app_name}", response_model=List[Dict[str, Any]], tags=["Monitoring"])
 async def list_releases(app_name: str):
     try:
@@ -545,17 +770,112 @@ async def get_version():
         logger.error(f"Error getting version: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/metrics/io", response_model=Dict[str, Any], tags=["Monitoring"])
+async def get_io_metrics():
+    return {"file_io": file_io.snapshot(), "loop_lag": loop_lag_monitor.snapshot()}
+
+@router.get("/metrics/pool", response_model=Dict[str, Any], tags=["Monitoring"])
+async def get_pool_metrics():
+    return app_pool.snapshot()
+
+@router.get("/metrics/drain", response_model=Dict[str, Any], tags=["Monitoring"])
+async def get_drain_metrics():
+    return deploy_drainer.snapshot()
+
+@router.post("/drain", response_model=Dict[str, Any], tags=["Deployment"])
+async def start_drain():
+    """Stops accepting deploys ahead of a restart, e.g. from a pre-stop hook; running builds carry on."""
+    deploy_drainer.start_draining()
+    return deploy_drainer.snapshot()
+
+@router.on_event("startup")
+async def start_loop_lag_monitor():
+    loop_lag_monitor.start()
+
+@router.on_event("startup")
+async def restore_deployments():
+    """Takes over the previews, clones and pool apps handed off by the previous instance."""
+    state = deploy_drainer.load()
+    if not state:
+        return
+    deployments.update(state.get("deployments", {}))
+    cloned_repos.update({
+        repo_id: repo_path for repo_id, repo_path in state.get("cloned_repos", {}).items() if os.path.isdir(repo_path)
+    })
+    if preview_provider.uses_app_pool:
+        app_pool.adopt(state.get("pool", {}))
+    for app_name, deployment in deployments.items():
+        expires_at = deployment.get("expires_at")
+        if deployment.get("status") == "Deployed" and expires_at:
+            # A preview that expired while no instance was running is stopped right away
+            asyncio.create_task(
+                stop_instance(app_name, delay=max(expires_at - time.time(), 1), on_stopped=mark_stopped)
+            )
+    logger.info(f"Restored {len(deployments)} deployments and {len(cloned_repos)} repositories from the previous instance")
+
+@router.on_event("startup")
+async def start_scaling_advisor():
+    scaling_advisor.start()
+
+@router.on_event("startup")
+async def start_app_pool():
+    if preview_provider.uses_app_pool:
+        app_pool.start()
+
 @router.on_event("shutdown")
-async def cleanup():
-    for app_name in list(deployments.keys()):
-        try:
-            await execute_command(['flyctl', 'apps', 'destroy', app_name, '--yes'])
-            logger.info(f"Destroyed app: {app_name}")
-            del deployments[app_name]
-        except Exception as e:
-            logger.error(f"Error destroying app during cleanup: {e}")
+async def stop_monitors():
+    await loop_lag_monitor.stop()
+    await scaling_advisor.stop()
 
-    for repo_id, repo_path in cloned_repos.items():
-        logger.info(f"Repository preserved: {repo_id} at {repo_path}")
+@router.on_event("shutdown")
+async def cleanup():
+    # The hook can be reached through more than one router; a second run would hand off an empty registry
+    if deploy_drainer.finished:
+        return
+    started = time.perf_counter()
+    deploy_drainer.start_draining()
+    await app_pool.stop()
+    interrupted = await deploy_drainer.wait_for_builds()
+
+    if SHUTDOWN_TEARDOWN or not preview_provider.survives_restart:
+        # Previews that already ended were recycled into the pool; draining it destroys them once
+        drained = set(await app_pool.drain(deploy_drainer.concurrency))
+        released = await deploy_drainer.teardown(
+            [
+                app_name for app_name, deployment in deployments.items()
+                if app_name not in drained and deployment.get("status") != "Stopped"
+            ],
+            preview_provider.destroy
+        )
+        handoff = False
+    else:
+        # Cancelled builds left half-deployed apps that nobody would stop; everything else carries on.
+        # Their URLs were never handed out, so pooled ones can be recycled.
+        drained = set()
+        released = await deploy_drainer.teardown(interrupted, functools.partial(release_app, served=False))
+        handoff = True
+    for app_name in drained.union(released):
+        deployments.pop(app_name, None)
+        scaling_advisor.unregister(app_name)
+
+    if handoff:
+        # Previews past their run time limit were already released by their stop timers
+        now = time.time()
+        live = {
+            app_name: deployment for app_name, deployment in deployments.items()
+            if deployment.get("status") != "Stopped"
+            and (not deployment.get("expires_at") or deployment["expires_at"] > now)
+        }
+        deploy_drainer.save({"deployments": live, "cloned_repos": cloned_repos, "pool": app_pool.handoff()})
+    else:
+        for repo_id, repo_path in cloned_repos.items():
+            logger.info(f"Repository preserved: {repo_id} at {repo_path}")
 
+    deployments.clear()
     cloned_repos.clear()
+    deploy_drainer.finished = True
+    deploy_drainer.metrics["drain_seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"Shutdown drain finished in {deploy_drainer.metrics['drain_seconds']}s")
+    # Builds and teardowns finishing during the drain still write through the pool, so it goes last;
+    # waiting for its queued writes blocks, so not on the loop
+    await asyncio.to_thread(file_io.shutdown, True)
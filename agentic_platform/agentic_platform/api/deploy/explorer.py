@@ -0,0 +1,113 @@
+import os
+import stat
+from datetime import datetime, timezone
+from typing import Optional
+from ...utils.ignore import GitignoreMatcher, translate_pattern
+
+EXPLORE_DEFAULT_LIMIT = 1000
+EXPLORE_MAX_LIMIT = 10000
+EXPLORE_MAX_DEPTH = 32
+
+def _entry_info(entry, relative_path):
+    try:
+        info = entry.stat(follow_symlinks=False)
+    except FileNotFoundError:
+        return None
+    if stat.S_ISLNK(info.st_mode):
+        entry_type = "symlink"
+    elif stat.S_ISDIR(info.st_mode):
+        entry_type = "directory"
+    elif stat.S_ISREG(info.st_mode):
+        entry_type = "file"
+    else:
+        entry_type = "other"
+    return {
+        "path": relative_path,
+        "name": entry.name,
+        "type": entry_type,
+        "size": info.st_size if entry_type == "file" else None,
+        "mtime": datetime.fromtimestamp(info.st_mtime, tz=timezone.utc).isoformat()
+    }
+
+def list_tree(
+    root: str,
+    path: str = "",
+    depth: int = 1,
+    glob: Optional[str] = None,
+    gitignore: bool = True,
+    cursor: Optional[str] = None,
+    limit: int = EXPLORE_DEFAULT_LIMIT
+):
+    """
+    Lists the entries below ``path`` in pre-order, sorted by name at every level.
+
+    Args:
+        root (str): Repository root; ``.gitignore`` files are read relative to it.
+        path (str): Directory to list, relative to ``root``.
+        depth (int): How many levels to descend; 1 lists the directory's children.
+        glob (str, optional): Only return entries matching this gitignore-style glob
+            (relative to ``path``); directories are still descended into.
+        gitignore (bool): Skip entries ignored by the repository's ``.gitignore`` files.
+        cursor (str, optional): The ``next_cursor`` of a previous page.
+        limit (int): Maximum number of entries to return.
+
+    Returns:
+        dict: The entries, each with path, name, type, size and mtime, and the
+        cursor for the next page (None on the last page).
+
+    Raises:
+        ValueError: If ``path`` or ``cursor`` points outside the listed directory.
+    """
+    root = os.path.realpath(root)
+    base = os.path.realpath(os.path.join(root, path or ""))
+    if os.path.commonpath([root, base]) != root:
+        raise ValueError("Path is outside the repository")
+    base_relative = os.path.relpath(base, root).replace(os.sep, "/")
+    base_relative = "" if base_relative == "." else base_relative
+
+    matcher = GitignoreMatcher(root) if gitignore else None
+    glob_regex = translate_pattern(glob) if glob else None
+    resume = tuple(cursor.split("/")) if cursor else ()
+    if ".." in resume or "" in resume:
+        raise ValueError("Invalid cursor")
+
+    entries = []
+    next_cursor = None
+
+    def walk(relative_dir, parts, level):
+        # Returns False once the page is full
+        nonlocal next_cursor
+        on_resume_path = resume and parts == resume[:len(parts)] and len(parts) < len(resume)
+        try:
+            with os.scandir(os.path.join(base, relative_dir)) as iterator:
+                children = sorted(iterator, key=lambda entry: entry.name)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return True
+
+        for entry in children:
+            if on_resume_path and entry.name < resume[len(parts)]:
+                continue
+            relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if matcher is not None:
+                repo_path = f"{base_relative}/{relative_path}" if base_relative else relative_path
+                if matcher.match(repo_path, is_dir):
+                    continue
+
+            # The cursor entry itself was returned on the previous page
+            already_listed = on_resume_path and parts + (entry.name,) == resume[:len(parts) + 1]
+            if not already_listed and (glob_regex is None or glob_regex.match(relative_path)):
+                if len(entries) >= limit:
+                    next_cursor = entries[-1]["path"]
+                    return False
+                info = _entry_info(entry, relative_path)
+                if info is not None:
+                    entries.append(info)
+
+            if is_dir and level < depth:
+                if not walk(relative_path, parts + (entry.name,), level + 1):
+                    return False
+        return True
+
+    walk("", (), 1)
+    return {"path": base_relative, "entries": entries, "next_cursor": next_cursor}
@@ -0,0 +1,158 @@
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from itertools import islice
+from typing import Optional
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+FILE_CHUNK_SIZE = 64 * 1024
+BINARY_SNIFF_BYTES = 8192
+MAX_SLICE_LINES = 10000
+# Text files up to this size are still inlined by the explore action
+INLINE_CONTENT_MAX_BYTES = int(os.environ.get("EXPLORE_INLINE_MAX_BYTES", str(1024 * 1024)))
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def resolve_repo_file(repo_path: str, path: str) -> str:
+    """Returns the real path of ``path`` inside ``repo_path``, rejecting paths that escape it."""
+    root = os.path.realpath(repo_path)
+    full_path = os.path.realpath(os.path.join(root, path or ""))
+    if os.path.commonpath([root, full_path]) != root:
+        raise HTTPException(status_code=400, detail="Path is outside the repository")
+    if not os.path.isfile(full_path):
+        raise HTTPException(status_code=404, detail="File does not exist")
+    return full_path
+
+def file_etag(stat_result) -> str:
+    return f'"{stat_result.st_ino:x}-{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+def is_binary_file(path: str) -> bool:
+    """Sniffs the start of a file: NUL bytes or invalid UTF-8 mean binary."""
+    with open(path, "rb") as f:
+        head = f.read(BINARY_SNIFF_BYTES)
+    if b"\0" in head:
+        return True
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the sniff window is still text
+        return e.start < len(head) - 3
+    return False
+
+def not_modified(request: Request, etag: str, stat_result) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(stat_result.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def parse_range(header: Optional[str], size: int):
+    """
+    Parses a single-range ``Range`` header.
+
+    Returns:
+        tuple: (start, end) inclusive, or None to send the whole file.
+
+    Raises:
+        HTTPException: 416 if the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        # Multiple or malformed ranges: fall back to the full content
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+def _read_range(path: str, start: int, end: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(FILE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def file_response(request: Request, path: str, media_type: Optional[str] = None):
+    """
+    Serves ``path`` with ETag/Last-Modified validators and single-range support.
+    Runs its blocking stat in the caller; call it from a worker thread.
+    """
+    stat_result = os.stat(path)
+    etag = file_etag(stat_result)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes"
+    }
+    if not_modified(request, etag, stat_result):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = parse_range(request.headers.get("range"), stat_result.st_size)
+    if_range = request.headers.get("if-range")
+    if byte_range is not None and if_range and if_range.strip() not in (etag, headers["Last-Modified"]):
+        byte_range = None
+
+    media_type = media_type or ("application/octet-stream" if is_binary_file(path) else "text/plain; charset=utf-8")
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat_result)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_read_range(path, start, end), status_code=206, media_type=media_type, headers=headers)
+
+def read_line_range(path: str, start_line: int, end_line: Optional[int]):
+    """
+    Returns lines ``start_line`` to ``end_line`` (1-based, inclusive) of a text
+    file, capped at ``MAX_SLICE_LINES``, reading only as far as needed.
+    """
+    if is_binary_file(path):
+        raise HTTPException(status_code=415, detail="Line ranges are only available for text files")
+    last_line = start_line + MAX_SLICE_LINES - 1
+    if end_line is not None:
+        if end_line < start_line:
+            raise HTTPException(status_code=400, detail="end_line must not be before start_line")
+        last_line = min(end_line, last_line)
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        lines = list(islice(f, start_line - 1, last_line + 1))
+    has_more = len(lines) > last_line - start_line + 1
+    lines = lines[:last_line - start_line + 1]
+    return {
+        "start_line": start_line,
+        "end_line": start_line + len(lines) - 1 if lines else None,
+        "lines": [line.rstrip("\r\n") for line in lines],
+        "next_line": start_line + len(lines) if has_more else None
+    }
+
+def read_inline_content(path: str):
+    """The explore action's file payload: content for small text files, metadata otherwise."""
+    size = os.path.getsize(path)
+    if is_binary_file(path):
+        return {"type": "file", "binary": True, "size": size, "content": None}
+    if size > INLINE_CONTENT_MAX_BYTES:
+        return {"type": "file", "binary": False, "size": size, "content": None, "truncated": True}
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return {"type": "file", "binary": False, "size": size, "content": f.read()}
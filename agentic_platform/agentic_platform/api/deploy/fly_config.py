@@ -0,0 +1,264 @@
+import copy
+import os
+from functools import lru_cache
+from typing import Optional
+from ...utils.toml import TomlError, dumps, loads
+
+DEFAULT_FLY_PROFILE = os.environ.get("FLY_DEFAULT_PROFILE", "preview")
+DEFAULT_INTERNAL_PORT = 8080
+
+# Named machine and service settings; a deploy picks one and may override memory.
+# Settings a profile leaves out are not written: Fly's defaults apply to a
+# generated fly.toml, and a repository's own values are kept when merging.
+FLY_PROFILES = {
+    "preview": {
+        "description": "Previews as they have always been deployed: shared VM, Fly's autostop defaults",
+        "cpu_kind": "shared", "cpus": 1, "memory_mb": 2048,
+        "soft_limit": 20, "hard_limit": 25,
+    },
+    "micro": {
+        "description": "Static sites and tiny APIs",
+        "cpu_kind": "shared", "cpus": 1, "memory_mb": 256,
+        "soft_limit": 10, "hard_limit": 15,
+        "auto_stop_machines": "stop", "auto_start_machines": True, "min_machines_running": 0,
+    },
+    "standard": {
+        "description": "Typical web apps with moderate traffic",
+        "cpu_kind": "shared", "cpus": 2, "memory_mb": 2048,
+        "soft_limit": 50, "hard_limit": 75,
+        "auto_stop_machines": "suspend", "auto_start_machines": True, "min_machines_running": 0,
+    },
+    "always-on": {
+        "description": "Demos that must answer without a cold start",
+        "cpu_kind": "shared", "cpus": 1, "memory_mb": 1024,
+        "soft_limit": 25, "hard_limit": 40,
+        "auto_stop_machines": "off", "auto_start_machines": True, "min_machines_running": 1,
+    },
+    "performance": {
+        "description": "CPU-heavy workloads on dedicated cores",
+        "cpu_kind": "performance", "cpus": 2, "memory_mb": 4096,
+        "soft_limit": 150, "hard_limit": 200,
+        "auto_stop_machines": "off", "auto_start_machines": True, "min_machines_running": 1,
+    },
+}
+
+CPU_COUNTS = {"shared": (1, 2, 4, 8), "performance": (1, 2, 4, 8, 16)}
+# Fly's memory bounds per CPU: shared CPUs allow 256MB-2GB, performance CPUs 2GB-8GB
+MEMORY_PER_CPU = {"shared": (256, 2048), "performance": (2048, 8192)}
+AUTO_STOP_VALUES = ("off", "stop", "suspend")
+VM_SETTINGS = ("cpu_kind", "cpus", "memory_mb")
+SERVICE_SETTINGS = ("auto_stop_machines", "auto_start_machines", "min_machines_running")
+
+class FlyConfigError(ValueError):
+    pass
+
+def _check(condition, message, errors):
+    if not condition:
+        errors.append(message)
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _validate_service(service, name, errors):
+    port = service.get("internal_port")
+    _check(_is_int(port) and 0 < port < 65536, f"{name}.internal_port must be a port number", errors)
+    auto_stop = service.get("auto_stop_machines")
+    if auto_stop is not None:
+        _check(
+            isinstance(auto_stop, bool) or auto_stop in AUTO_STOP_VALUES,
+            f"{name}.auto_stop_machines must be a boolean or one of {', '.join(AUTO_STOP_VALUES)}", errors
+        )
+    if "auto_start_machines" in service:
+        _check(isinstance(service["auto_start_machines"], bool), f"{name}.auto_start_machines must be a boolean", errors)
+    if "min_machines_running" in service:
+        minimum = service["min_machines_running"]
+        _check(_is_int(minimum) and minimum >= 0, f"{name}.min_machines_running must be a non-negative integer", errors)
+    concurrency = service.get("concurrency")
+    if concurrency is not None:
+        if not isinstance(concurrency, dict):
+            errors.append(f"{name}.concurrency must be a table")
+            return
+        _check(
+            concurrency.get("type", "connections") in ("connections", "requests"),
+            f"{name}.concurrency.type must be connections or requests", errors
+        )
+        soft, hard = concurrency.get("soft_limit"), concurrency.get("hard_limit")
+        for key, limit in (("soft_limit", soft), ("hard_limit", hard)):
+            if limit is not None:
+                _check(_is_int(limit) and limit > 0, f"{name}.concurrency.{key} must be a positive integer", errors)
+        if _is_int(soft) and _is_int(hard):
+            _check(soft <= hard, f"{name}.concurrency.soft_limit must not exceed hard_limit", errors)
+
+def validate_fly_config(config):
+    """
+    Checks the parts of a fly.toml this module manages: app name, VM sizes,
+    and the concurrency and autostop settings of every service.
+
+    Raises:
+        FlyConfigError: Listing every problem found.
+    """
+    errors = []
+    _check(isinstance(config.get("app"), str) and config["app"], "app must be a non-empty string", errors)
+    vms = config.get("vm", [])
+    for index, vm in enumerate(vms if isinstance(vms, list) else [vms]):
+        name = f"vm[{index}]"
+        if not isinstance(vm, dict):
+            errors.append(f"{name} must be a table")
+            continue
+        kind = vm.get("cpu_kind", "shared")
+        cpus = vm.get("cpus", 1)
+        _check(kind in CPU_COUNTS, f"{name}.cpu_kind must be shared or performance", errors)
+        _check(cpus in CPU_COUNTS.get(kind, ()), f"{name}.cpus must be one of {CPU_COUNTS.get(kind, ())}", errors)
+        memory = vm.get("memory_mb")
+        if memory is not None and kind in MEMORY_PER_CPU and _is_int(cpus):
+            low, high = MEMORY_PER_CPU[kind]
+            _check(
+                _is_int(memory) and memory % 256 == 0 and low * cpus <= memory <= high * cpus,
+                f"{name}.memory_mb must be a multiple of 256 between {low * cpus} and {high * cpus} for {cpus} {kind} CPU(s)",
+                errors
+            )
+    if "http_service" in config:
+        if isinstance(config["http_service"], dict):
+            _validate_service(config["http_service"], "http_service", errors)
+        else:
+            errors.append("http_service must be a table")
+    for index, service in enumerate(config.get("services", [])):
+        if isinstance(service, dict):
+            _validate_service(service, f"services[{index}]", errors)
+        else:
+            errors.append(f"services[{index}] must be a table")
+    if errors:
+        raise FlyConfigError("; ".join(errors))
+
+def _vm_settings(profile, memory=None):
+    settings = {key: profile[key] for key in VM_SETTINGS if key in profile}
+    if memory:
+        settings["memory_mb"] = memory
+    return settings
+
+def _service_settings(profile):
+    return {key: profile[key] for key in SERVICE_SETTINGS if key in profile}
+
+def _concurrency(profile, kind):
+    return {"type": kind, "soft_limit": profile["soft_limit"], "hard_limit": profile["hard_limit"]}
+
+def _profile(profile_name):
+    if profile_name not in FLY_PROFILES:
+        raise FlyConfigError(f"Unknown profile '{profile_name}'; available: {', '.join(FLY_PROFILES)}")
+    return FLY_PROFILES[profile_name]
+
+def generate_fly_config(app_name: str, profile_name: Optional[str] = None, memory: Optional[int] = None):
+    """
+    Builds a fly.toml document for ``app_name`` from a named profile.
+
+    Args:
+        app_name (str): Fly app name.
+        profile_name (str): Key of ``FLY_PROFILES``; defaults to ``DEFAULT_FLY_PROFILE``.
+        memory (int): Overrides the profile's memory_mb.
+
+    Returns:
+        dict: The configuration; ``dumps`` turns it into fly.toml text.
+    """
+    profile = _profile(profile_name or DEFAULT_FLY_PROFILE)
+    return {
+        "app": app_name,
+        "build": {"dockerfile": "Dockerfile"},
+        "env": {"PORT": str(DEFAULT_INTERNAL_PORT)},
+        "vm": [_vm_settings(profile, memory)],
+        "services": [{
+            "internal_port": DEFAULT_INTERNAL_PORT,
+            "processes": ["app"],
+            "protocol": "tcp",
+            **_service_settings(profile),
+            "concurrency": _concurrency(profile, "requests"),
+            "ports": [{"handlers": ["http"], "port": 80}, {"handlers": ["tls", "http"], "port": 443}],
+            "tcp_checks": [{"grace_period": "1s", "interval": "15s", "restart_limit": 0, "timeout": "2s"}],
+        }],
+    }
+
+def merge_fly_config(existing, app_name: str, profile_name: Optional[str] = None, memory: Optional[int] = None):
+    """
+    Applies a deploy's profile onto a repository's own fly.toml.
+
+    The repository keeps everything the profile does not set. A named
+    profile overrides the VM settings of every ``[[vm]]`` entry and the
+    concurrency and autostop settings of each ``[http_service]`` or
+    ``[[services]]`` entry, but only those it defines; ``memory`` overrides
+    memory_mb. Without a profile only the app name (and ``memory``) change.
+    A file with no service gets the generated one.
+    """
+    profile = _profile(profile_name) if profile_name else {}
+    merged = copy.deepcopy(existing)
+    merged["app"] = app_name
+    if not isinstance(merged.get("build"), dict):
+        merged["build"] = {"dockerfile": "Dockerfile"}
+
+    vm_settings = _vm_settings(profile, memory)
+    if vm_settings:
+        vms = merged.get("vm")
+        vms = [vms] if isinstance(vms, dict) else [vm for vm in vms or [] if isinstance(vm, dict)]
+        for vm in vms:
+            vm.update(vm_settings)
+        if not vms:
+            merged["vm"] = [vm_settings]
+
+    settings = _service_settings(profile)
+    limits = {key: profile[key] for key in ("soft_limit", "hard_limit") if key in profile}
+    services = [service for service in merged.get("services") or [] if isinstance(service, dict)]
+    http_service = merged.get("http_service") if isinstance(merged.get("http_service"), dict) else None
+    if http_service is not None:
+        services.append(http_service)
+    for service in services:
+        service.update(settings)
+        if not limits:
+            continue
+        current = service.get("concurrency") if isinstance(service.get("concurrency"), dict) else {}
+        # Keep the repository's counting mode; only HTTP services can count requests
+        kind = current.get("type") or (
+            "requests" if service is http_service or _has_http_handler(service) else "connections"
+        )
+        service["concurrency"] = {**current, "type": kind, **limits}
+    if not services:
+        merged["services"] = generate_fly_config(app_name, profile_name, memory)["services"]
+        env = merged.setdefault("env", {})
+        if isinstance(env, dict):
+            env.setdefault("PORT", str(DEFAULT_INTERNAL_PORT))
+    return merged
+
+def _has_http_handler(service):
+    return any("http" in (port.get("handlers") or []) for port in service.get("ports") or [] if isinstance(port, dict))
+
+@lru_cache(maxsize=256)
+def _merged_fly_config(profile_name, memory, existing_text):
+    # Every deploy gets a fresh app name, so the name is left out of the cache key and set by the caller
+    if existing_text is None:
+        config = generate_fly_config("app", profile_name, memory)
+    else:
+        try:
+            existing = loads(existing_text)
+        except TomlError as e:
+            raise FlyConfigError(f"Existing fly.toml is not valid TOML: {e}")
+        config = merge_fly_config(existing, "app", profile_name, memory)
+    validate_fly_config(config)
+    return config
+
+def render_fly_config(app_name: str, profile_name: Optional[str] = None, memory: Optional[int] = None,
+                      existing_text: Optional[str] = None):
+    """
+    Returns validated fly.toml text for a deploy, merged onto ``existing_text``
+    when the repository has its own fly.toml. Without ``profile_name`` a new
+    file uses ``DEFAULT_FLY_PROFILE`` and an existing one keeps its settings. The merged configuration is
+    cached on the profile, memory and existing file, since repeated deploys
+    of the same repository produce the same inputs under new app names.
+
+    Raises:
+        FlyConfigError: If the profile, the existing file or the result is invalid.
+    """
+    if not app_name:
+        raise FlyConfigError("app must be a non-empty string")
+    config = copy.deepcopy(_merged_fly_config(profile_name, memory, existing_text))
+    config["app"] = app_name
+    return dumps(config)
+
+def list_fly_profiles():
+    return {name: dict(profile) for name, profile in FLY_PROFILES.items()}
@@ -32,15 +32,28 @@ class ExploreRequest(BaseModel):
     action: str
     path: Optional[str] = ""
     content: Optional[str] = ""
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from typing import List, Optional
+from .explorer import EXPLORE_DEFAULT_LIMIT, EXPLORE_MAX_DEPTH, EXPLORE_MAX_LIMIT
+from .fly_config import DEFAULT_FLY_PROFILE, FLY_PROFILES
 
 class DeployRequest(BaseModel):
     repo: str = Field(..., description="GitHub repository in the format 'username/repo'")
     branch: str = Field(..., description="Git branch to deploy")
     args: Optional[List[str]] = Field(default=[], description="Additional arguments for deployment")
-    memory: Optional[int] = Field(default=2048, description="Memory allocation in MB")
+    memory: Optional[int] = Field(default=None, description="Memory allocation in MB; defaults to the profile's")
     app_name: Optional[str] = Field(default=None, description="Optional custom name for the application")
+    profile: Optional[str] = Field(
+        default=None,
+        description=f"fly.toml profile: {', '.join(FLY_PROFILES)}; a repository's own fly.toml is only changed when "
+                    f"one is named, a generated one defaults to {DEFAULT_FLY_PROFILE}"
+    )
+
+    @validator("profile")
+    def known_profile(cls, value):
+        if value is not None and value not in FLY_PROFILES:
+            raise ValueError(f"Unknown profile '{value}'; available: {', '.join(FLY_PROFILES)}")
+        return value
 
 class CloneRequest(BaseModel):
     repo_url: str = Field(..., description="GitHub repository URL")
@@ -55,3 +68,42 @@ class ExploreRequest(BaseModel):
     path: Optional[str] = Field(default="", description="Path within the repository to explore")
     action: str = Field(..., description="Action to perform: explore, modify, create, remove, or create_dockerfile")
     content: Optional[str] = Field(default=None, description="Content for file creation or modification")
+    depth: int = Field(default=1, ge=1, le=EXPLORE_MAX_DEPTH, description="Directory levels to list when exploring")
+    glob: Optional[str] = Field(default=None, description="Only list entries matching this glob, e.g. '**/*.py'")
+    gitignore: bool = Field(default=True, description="Skip entries ignored by the repository's .gitignore files")
+    cursor: Optional[str] = Field(default=None, description="next_cursor of the previous page")
+    limit: int = Field(default=EXPLORE_DEFAULT_LIMIT, ge=1, le=EXPLORE_MAX_LIMIT, description="Maximum entries per page")
+
+class FileOperation(BaseModel):
+    action: str = Field(..., description="Operation: explore, modify, create, remove or patch")
+    path: Optional[str] = Field(default="", description="Path within the repository")
+    content: Optional[str] = Field(default=None, description="Content for create or modify")
+    diff: Optional[str] = Field(default=None, description="Unified diff for patch; path is used when it has no file headers")
+
+class BatchExploreRequest(BaseModel):
+    repo_id: str = Field(..., description="ID of the repository")
+    operations: List[FileOperation] = Field(..., min_items=1, description="Operations applied in order, all or nothing")
+
+class DockerfileLintRequest(BaseModel):
+    repo_id: str = Field(..., description="ID of the repository")
+    dockerfile: str = Field(default="Dockerfile", description="Dockerfile path within the repository")
+    fix: bool = Field(default=False, description="Write the optimized Dockerfile and add missing .dockerignore entries")
+
+class AutoscaleRegisterRequest(BaseModel):
+    url: str = Field(..., description="Base URL of the preview; its health endpoint is probed with the health source")
+    profile: str = Field(default=DEFAULT_FLY_PROFILE, description="Profile whose limits and VM size apply")
+    memory: Optional[int] = Field(default=None, description="Current memory in MB when it differs from the profile's")
+    machines: int = Field(default=1, ge=1, description="Machines currently running")
+    source: str = Field(default="logs", description="Sample source: logs, or health (keeps auto-stopped machines awake)")
+
+    @validator("profile")
+    def known_profile(cls, value):
+        if value not in FLY_PROFILES:
+            raise ValueError(f"Unknown profile '{value}'; available: {', '.join(FLY_PROFILES)}")
+        return value
+
+    @validator("source")
+    def known_source(cls, value):
+        if value not in ("health", "logs"):
+            raise ValueError("source must be health or logs")
+        return value
@@ -0,0 +1,152 @@
+import re
+from typing import List, Optional
+
+HUNK_HEADER_PATTERN = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+class PatchError(ValueError):
+    pass
+
+class Hunk:
+    def __init__(self, old_start: int, old_lines: List[str], new_lines: List[str]):
+        self.old_start = old_start
+        self.old_lines = old_lines
+        self.new_lines = new_lines
+
+class FilePatch:
+    def __init__(self, old_path: Optional[str], new_path: Optional[str]):
+        self.old_path = old_path
+        self.new_path = new_path
+        self.hunks = []
+
+    @property
+    def path(self):
+        return self.new_path or self.old_path
+
+    @property
+    def is_new(self):
+        return self.old_path is None
+
+    @property
+    def is_deleted(self):
+        return self.new_path is None
+
+def _strip_prefix(header: str) -> Optional[str]:
+    path = header.split("\t", 1)[0].strip()
+    if path == "/dev/null":
+        return None
+    if path.startswith(("a/", "b/")):
+        path = path[2:]
+    return path
+
+def _strip_newline(sides):
+    for side in sides:
+        if side and side[-1].endswith("\n"):
+            side[-1] = side[-1][:-1]
+
+def parse_unified_diff(diff: str, default_path: Optional[str] = None) -> List[FilePatch]:
+    """
+    Parses a unified diff into per-file patches.
+
+    Args:
+        diff (str): The diff, as produced by ``diff -u`` or ``git diff``.
+        default_path (str, optional): File the hunks apply to when the diff has
+            no ``---``/``+++`` headers.
+
+    Returns:
+        list: The FilePatch objects in diff order.
+
+    Raises:
+        PatchError: If the diff is malformed.
+    """
+    patches = []
+    current = None
+    lines = diff.splitlines(keepends=True)
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ "):
+            current = FilePatch(_strip_prefix(line[4:]), _strip_prefix(lines[i + 1][4:]))
+            if current.path is None:
+                raise PatchError("Diff header names no file")
+            patches.append(current)
+            i += 2
+            continue
+        match = HUNK_HEADER_PATTERN.match(line)
+        if match:
+            if current is None:
+                if not default_path:
+                    raise PatchError("Diff has no file headers and no path was given")
+                current = FilePatch(default_path, default_path)
+                patches.append(current)
+            old_count = int(match.group(2)) if match.group(2) is not None else 1
+            new_count = int(match.group(4)) if match.group(4) is not None else 1
+            old_lines, new_lines = [], []
+            # The sides the previous hunk line went to; "\ No newline at end of file" applies only to those
+            last_sides = ()
+            i += 1
+            while i < len(lines) and (len(old_lines) < old_count or len(new_lines) < new_count):
+                body = lines[i]
+                if body.startswith("\\"):
+                    _strip_newline(last_sides)
+                    i += 1
+                    continue
+                tag, text = body[:1], body[1:]
+                if body in ("\n", "\r\n"):
+                    tag, text = " ", body
+                if tag == " ":
+                    last_sides = (old_lines, new_lines)
+                elif tag == "-":
+                    last_sides = (old_lines,)
+                elif tag == "+":
+                    last_sides = (new_lines,)
+                else:
+                    raise PatchError(f"Unexpected line in hunk: {body.rstrip()}")
+                for side in last_sides:
+                    side.append(text)
+                i += 1
+            if len(old_lines) != old_count or len(new_lines) != new_count:
+                raise PatchError("Hunk is shorter than its header says")
+            while i < len(lines) and lines[i].startswith("\\"):
+                _strip_newline(last_sides)
+                i += 1
+            current.hunks.append(Hunk(int(match.group(1)), old_lines, new_lines))
+            continue
+        i += 1
+    if not patches:
+        raise PatchError("Diff contains no hunks")
+    return patches
+
+def apply_hunks(text: str, hunks: List[Hunk]) -> str:
+    """
+    Applies hunks to ``text``. Context must match exactly; a hunk whose
+    position shifted is found by searching outwards from its stated line.
+
+    Raises:
+        PatchError: If a hunk's context cannot be found.
+    """
+    lines = text.splitlines(keepends=True)
+    result = []
+    position = 0
+    offset = 0
+    for number, hunk in enumerate(hunks, 1):
+        size = len(hunk.old_lines)
+        # A pure insertion's start line is the line it goes after
+        stated = hunk.old_start - 1 if size else hunk.old_start
+        expected = min(max(stated + offset, position), len(lines))
+        start = None
+        for distance in range(len(lines) + 1):
+            before, after = expected - distance, expected + distance
+            for candidate in (before, after):
+                if position <= candidate <= len(lines) - size and lines[candidate:candidate + size] == hunk.old_lines:
+                    start = candidate
+                    break
+            if start is not None or (before < position and after > len(lines) - size):
+                break
+        if start is None:
+            raise PatchError(f"Hunk {number} does not apply")
+        result.extend(lines[position:start])
+        result.extend(hunk.new_lines)
+        position = start + size
+        offset = start - stated
+    result.extend(lines[position:])
+    return "".join(result)
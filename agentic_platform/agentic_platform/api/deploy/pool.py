@@ -0,0 +1,246 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from typing import Optional
+from .utils import execute_command
+
+logger = logging.getLogger(__name__)
+
+# Empty apps kept ready for deploys; 0 disables the pool
+PREVIEW_POOL_SIZE = int(os.environ.get("PREVIEW_POOL_SIZE", "0"))
+PREVIEW_POOL_CONCURRENCY = int(os.environ.get("PREVIEW_POOL_CONCURRENCY", "2"))
+# Wait after a failed create before trying again, so a quota error does not spin
+PREVIEW_POOL_RETRY_SECONDS = float(os.environ.get("PREVIEW_POOL_RETRY_SECONDS", "30"))
+# Fly hostnames follow the app name, so a recycled app answers on the URL its
+# previous preview handed out. Apps whose URL was never handed out (failed or
+# interrupted deploys) are always recycled; served ones only with this set.
+PREVIEW_POOL_REUSE_SERVED = os.environ.get("PREVIEW_POOL_REUSE_SERVED", "false").lower() in ("1", "true", "yes")
+POOL_APP_PREFIX = "preview-pool-"
+
+def _json_list(output):
+    try:
+        return json.loads(output or "[]") or []
+    except ValueError:
+        return []
+
+class PreviewAppPool:
+    """
+    Keeps ``size`` empty Fly apps created ahead of time, with their IP
+    addresses allocated, so a deploy can skip ``flyctl apps create``.
+
+    Fly apps cannot be renamed, so a pooled app keeps its ``preview-pool-*``
+    name and the deploy's readable name becomes its label. Released pool apps
+    whose preview URL was never handed out are recycled: their machines and
+    secrets are removed and they go back to the pool. A served app keeps its
+    ``*.fly.dev`` hostname across a recycle, so the previous user's URL would
+    reach the next user's preview; served apps are destroyed unless
+    ``reuse_served`` is set. Other apps, apps with volumes, and apps that would
+    overfill the pool are destroyed.
+    """
+
+    def __init__(self, size=PREVIEW_POOL_SIZE, concurrency=PREVIEW_POOL_CONCURRENCY, execute=execute_command,
+                 reuse_served=PREVIEW_POOL_REUSE_SERVED):
+        self.size = size
+        self.concurrency = concurrency
+        self.execute = execute
+        self.reuse_served = reuse_served
+        self.ready = deque()
+        self.labels = {}
+        self.creating = 0
+        self._wakeup = None
+        self._task = None
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "created": 0,
+            "create_failures": 0,
+            "recycled": 0,
+            "destroyed": 0,
+            "create_seconds_total": 0.0,
+        }
+
+    def is_pool_app(self, app_name: str):
+        return app_name.startswith(POOL_APP_PREFIX)
+
+    def acquire(self, label: str) -> Optional[str]:
+        """
+        Hands out a ready app for the deploy named ``label``.
+
+        Returns:
+            str: The pooled app's name, or None when the pool is empty and the
+            caller has to create its own app.
+        """
+        if self.size <= 0:
+            return None
+        if not self.ready:
+            self.metrics["misses"] += 1
+            self._replenish_soon()
+            return None
+        app_name = self.ready.popleft()
+        self.labels[app_name] = label
+        self.metrics["hits"] += 1
+        self._replenish_soon()
+        logger.info(f"Handed out pooled app {app_name} for {label}")
+        return app_name
+
+    def label(self, app_name: str):
+        return self.labels.get(app_name)
+
+    async def _create(self):
+        app_name = f"{POOL_APP_PREFIX}{uuid.uuid4().hex[:12]}"
+        started = time.perf_counter()
+        await self.execute(['flyctl', 'apps', 'create', app_name])
+        # flyctl deploy allocates addresses on an app's first deploy; doing it here takes that off the deploy too
+        for command in (['flyctl', 'ips', 'allocate-v6', '--app', app_name],
+                        ['flyctl', 'ips', 'allocate-v4', '--shared', '--app', app_name, '--yes']):
+            try:
+                await self.execute(command)
+            except Exception as e:
+                logger.warning(f"Could not pre-allocate addresses for {app_name}: {e}")
+        self.metrics["create_seconds_total"] += time.perf_counter() - started
+        self.metrics["created"] += 1
+        return app_name
+
+    async def _fill(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def create_one():
+            async with semaphore:
+                try:
+                    self.ready.append(await self._create())
+                    return True
+                except Exception as e:
+                    self.metrics["create_failures"] += 1
+                    logger.error(f"Error creating pooled app: {e}")
+                    return False
+                finally:
+                    self.creating -= 1
+
+        deficit = self.size - len(self.ready) - self.creating
+        if deficit <= 0:
+            return True
+        self.creating += deficit
+        results = await asyncio.gather(*[create_one() for _ in range(deficit)])
+        return all(results)
+
+    def _replenish_soon(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _loop(self):
+        while True:
+            self._wakeup.clear()
+            if not await self._fill():
+                await asyncio.sleep(PREVIEW_POOL_RETRY_SECONDS)
+                continue
+            await self._wakeup.wait()
+
+    def start(self):
+        if self.size > 0 and (self._task is None or self._task.done()):
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _destroy(self, app_name):
+        await self.execute(['flyctl', 'apps', 'destroy', app_name, '--yes'])
+        self.metrics["destroyed"] += 1
+
+    async def _recycle(self, app_name):
+        """Removes what a deploy left in a pooled app. Returns False when the app cannot be reused."""
+        volumes = _json_list(await self.execute(['flyctl', 'volumes', 'list', '--app', app_name, '--json']))
+        if volumes:
+            return False
+        await self.execute(['flyctl', 'scale', 'count', '0', '--app', app_name, '--yes'])
+        secrets = [
+            entry.get("Name") or entry.get("name")
+            for entry in _json_list(await self.execute(['flyctl', 'secrets', 'list', '--app', app_name, '--json']))
+        ]
+        secrets = [name for name in secrets if name]
+        if secrets:
+            # --stage: there are no machines left to restart
+            await self.execute(['flyctl', 'secrets', 'unset', *secrets, '--app', app_name, '--stage'])
+        return True
+
+    async def release(self, app_name: str, served: bool = True):
+        """
+        Returns an app once its preview is over: a pooled app goes back to the
+        pool when there is room, it can be emptied, and its URL was not handed
+        out (or ``reuse_served`` is set); anything else is destroyed.
+
+        Args:
+            app_name: The app to release.
+            served: Whether the app's preview URL was given to a user.
+
+        Returns:
+            str: "recycled" or "destroyed".
+        """
+        self.labels.pop(app_name, None)
+        reusable = self.is_pool_app(app_name) and (self.reuse_served or not served)
+        if reusable and len(self.ready) + self.creating < self.size:
+            try:
+                if await self._recycle(app_name):
+                    self.ready.append(app_name)
+                    self.metrics["recycled"] += 1
+                    logger.info(f"Recycled {app_name} into the preview pool")
+                    return "recycled"
+            except Exception as e:
+                logger.error(f"Error recycling {app_name}, destroying it instead: {e}")
+        await self._destroy(app_name)
+        logger.info(f"Destroyed app: {app_name}")
+        return "destroyed"
+
+    async def drain(self, concurrency: Optional[int] = None):
+        """Destroys the ready apps, ``concurrency`` at a time, e.g. on shutdown. Returns their names."""
+        semaphore = asyncio.Semaphore(max(1, concurrency or self.concurrency))
+
+        async def destroy_one(app_name):
+            async with semaphore:
+                try:
+                    await self._destroy(app_name)
+                    return app_name
+                except Exception as e:
+                    logger.error(f"Error destroying pooled app {app_name}: {e}")
+                    return None
+
+        ready = list(self.ready)
+        self.ready.clear()
+        return [app_name for app_name in await asyncio.gather(*[destroy_one(name) for name in ready]) if app_name]
+
+    def handoff(self):
+        """The ready apps and the labels of those in use, for the next instance to ``adopt``."""
+        return {"ready": list(self.ready), "labels": dict(self.labels)}
+
+    def adopt(self, state):
+        """Takes over the apps of a previous instance's ``handoff`` instead of creating new ones."""
+        self.ready.extend(app_name for app_name in state.get("ready", []) if app_name not in self.ready)
+        self.labels.update(state.get("labels", {}))
+        self._replenish_soon()
+
+    def snapshot(self):
+        requests = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            "size": self.size,
+            "ready": len(self.ready),
+            "creating": self.creating,
+            "in_use": len(self.labels),
+            "hit_rate": round(self.metrics["hits"] / requests, 3) if requests else None,
+            "average_create_seconds": (
+                round(self.metrics["create_seconds_total"] / self.metrics["created"], 3)
+                if self.metrics["created"] else None
+            ),
+            **{key: value for key, value in self.metrics.items() if key != "create_seconds_total"},
+        }
+
+app_pool = PreviewAppPool()
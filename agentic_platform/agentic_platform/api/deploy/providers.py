@@ -0,0 +1,414 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import shlex
+import shutil
+import signal as signals
+import socket
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional
+from fastapi import HTTPException
+from .dockerlint import parse_dockerfile
+from .fly_config import DEFAULT_INTERNAL_PORT
+from .utils import execute_command, is_fly_installed
+from ...utils.file_io import file_io
+
+logger = logging.getLogger(__name__)
+
+# "fly" deploys to Fly.io; "local" runs previews on this host
+PREVIEW_PROVIDER = os.environ.get("PREVIEW_PROVIDER", "fly")
+# Local runtime: docker, podman, process, or auto (the first container runtime found, else process)
+PREVIEW_LOCAL_RUNTIME = os.environ.get("PREVIEW_LOCAL_RUNTIME", "auto")
+PREVIEW_LOCAL_ROOT = os.environ.get("PREVIEW_LOCAL_ROOT", "/tmp/previews")
+PREVIEW_LOCAL_HOST = os.environ.get("PREVIEW_LOCAL_HOST", "127.0.0.1")
+# Overrides the Dockerfile's ENTRYPOINT/CMD for the process runtime; "{port}" is replaced
+PREVIEW_LOCAL_COMMAND = os.environ.get("PREVIEW_LOCAL_COMMAND")
+
+class PreviewProvider(ABC):
+    """
+    Where previews run. ``deploy_app`` and the status, logs and stop endpoints
+    go through the configured provider instead of calling flyctl directly.
+    """
+
+    name = None
+    # Whether apps come from and go back to the pre-created Fly app pool
+    uses_app_pool = False
+    # Whether another instance of the service can take over running previews
+    survives_restart = False
+
+    async def create_app(self, app_name: str, context_dir: str):
+        pass
+
+    @abstractmethod
+    async def deploy(self, app_name: str, context_dir: str, args: List[str]) -> str:
+        """Builds and starts ``context_dir`` as ``app_name``; returns the build output."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def status(self, app_name: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def preview_url(self, app_name: str, status: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def logs(self, app_name: str) -> AsyncIterator[str]:
+        """Follows the app's log lines until it stops or the consumer goes away."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def stop(self, app_name: str, signal: str = "SIGINT", timeout: int = 30, wait_timeout: int = 300):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def destroy(self, app_name: str):
+        raise NotImplementedError
+
+class FlyProvider(PreviewProvider):
+    name = "fly"
+    uses_app_pool = True
+    survives_restart = True
+
+    async def create_app(self, app_name, context_dir):
+        await execute_command(['flyctl', 'apps', 'create', app_name], cwd=context_dir)
+
+    async def deploy(self, app_name, context_dir, args):
+        deploy_cmd = ['flyctl', 'deploy', '--remote-only', '--config', 'fly.toml', '--app', app_name]
+        deploy_cmd.extend(args)
+        return await execute_command(deploy_cmd, cwd=context_dir, include_stderr=True)
+
+    async def status(self, app_name):
+        return json.loads(await execute_command(['flyctl', 'status', '--json', '--app', app_name]))
+
+    def preview_url(self, app_name, status):
+        return f"https://{status.get('Hostname', f'{app_name}.fly.dev')}"
+
+    async def logs(self, app_name):
+        process = await asyncio.create_subprocess_exec(
+            'flyctl', 'logs', '--app', app_name,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                yield line.decode('utf-8').strip()
+        finally:
+            if process.returncode is None:
+                process.kill()
+
+    async def stop(self, app_name, signal="SIGINT", timeout=30, wait_timeout=300):
+        if not is_fly_installed():
+            logger.error("The 'fly' command is not installed or not in the system PATH.")
+            raise HTTPException(status_code=500, detail="The 'fly' command is not available. Please contact the administrator.")
+
+        # Check if the app exists
+        check_app_cmd = ["fly", "apps", "list", "--json"]
+        logger.debug(f"Executing command: {' '.join(check_app_cmd)}")
+
+        check_app_process = await asyncio.create_subprocess_exec(
+            *check_app_cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        check_app_stdout, check_app_stderr = await check_app_process.communicate()
+
+        if check_app_process.returncode != 0:
+            logger.error(f"Failed to list apps. Error: {check_app_stderr.decode()}")
+            raise HTTPException(status_code=500, detail=f"Failed to list apps: {check_app_stderr.decode()}")
+
+        apps = json.loads(check_app_stdout.decode())
+        if not any(app['Name'] == app_name for app in apps):
+            logger.info(f"App {app_name} not found. It may have been already deleted.")
+            return {"message": f"App {app_name} not found. It may have been already deleted."}
+
+        # If the app exists, proceed with listing and stopping machines
+        list_cmd = ["fly", "machines", "list", "-a", app_name, "--json"]
+        logger.debug(f"Executing command: {' '.join(list_cmd)}")
+
+        list_process = await asyncio.create_subprocess_exec(
+            *list_cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        list_stdout, list_stderr = await list_process.communicate()
+
+        if list_process.returncode != 0:
+            logger.error(f"Failed to list machines for app {app_name}. Error: {list_stderr.decode()}")
+            raise HTTPException(status_code=500, detail=f"Failed to list machines: {list_stderr.decode()}")
+
+        machines = json.loads(list_stdout.decode())
+
+        if not machines:
+            logger.info(f"No machines found for app {app_name}")
+            return {"message": f"No machines found for app {app_name}"}
+
+        # Stop each machine
+        for machine in machines:
+            machine_id = machine['id']
+            stop_cmd = [
+                "fly", "machine", "stop",
+                machine_id,
+                "-a", app_name,
+                "-s", signal,
+                "--timeout", str(timeout),
+                "-w", f"{wait_timeout}s"
+            ]
+            logger.debug(f"Executing command: {' '.join(stop_cmd)}")
+
+            stop_process = await asyncio.create_subprocess_exec(
+                *stop_cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stop_stdout, stop_stderr = await stop_process.communicate()
+
+            if stop_process.returncode != 0:
+                logger.error(f"Failed to stop machine {machine_id} for app {app_name}. Error: {stop_stderr.decode()}")
+                raise HTTPException(status_code=500, detail=f"Failed to stop machine {machine_id}: {stop_stderr.decode()}")
+
+            logger.info(f"Successfully stopped machine {machine_id} for app {app_name}")
+
+        return {"message": f"All machines for app {app_name} have been stopped"}
+
+    async def destroy(self, app_name):
+        await execute_command(['flyctl', 'apps', 'destroy', app_name, '--yes'])
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((PREVIEW_LOCAL_HOST, 0))
+        return sock.getsockname()[1]
+
+def dockerfile_command(context_dir: str) -> Optional[List[str]]:
+    """The final stage's ENTRYPOINT and CMD as an argument list, or None when it has neither."""
+    try:
+        with open(os.path.join(context_dir, "Dockerfile"), "r") as f:
+            instructions, _ = parse_dockerfile(f.read())
+    except OSError:
+        return None
+    entrypoint, command = [], []
+    for instruction in instructions:
+        if instruction.keyword == "FROM":
+            entrypoint, command = [], []
+        elif instruction.keyword in ("ENTRYPOINT", "CMD"):
+            value = instruction.value.strip()
+            try:
+                parts = json.loads(value) if value.startswith("[") else ["/bin/sh", "-c", value]
+            except ValueError:
+                parts = ["/bin/sh", "-c", value]
+            if instruction.keyword == "ENTRYPOINT":
+                entrypoint = parts
+            else:
+                command = parts
+    return (entrypoint + command) or None
+
+# Port arguments of common servers: uvicorn/next/flask "--port 8080" or "-p 8080",
+# gunicorn "--bind 0.0.0.0:8080" or "-b :8080"
+_PORT_ARGUMENT = re.compile(r"(?<![\w-])(--port[= ]|-p )\d+\b")
+_BIND_ARGUMENT = re.compile(r"(?<![\w-])(--bind[= ]|-b )[^\s:'\"]*:\d+\b")
+
+def bind_command_port(command: List[str], port: int) -> List[str]:
+    """
+    Points the listening port of ``command`` at ``port``.
+
+    Port and bind arguments are rewritten wherever they appear, including
+    inside a shell-form ``sh -c`` string. uvicorn and gunicorn commands
+    without one get it appended; anything else is expected to read ``PORT``.
+    """
+    joined = shlex.join(command)
+    rewritten = _PORT_ARGUMENT.sub(lambda match: f"{match.group(1)}{port}", joined)
+    rewritten = _BIND_ARGUMENT.sub(lambda match: f"{match.group(1)}{PREVIEW_LOCAL_HOST}:{port}", rewritten)
+    if rewritten != joined:
+        return shlex.split(rewritten)
+    program = os.path.basename(command[0])
+    if program == "uvicorn":
+        return [*command, "--host", PREVIEW_LOCAL_HOST, "--port", str(port)]
+    if program == "gunicorn":
+        return [*command, "--bind", f"{PREVIEW_LOCAL_HOST}:{port}"]
+    return command
+
+def _copy_context(context_dir, app_dir):
+    shutil.rmtree(app_dir, ignore_errors=True)
+    shutil.copytree(context_dir, app_dir, symlinks=True)
+
+class LocalPreview:
+    def __init__(self, app_name, runtime, port, directory):
+        self.app_name = app_name
+        self.runtime = runtime
+        self.port = port
+        self.directory = directory
+        self.log_path = os.path.join(directory, "preview.log")
+        self.process = None
+        self.started_at = time.time()
+
+class LocalProvider(PreviewProvider):
+    """
+    Runs previews on this host, each on its own port: in a container when
+    docker or podman is available, otherwise as a plain subprocess running
+    the Dockerfile's ENTRYPOINT/CMD (or ``PREVIEW_LOCAL_COMMAND``) from a copy
+    of the build context. The process runtime installs nothing, so it suits
+    load tests and build farms whose hosts already have the toolchain.
+    """
+
+    name = "local"
+
+    def __init__(self, runtime=PREVIEW_LOCAL_RUNTIME, root=PREVIEW_LOCAL_ROOT):
+        if runtime == "auto":
+            runtime = next((name for name in ("docker", "podman") if shutil.which(name)), "process")
+        self.runtime = runtime
+        self.root = root
+        self.previews = {}
+
+    def _preview(self, app_name):
+        preview = self.previews.get(app_name)
+        if preview is None:
+            raise HTTPException(status_code=404, detail=f"No local preview named {app_name}")
+        return preview
+
+    async def deploy(self, app_name, context_dir, args):
+        directory = os.path.join(self.root, app_name)
+        await file_io.run(os.makedirs, directory, exist_ok=True)
+        port = _free_port()
+        preview = LocalPreview(app_name, self.runtime, port, directory)
+        if self.runtime == "process":
+            output = await self._start_process(preview, context_dir)
+        else:
+            image = f"{app_name}:preview"
+            output = await execute_command([self.runtime, 'build', '-t', image, *args, context_dir], include_stderr=True)
+            output += await execute_command([
+                self.runtime, 'run', '-d', '--name', app_name,
+                '-p', f"{PREVIEW_LOCAL_HOST}:{port}:{DEFAULT_INTERNAL_PORT}",
+                '-e', f"PORT={DEFAULT_INTERNAL_PORT}", image
+            ])
+        self.previews[app_name] = preview
+        logger.info(f"Started local preview {app_name} ({self.runtime}) on port {port}")
+        return output
+
+    async def _start_process(self, preview, context_dir):
+        app_dir = os.path.join(preview.directory, "app")
+        # deploy_app removes the context once this returns, so the process gets its own copy
+        await file_io.run(_copy_context, context_dir, app_dir)
+        if PREVIEW_LOCAL_COMMAND:
+            command = shlex.split(PREVIEW_LOCAL_COMMAND.replace("{port}", str(preview.port)))
+        else:
+            command = await file_io.run(dockerfile_command, app_dir)
+            if command:
+                # Dockerfiles hard-code the container port; every local preview needs its own
+                command = bind_command_port(command, preview.port)
+        if not command:
+            raise Exception(f"No command to run for {preview.app_name}: the Dockerfile has no CMD or ENTRYPOINT")
+        env = {**os.environ, "PORT": str(preview.port), "HOST": PREVIEW_LOCAL_HOST}
+        with open(preview.log_path, "ab") as log:
+            preview.process = await asyncio.create_subprocess_exec(
+                *command, cwd=app_dir, env=env, stdout=log, stderr=asyncio.subprocess.STDOUT,
+                start_new_session=True
+            )
+        return f"Started {' '.join(command)} (pid {preview.process.pid})\n"
+
+    async def status(self, app_name):
+        preview = self._preview(app_name)
+        if preview.runtime == "process":
+            running = preview.process is not None and preview.process.returncode is None
+            exit_code = None if running or preview.process is None else preview.process.returncode
+        else:
+            try:
+                state = json.loads(await execute_command(
+                    [preview.runtime, 'inspect', '--format', '{{json .State}}', app_name]
+                ))
+            except Exception:
+                state = {}
+            running = bool(state.get("Running"))
+            exit_code = None if running else state.get("ExitCode")
+        return {
+            "Name": app_name,
+            "Status": "running" if running else "stopped",
+            "Hostname": f"{PREVIEW_LOCAL_HOST}:{preview.port}",
+            "Runtime": preview.runtime,
+            "ExitCode": exit_code,
+            "StartedAt": preview.started_at,
+        }
+
+    def preview_url(self, app_name, status):
+        return f"http://{status['Hostname']}"
+
+    async def logs(self, app_name):
+        preview = self._preview(app_name)
+        if preview.runtime != "process":
+            process = await asyncio.create_subprocess_exec(
+                preview.runtime, 'logs', '-f', app_name,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT
+            )
+            try:
+                while True:
+                    line = await process.stdout.readline()
+                    if not line:
+                        break
+                    yield line.decode('utf-8', errors='replace').strip()
+            finally:
+                if process.returncode is None:
+                    process.kill()
+            return
+        log = await file_io.run(open, preview.log_path, "rb")
+        try:
+            while True:
+                line = await file_io.run(log.readline)
+                if line:
+                    yield line.decode('utf-8', errors='replace').strip()
+                elif preview.process is None or preview.process.returncode is not None:
+                    break
+                else:
+                    await asyncio.sleep(0.2)
+        finally:
+            await file_io.run(log.close)
+
+    async def stop(self, app_name, signal="SIGINT", timeout=30, wait_timeout=300):
+        preview = self.previews.get(app_name)
+        if preview is None:
+            return {"message": f"App {app_name} not found. It may have been already deleted."}
+        if preview.runtime == "process":
+            process = preview.process
+            if process is not None and process.returncode is None:
+                os.killpg(process.pid, getattr(signals, signal, signals.SIGINT))
+                try:
+                    await asyncio.wait_for(process.wait(), timeout)
+                except asyncio.TimeoutError:
+                    os.killpg(process.pid, signals.SIGKILL)
+                    await asyncio.wait_for(process.wait(), wait_timeout)
+        else:
+            await execute_command([preview.runtime, 'kill', '--signal', signal, app_name])
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline and (await self.status(app_name))["Status"] == "running":
+                await asyncio.sleep(0.5)
+            await execute_command([preview.runtime, 'stop', '-t', '0', app_name])
+        return {"message": f"All machines for app {app_name} have been stopped"}
+
+    async def destroy(self, app_name):
+        preview = self.previews.get(app_name)
+        if preview is None:
+            return
+        if preview.runtime == "process":
+            await self.stop(app_name, "SIGTERM", timeout=10)
+        else:
+            await execute_command([preview.runtime, 'rm', '-f', app_name])
+            try:
+                await execute_command([preview.runtime, 'rmi', f"{app_name}:preview"])
+            except Exception as e:
+                logger.warning(f"Could not remove image for {app_name}: {e}")
+        del self.previews[app_name]
+        await file_io.run(shutil.rmtree, preview.directory, ignore_errors=True)
+
+PROVIDERS = {"fly": FlyProvider, "local": LocalProvider}
+
+def get_preview_provider(name: str = PREVIEW_PROVIDER) -> PreviewProvider:
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown preview provider '{name}'; available: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name]()
+
+preview_provider = get_preview_provider()
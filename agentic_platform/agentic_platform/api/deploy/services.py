@@ -1,16 +1,37 @@
 import asyncio
+import hashlib
 import json
 import os
 import shutil
+import time
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional
 from fastapi import HTTPException
-from .utils import get_project_directory, is_fly_installed, execute_command
+from .utils import get_project_directory, execute_command
+from .explorer import list_tree, EXPLORE_DEFAULT_LIMIT
+from .files import read_inline_content
+from .dockerfile import generate_dockerfile
+from .dockerlint import lint_dockerfile, apply_lint_fixes
+from .build_context import stage_build_context, parse_context_transfer
+from .fly_config import DEFAULT_FLY_PROFILE, render_fly_config
+from .autoscale import scaling_advisor
+from .pool import app_pool
+from .providers import preview_provider
+from ...utils.file_io import file_io
+from ...workspace_gc import workspace_gc
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def deploy_app(repo: str, branch: str, args: List[str], app_name: str, repo_dir: str, memory: int):
+DOCKERFILE_AUTOFIX = os.environ.get("DOCKERFILE_AUTOFIX", "false").lower() in ("1", "true", "yes")
+DEPLOY_STAGE_CONTEXT = os.environ.get("DEPLOY_STAGE_CONTEXT", "true").lower() not in ("0", "false", "no")
+# Seconds a preview runs before its app is recycled or destroyed; 0 (the default) keeps it until shutdown
+RUN_TIME_LIMIT = int(os.environ.get("PREVIEW_RUN_TIME_LIMIT", "0"))
+
+async def deploy_app(repo: str, branch: str, args: List[str], app_name: str, repo_dir: str, memory: Optional[int] = None,
+                     profile: Optional[str] = None, pooled: bool = False,
+                     on_stopped: Optional[Callable[[str, str], None]] = None):
+    staging_dir = f"{repo_dir}.context" if repo_dir else None
     try:
         # Check if Dockerfile exists; if not, return an error
         dockerfile_path = os.path.join(repo_dir, 'Dockerfile')
@@ -21,75 +42,76 @@ async def deploy_app(repo: str, branch: str, args: List[str], app_name: str, rep
         else:
             logger.info("Using existing Dockerfile.")
 
-        # Check if fly.toml exists, generate one if not
+        # Remote builds upload the whole context and rebuild from the first
+        # changed layer, so cache-busting orderings cost time on every deploy
+        try:
+            report = await file_io.run(lint_dockerfile, repo_dir)
+            for finding in report["findings"]:
+                logger.warning(f"Dockerfile {finding['rule']} (line {finding['line']}): {finding['message']}")
+            if DOCKERFILE_AUTOFIX and (report["optimized"] or report["context"]["suggested_dockerignore"]):
+                written = await file_io.run(apply_lint_fixes, repo_dir, report)
+                logger.info(
+                    f"Applied Dockerfile fixes to {', '.join(written)}; "
+                    f"build context reduced by {report['context']['bytes_saved']} bytes"
+                )
+        except Exception as e:
+            logger.error(f"Error linting Dockerfile in {repo_dir}: {e}")
+
+        # Generate fly.toml from the deploy profile, merged onto the repository's own file if it has one
         fly_toml_path = os.path.join(repo_dir, 'fly.toml')
-        if not os.path.exists(fly_toml_path):
-            logger.info("Creating fly.toml configuration.")
-            fly_toml_content = f"""
-app = "{app_name}"
-
-[build]
-  dockerfile = "Dockerfile"
-
-[env]
-  PORT = "8080"
-
-[vm]
-  memory_mb = {memory}
-
-[[services]]
-  http_checks = []
-  internal_port = 8080
-  processes = ["app"]
-  protocol = "tcp"
-
-  [services.concurrency]
-    hard_limit = 25
-    soft_limit = 20
-
-  [[services.ports]]
-    handlers = ["http"]
-    port = 80
-
-  [[services.ports]]
-    handlers = ["tls", "http"]
-    port = 443
-
-  [[services.tcp_checks]]
-    grace_period = "1s"
-    interval = "15s"
-    restart_limit = 0
-    timeout = "2s"
-"""
-            with open(fly_toml_path, 'w') as fly_toml_file:
-                fly_toml_file.write(fly_toml_content)
+        existing_fly_toml = await file_io.read_text(fly_toml_path)
+        if existing_fly_toml is not None:
+            logger.info("Merging deploy profile into existing fly.toml.")
         else:
-            logger.info("Using existing fly.toml.")
-
-        # Create the app on Fly.io
-        await execute_command(['flyctl', 'apps', 'create', app_name], cwd=repo_dir)
-
-        # Deploy the app using flyctl deploy
-        deploy_cmd = ['flyctl', 'deploy', '--remote-only', '--config', 'fly.toml', '--app', app_name]
-        deploy_cmd.extend(args)
-        await execute_command(deploy_cmd, cwd=repo_dir)
-
-        # Get the app URL using 'flyctl status'
-        app_status_json = await execute_command(['flyctl', 'status', '--json', '--app', app_name])
-        app_status = json.loads(app_status_json)
+            logger.info(f"Creating fly.toml configuration from profile '{profile or DEFAULT_FLY_PROFILE}'.")
+        fly_toml_content = render_fly_config(app_name, profile, memory, existing_fly_toml)
+        await file_io.write_text(fly_toml_path, fly_toml_content)
+
+        # flyctl uploads its working directory as the build context; deploying
+        # from a staged copy of the tracked files keeps .git and untracked
+        # artifacts out of the upload
+        build_context = None
+        context_dir = repo_dir
+        if DEPLOY_STAGE_CONTEXT:
+            build_context = await file_io.run(stage_build_context, repo_dir, staging_dir)
+            context_dir = staging_dir
+            logger.info(
+                f"Staged build context for {app_name}: {build_context['files']} files, {build_context['bytes']} bytes "
+                f"({build_context['excluded_files']} files excluded) in {build_context['seconds']}s"
+            )
 
-        # Extract the hostname
-        hostname = app_status.get('Hostname', f"{app_name}.fly.dev")
-        logger.info(f"Preview URL: {hostname}")
+        # Create the app, unless it was handed out by the pre-created app pool
+        if not pooled:
+            await preview_provider.create_app(app_name, context_dir)
+
+        # Build and start the app with the configured preview provider
+        deploy_started = time.perf_counter()
+        deploy_output = await preview_provider.deploy(app_name, context_dir, args)
+        deploy_seconds = round(time.perf_counter() - deploy_started, 3)
+        upload = parse_context_transfer(deploy_output)
+        if build_context is not None:
+            build_context["upload"] = upload
+            build_context["deploy_seconds"] = deploy_seconds
+        logger.info(f"Deployed {app_name} in {deploy_seconds}s; context upload: {upload}")
+
+        # Get the app URL from its status
+        app_status = await preview_provider.status(app_name)
+        preview_url = preview_provider.preview_url(app_name, app_status)
+        logger.info(f"Preview URL: {preview_url}")
+        if preview_provider.name == "fly":
+            scaling_advisor.register(app_name, preview_url, profile or DEFAULT_FLY_PROFILE, memory)
 
         # Schedule the instance to stop after RUN_TIME_LIMIT seconds
-        asyncio.create_task(stop_instance(app_name))
+        asyncio.create_task(stop_instance(app_name, on_stopped=on_stopped))
 
         return {
             "status": "Deployed",
-            "preview_url": f"https://{hostname}",
+            "preview_url": preview_url,
             "message": "Deployment successful.",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow().isoformat(),
+            # Lets the next instance rearm the stop timer if this one shuts down first
+            "expires_at": time.time() + RUN_TIME_LIMIT if RUN_TIME_LIMIT > 0 else None,
+            "build_context": build_context
         }
 
     except Exception as e:
@@ -98,47 +120,177 @@ app = "{app_name}"
         import traceback
         traceback_str = ''.join(traceback.format_exception(None, e, e.__traceback__))
         logger.error(f"Stack trace: {traceback_str}")
-        # Clean up the app on Fly.io
+        # Clean up the app; its URL was never handed out, so a pooled app can go back to the pool
         try:
-            await execute_command(['flyctl', 'apps', 'destroy', app_name, '--yes'])
+            await release_app(app_name, served=False)
         except Exception as destroy_exc:
             logger.error(f"Error destroying app after failed deployment: {destroy_exc}")
         raise e
     finally:
         # Ensure cleanup happens regardless of success or failure
         if repo_dir and os.path.exists(repo_dir):
-            shutil.rmtree(repo_dir, ignore_errors=True)
+            await file_io.run(shutil.rmtree, repo_dir, ignore_errors=True)
             logger.info(f"Cleaned up repository directory: {repo_dir}")
+        if staging_dir and os.path.exists(staging_dir):
+            await file_io.run(shutil.rmtree, staging_dir, ignore_errors=True)
+        workspace_gc.unpin(repo_dir)
+
+async def release_app(app_name: str, served: bool = True):
+    """
+    Ends a preview's app: Fly apps are recycled through the app pool, other
+    providers destroy it. ``served`` says whether the preview URL was handed out.
+    """
+    if preview_provider.uses_app_pool:
+        return await app_pool.release(app_name, served)
+    await preview_provider.destroy(app_name)
+    return "destroyed"
+
+async def stop_instance(app_name: str, delay: Optional[float] = None,
+                        on_stopped: Optional[Callable[[str, str], None]] = None):
+    """
+    Ends a preview after ``RUN_TIME_LIMIT`` seconds (or ``delay``) and
+    releases its app through ``release_app``.
+    ``on_stopped`` is then called with the app name and the outcome, so the
+    caller can update its record of the deployment.
+    """
+    delay = RUN_TIME_LIMIT if delay is None else delay
+    if delay <= 0:
+        return None
+    await asyncio.sleep(delay)
+    scaling_advisor.unregister(app_name)
+    secret_digests.pop(app_name, None)
+    try:
+        outcome = await release_app(app_name)
+    except Exception as e:
+        logger.error(f"Error stopping preview {app_name}: {e}")
+        return None
+    if on_stopped:
+        on_stopped(app_name, outcome)
+    return outcome
+
+# Per app, the value hash and flyctl digest of every secret set through this service
+secret_digests = {}
+
+def _secret_entries(listing):
+    """Name -> digest from ``flyctl secrets list --json``, across flyctl's key casings."""
+    entries = {}
+    for entry in json.loads(listing or "[]") or []:
+        name = entry.get("Name") or entry.get("name")
+        if name:
+            entries[name] = entry.get("Digest") or entry.get("digest")
+    return entries
+
+def _secrets_import_body(secrets):
+    lines = []
+    for key, value in secrets.items():
+        lines.append(f'{key}="""{value}"""' if "\n" in value else f"{key}={value}")
+    return "\n".join(lines) + "\n"
+
+async def apply_secrets(app_name: str, secrets: Dict[str, str], stage: bool = False):
+    """
+    Sets ``secrets`` with a single ``flyctl secrets import``, so the app rolls
+    out once rather than once per key. Keys whose value matches what this
+    service last set, and whose digest Fly still reports unchanged, are skipped.
+
+    Args:
+        app_name (str): Fly app name.
+        secrets (dict): Secret names and values.
+        stage (bool): Store the secrets without restarting machines.
+
+    Returns:
+        dict: Changed and unchanged keys, whether anything was staged, and timing.
+    """
+    started = time.perf_counter()
+    for key, value in secrets.items():
+        if '"""' in value:
+            raise HTTPException(status_code=400, detail=f"Secret {key} contains triple quotes, which secrets import cannot read")
+    current = _secret_entries(await execute_command(['flyctl', 'secrets', 'list', '--app', app_name, '--json']))
+    known = secret_digests.setdefault(app_name, {})
+    changed = {}
+    for key, value in secrets.items():
+        value_hash = hashlib.sha256(value.encode()).hexdigest()
+        if key in current and known.get(key) == (value_hash, current[key]):
+            continue
+        changed[key] = value
+    if changed:
+        command = ['flyctl', 'secrets', 'import', '--app', app_name]
+        if stage:
+            command.append('--stage')
+        await execute_command(command, input=_secrets_import_body(changed))
+        digests = _secret_entries(await execute_command(['flyctl', 'secrets', 'list', '--app', app_name, '--json']))
+        for key, value in changed.items():
+            known[key] = (hashlib.sha256(value.encode()).hexdigest(), digests.get(key))
+    return {
+        "changed": sorted(changed),
+        "unchanged": sorted(set(secrets) - set(changed)),
+        "staged": stage and bool(changed),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+def _config_value(config, key):
+    value = config
+    for part in key.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+async def apply_config(app_name: str, config: Dict[str, Any]):
+    """
+    Sets every key of ``config`` that differs from the app's current
+    configuration with a single ``flyctl config set`` call. Dotted keys
+    (e.g. ``env.LOG_LEVEL``) are compared against nested values.
+
+    Returns:
+        dict: Changed and unchanged keys, and timing.
+    """
+    started = time.perf_counter()
+    current = json.loads(await execute_command(['flyctl', 'config', 'show', '--app', app_name, '--json']) or "{}")
+    changed = [
+        key for key, value in config.items()
+        if _config_value(current, key) is None or str(_config_value(current, key)) != str(value)
+    ]
+    if changed:
+        await execute_command(
+            ['flyctl', 'config', 'set', *[f"{key}={config[key]}" for key in changed], '--app', app_name]
+        )
+    return {
+        "changed": changed,
+        "unchanged": [key for key in config if key not in changed],
+        "seconds": round(time.perf_counter() - started, 3),
+    }
 
-async def stop_instance(app_name: str):
-    # Implement the logic to stop the instance after a certain time
-    pass
-
-async def explore_directory(path):
+async def explore_directory(path, root=None, depth=1, glob=None, gitignore=True, cursor=None, limit=EXPLORE_DEFAULT_LIMIT):
     try:
-        if not os.path.exists(path):
+        if not await file_io.run(os.path.exists, path):
             logger.error(f"Path does not exist: {path}")
             raise HTTPException(status_code=404, detail="Path does not exist")
-        if os.path.isfile(path):
-            with open(path, 'r') as f:
-                content = f.read()
-            return {"type": "file", "content": content}
-        elif os.path.isdir(path):
-            items = os.listdir(path)
-            return {"type": "directory", "items": items}
+        if await file_io.run(os.path.isfile, path):
+            return await file_io.run(read_inline_content, path)
+        elif await file_io.run(os.path.isdir, path):
+            root = root or path
+            listing = await file_io.run(
+                list_tree, root, os.path.relpath(path, root), depth, glob, gitignore, cursor, limit
+            )
+            return {
+                "type": "directory",
+                "items": [entry["path"] for entry in listing["entries"]],
+                **listing
+            }
         else:
             logger.error(f"Unknown path type: {path}")
             raise HTTPException(status_code=400, detail="Unknown path type")
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error exploring directory: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 async def modify_file(path, content):
     try:
-        if not os.path.exists(os.path.dirname(path)):
-            os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, 'w') as f:
-            f.write(content)
+        await file_io.write_text(path, content)
         logger.info(f"File modified successfully: {path}")
         return {"message": "File modified successfully"}
     except Exception as e:
@@ -147,10 +299,7 @@ async def modify_file(path, content):
 
 async def create_file(path, content):
     try:
-        if not os.path.exists(os.path.dirname(path)):
-            os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, 'w') as f:
-            f.write(content)
+        await file_io.write_text(path, content)
         logger.info(f"File created successfully: {path}")
         return {"message": "File created successfully"}
     except Exception as e:
@@ -159,17 +308,18 @@ async def create_file(path, content):
 
 async def remove_file(path):
     try:
-        if os.path.isfile(path):
-            os.remove(path)
+        removed = await file_io.remove(path)
+        if removed == "file":
             logger.info(f"File removed successfully: {path}")
             return {"message": "File removed successfully"}
-        elif os.path.isdir(path):
-            shutil.rmtree(path)
+        elif removed == "directory":
             logger.info(f"Directory removed successfully: {path}")
             return {"message": "Directory removed successfully"}
         else:
             logger.error(f"Path does not exist: {path}")
             raise HTTPException(status_code=404, detail="Path does not exist")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error removing file or directory: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -177,6 +327,17 @@ async def remove_file(path):
 async def create_dockerfile(repo_path):
     try:
         logger.info(f"Generating Dockerfile for repository at: {repo_path}")
+        dockerfile_path = os.path.join(repo_path, 'Dockerfile')
+        generated = await file_io.run(generate_dockerfile, repo_path)
+        if generated is not None:
+            await file_io.write_text(dockerfile_path, generated.content)
+            logger.info(f"Dockerfile generated for {generated.stack} project at: {dockerfile_path}")
+            return {
+                "message": "Dockerfile created successfully",
+                "content": generated.content,
+                **generated.info()
+            }
+
         process = await asyncio.create_subprocess_exec(
             "gh", "copilot", "suggest", "-t", "shell",
             "--input", "Create a Dockerfile for the project",
@@ -193,9 +354,7 @@ async def create_dockerfile(repo_path):
 
         dockerfile_content = stdout.decode()
 
-        dockerfile_path = os.path.join(repo_path, 'Dockerfile')
-        with open(dockerfile_path, 'w') as f:
-            f.write(dockerfile_content)
+        await file_io.write_text(dockerfile_path, dockerfile_content)
 
         logger.info(f"Dockerfile created successfully at: {dockerfile_path}")
         return {"message": "Dockerfile created successfully", "content": dockerfile_content}
@@ -205,81 +364,9 @@ async def create_dockerfile(repo_path):
 
 async def stop_app(app_name: str, signal: str = "SIGINT", timeout: int = 30, wait_timeout: int = 300):
     logger.info(f"Attempting to stop app: {app_name} with signal: {signal}, timeout: {timeout}, wait_timeout: {wait_timeout}")
-    
-    if not is_fly_installed():
-        logger.error("The 'fly' command is not installed or not in the system PATH.")
-        raise HTTPException(status_code=500, detail="The 'fly' command is not available. Please contact the administrator.")
 
     try:
-        # Check if the app exists
-        check_app_cmd = ["fly", "apps", "list", "--json"]
-        logger.debug(f"Executing command: {' '.join(check_app_cmd)}")
-        
-        check_app_process = await asyncio.create_subprocess_exec(
-            *check_app_cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        check_app_stdout, check_app_stderr = await check_app_process.communicate()
-        
-        if check_app_process.returncode != 0:
-            logger.error(f"Failed to list apps. Error: {check_app_stderr.decode()}")
-            raise HTTPException(status_code=500, detail=f"Failed to list apps: {check_app_stderr.decode()}")
-        
-        apps = json.loads(check_app_stdout.decode())
-        if not any(app['Name'] == app_name for app in apps):
-            logger.info(f"App {app_name} not found. It may have been already deleted.")
-            return {"message": f"App {app_name} not found. It may have been already deleted."}
-
-        # If the app exists, proceed with listing and stopping machines
-        list_cmd = ["fly", "machines", "list", "-a", app_name, "--json"]
-        logger.debug(f"Executing command: {' '.join(list_cmd)}")
-        
-        list_process = await asyncio.create_subprocess_exec(
-            *list_cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        list_stdout, list_stderr = await list_process.communicate()
-        
-        if list_process.returncode != 0:
-            logger.error(f"Failed to list machines for app {app_name}. Error: {list_stderr.decode()}")
-            raise HTTPException(status_code=500, detail=f"Failed to list machines: {list_stderr.decode()}")
-        
-        machines = json.loads(list_stdout.decode())
-        
-        if not machines:
-            logger.info(f"No machines found for app {app_name}")
-            return {"message": f"No machines found for app {app_name}"}
-        
-        # Stop each machine
-        for machine in machines:
-            machine_id = machine['id']
-            stop_cmd = [
-                "fly", "machine", "stop",
-                machine_id,
-                "-a", app_name,
-                "-s", signal,
-                "--timeout", str(timeout),
-                "-w", f"{wait_timeout}s"
-            ]
-            logger.debug(f"Executing command: {' '.join(stop_cmd)}")
-            
-            stop_process = await asyncio.create_subprocess_exec(
-                *stop_cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stop_stdout, stop_stderr = await stop_process.communicate()
-            
-            if stop_process.returncode != 0:
-                logger.error(f"Failed to stop machine {machine_id} for app {app_name}. Error: {stop_stderr.decode()}")
-                raise HTTPException(status_code=500, detail=f"Failed to stop machine {machine_id}: {stop_stderr.decode()}")
-            
-            logger.info(f"Successfully stopped machine {machine_id} for app {app_name}")
-
-        return {"message": f"All machines for app {app_name} have been stopped"}
-
+        return await preview_provider.stop(app_name, signal, timeout, wait_timeout)
     except HTTPException:
         raise
     except Exception as e:
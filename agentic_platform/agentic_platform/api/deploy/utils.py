@@ -13,16 +13,18 @@ def get_project_directory(project_id: str) -> Path:
 def is_fly_installed():
     return shutil.which("fly") is not None
 
-async def execute_command(cmd: List[str], cwd: Optional[str] = None):
+async def execute_command(cmd: List[str], cwd: Optional[str] = None, input: Optional[str] = None,
+                          include_stderr: bool = False):
     logger = logging.getLogger(__name__)
     logger.debug(f"Executing command: {' '.join(cmd)} in directory: {cwd}")
     process = await asyncio.create_subprocess_exec(
         *cmd,
         cwd=cwd,
+        stdin=asyncio.subprocess.PIPE if input is not None else None,
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE
     )
-    stdout, stderr = await process.communicate()
+    stdout, stderr = await process.communicate(input.encode() if input is not None else None)
 
     logger.debug(f"Command stdout: {stdout.decode()}")
     logger.debug(f"Command stderr: {stderr.decode()}")
@@ -32,4 +34,7 @@ async def execute_command(cmd: List[str], cwd: Optional[str] = None):
         logger.error(error_message)
         raise Exception(error_message)
 
+    if include_stderr:
+        # Build tools such as BuildKit report progress on stderr
+        return stdout.decode() + stderr.decode()
     return stdout.decode()
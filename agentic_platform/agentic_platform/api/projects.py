@@ -1,23 +1,67 @@
 # agentic_platform/agentic_platform/api/projects.py
-from fastapi import APIRouter, Depends, Query
-from ..crud import get_db, cleanup_projects, remove_old_projects
+import asyncio
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query
+from ..crud import get_db, project_workspace_paths, RECONCILE_BATCH_SIZE
+from ..fingerprint import directory_tree, workspace_fingerprints
+from ..search_index import search_indexes
+from ..reconcile import reconcile_jobs, start_reconcile_job
+from ..utils import streaming_export, trash_bin
+from ..utils.file_io import file_io
+from ..workspace_gc import workspace_gc
 from sqlalchemy.orm import Session
+from datetime import timedelta
 from typing import Optional
 
 router = APIRouter()
 
+@router.on_event("startup")
+async def start_workspace_gc():
+    workspace_gc.start()
+
+@router.on_event("shutdown")
+async def stop_workspace_gc():
+    await workspace_gc.stop()
+
 @router.get("/")
-async def list_projects(db: Session = Depends(get_db)):
+async def list_projects(
+    format: str = Query("json", description="Response format: json, ndjson or csv"),
+    db: Session = Depends(get_db)
+):
     from ..models import Project
+    if format != "json":
+        return streaming_export(
+            lambda session: session.query(
+                Project.id, Project.name, Project.user_id, Project.repo_url,
+                Project.created_at, Project.updated_at, Project.total_cost
+            ).order_by(Project.created_at),
+            format,
+            "projects"
+        )
     projects = db.query(Project).all()
     return {"projects": [{"name": project.name, "user_id": project.user_id, "created_at": project.created_at, "updated_at": project.updated_at} for project in projects]}
 
 @router.post("/cleanup")
-async def cleanup(db: Session = Depends(get_db)):
-    removed_projects = cleanup_projects(db)
+async def cleanup(
+    wait: bool = Query(True, description="Wait for the cleanup to finish instead of returning a job id"),
+    resume: bool = Query(True, description="Continue an interrupted cleanup from its last checkpoint"),
+    batch_size: int = Query(RECONCILE_BATCH_SIZE, ge=1, le=10000, description="Projects processed per batch")
+):
+    job, task = start_reconcile_job("cleanup", {}, resume, batch_size)
+    if not wait:
+        return {
+            "message": "Cleanup started.",
+            "job_id": job["job_id"],
+            "status_url": f"/projects/reconcile/{job['job_id']}"
+        }
+    try:
+        removed_projects = await task
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Cleanup failed: {str(e)}")
     return {
         "message": f"Cleanup completed. Removed {len(removed_projects)} projects.",
-        "removed_projects": removed_projects
+        "removed_projects": removed_projects,
+        "job": job
     }
 
 @router.post("/remove_projects")
@@ -26,9 +70,10 @@ async def remove_projects(
     hours: Optional[int] = Query(None, description="Remove projects older than this many hours"),
     minutes: Optional[int] = Query(None, description="Remove projects older than this many minutes"),
     user_id: Optional[str] = Query(None, description="Remove projects for this user"),
-    db: Session = Depends(get_db)
+    wait: bool = Query(True, description="Wait for the removal to finish instead of returning a job id"),
+    resume: bool = Query(True, description="Continue an interrupted removal from its last checkpoint"),
+    batch_size: int = Query(RECONCILE_BATCH_SIZE, ge=1, le=10000, description="Projects processed per batch")
 ):
-    from datetime import timedelta
     age = None
     if days:
         age = timedelta(days=days)
@@ -36,10 +81,139 @@ async def remove_projects(
         age = timedelta(hours=hours)
     elif minutes:
         age = timedelta(minutes=minutes)
-    
-    removed_projects = remove_old_projects(db, age, user_id)
-    
+
+    params = {"age_seconds": int(age.total_seconds()) if age else None, "user_id": user_id}
+    job, task = start_reconcile_job("remove", params, resume, batch_size)
+    if not wait:
+        return {
+            "message": "Project removal started.",
+            "job_id": job["job_id"],
+            "status_url": f"/projects/reconcile/{job['job_id']}"
+        }
+    try:
+        removed_projects = await task
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Project removal failed: {str(e)}")
     return {
         "message": f"Removed {len(removed_projects)} projects.",
-        "removed_projects": removed_projects
+        "removed_projects": removed_projects,
+        "job": job
     }
+
+@router.get("/reconcile")
+async def list_reconcile_jobs():
+    return {"jobs": list(reconcile_jobs.values()), "trash_pending": trash_bin.pending}
+
+@router.get("/reconcile/{job_id}")
+async def get_reconcile_job(job_id: str):
+    if job_id not in reconcile_jobs:
+        raise HTTPException(status_code=404, detail="Reconcile job not found")
+    return reconcile_jobs[job_id]
+
+@router.get("/gc")
+async def get_gc_metrics():
+    return workspace_gc.snapshot()
+
+@router.post("/gc/run")
+async def run_gc():
+    evicted = await asyncio.to_thread(workspace_gc.run_once)
+    return {
+        "message": f"Garbage collection completed. Evicted {len(evicted)} workspaces.",
+        "evicted": [{"path": item["path"], "bytes": item["bytes"], "user_id": item["user_id"]} for item in evicted],
+        "metrics": workspace_gc.snapshot()
+    }
+
+def _project_workspaces(db: Session, project_id: str):
+    workspaces = project_workspace_paths(db, project_id)
+    if workspaces is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if not workspaces:
+        raise HTTPException(status_code=404, detail="Project has no workspace on disk")
+    return workspaces
+
+def _fingerprint_workspace(path: str, tree: bool):
+    index = workspace_fingerprints.get(path)
+    hashes, stats = index.refresh()
+    directories = directory_tree(hashes)
+    fingerprint = directories[""]
+    index.save_snapshot(fingerprint, hashes)
+    result = {"path": path, "fingerprint": fingerprint, "stats": stats}
+    if tree:
+        result["directories"] = directories
+    return result
+
+@router.get("/{project_id}/fingerprint")
+async def get_project_fingerprint(
+    project_id: str,
+    tree: bool = Query(False, description="Include the hash of every directory"),
+    db: Session = Depends(get_db)
+):
+    workspaces = _project_workspaces(db, project_id)
+    try:
+        results = [await asyncio.to_thread(_fingerprint_workspace, path, tree) for path in workspaces]
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Error fingerprinting project: {str(e)}")
+    return {"project_id": project_id, "workspaces": results}
+
+@router.get("/{project_id}/changes")
+async def get_project_changes(
+    project_id: str,
+    since: str = Query(..., description="A fingerprint previously returned by /projects/{project_id}/fingerprint"),
+    db: Session = Depends(get_db)
+):
+    for path in _project_workspaces(db, project_id):
+        index = workspace_fingerprints.get(path)
+        if index.load_snapshot(since) is None:
+            continue
+        changes = await asyncio.to_thread(index.diff, since)
+        if changes is not None:
+            return {"project_id": project_id, "path": path, **changes}
+    raise HTTPException(status_code=404, detail="Unknown or expired fingerprint")
+
+async def _search_index(db: Session, project_id: str, refresh: bool):
+    from ..models import Project
+    from .deploy.utils import get_project_directory
+    if db.query(Project.id).filter(Project.id == project_id).first() is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    root = str(get_project_directory(project_id))
+    if not os.path.isdir(root):
+        raise HTTPException(status_code=404, detail="Project has no cloned repository")
+    try:
+        return await search_indexes.ready(project_id, root, refresh)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error building search index: {str(e)}")
+
+@router.get("/{project_id}/search")
+async def search_project(
+    project_id: str,
+    q: str = Query(..., min_length=1, description="Text to search for"),
+    regex: bool = Query(False, description="Treat q as a regular expression"),
+    path: Optional[str] = Query(None, description="Directory or glob to search in"),
+    case_sensitive: bool = Query(False),
+    context: int = Query(2, ge=0, le=20, description="Lines of context around each match"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of files"),
+    refresh: bool = Query(False, description="Pick up files changed outside the API before searching"),
+    db: Session = Depends(get_db)
+):
+    index = await _search_index(db, project_id, refresh)
+    try:
+        return await file_io.run(
+            index.search, q, regex=regex, path=path, case_sensitive=case_sensitive, limit=limit, context=context
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{project_id}/symbols")
+async def find_symbols(
+    project_id: str,
+    name: Optional[str] = Query(None, description="Symbol name"),
+    prefix: bool = Query(False, description="Match names starting with name"),
+    kind: Optional[str] = Query(None, description="class, function, method or variable"),
+    path: Optional[str] = Query(None, description="Only symbols in files under this path"),
+    limit: int = Query(100, ge=1, le=1000),
+    refresh: bool = Query(False, description="Pick up files changed outside the API before searching"),
+    db: Session = Depends(get_db)
+):
+    index = await _search_index(db, project_id, refresh)
+    symbols = await file_io.run(index.symbols, name, kind, path, prefix, limit)
+    return {"project_id": project_id, "symbols": symbols}
@@ -0,0 +1,340 @@
+# agentic_platform/agentic_platform/context_packer.py
+import ast
+import hashlib
+import logging
+import math
+import os
+import re
+import threading
+import time
+from .utils.ignore import GitignoreMatcher
+from .utils.paths import data_path
+from .utils.response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_MAX_CANDIDATES = int(os.environ.get("CONTEXT_MAX_CANDIDATES", "5000"))
+CONTEXT_MAX_FILE_BYTES = int(os.environ.get("CONTEXT_MAX_FILE_BYTES", str(512 * 1024)))
+# A single file may take at most this share of the budget in full
+CONTEXT_MAX_FILE_SHARE = 0.35
+SUMMARY_VERSION = 1
+SUMMARY_CACHE_DIR = os.environ.get("CONTEXT_SUMMARY_CACHE_DIR", data_path("summaries"))
+SUMMARY_CACHE_MAX_BYTES = int(os.environ.get("CONTEXT_SUMMARY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Files that describe how a project is built and run
+MANIFEST_FILES = {
+    "requirements.txt", "pyproject.toml", "setup.py", "setup.cfg", "Pipfile",
+    "package.json", "go.mod", "Cargo.toml", "Gemfile", "pom.xml", "build.gradle", "composer.json",
+    "Dockerfile", "docker-compose.yml", "Procfile", "fly.toml", "Makefile", ".python-version", ".nvmrc"
+}
+ENTRYPOINT_FILES = {
+    "main.py", "app.py", "manage.py", "wsgi.py", "asgi.py", "server.py", "__main__.py",
+    "index.js", "server.js", "app.js", "main.go", "main.rs", "index.ts", "server.ts"
+}
+SOURCE_EXTENSIONS = {".py", ".js", ".jsx", ".ts", ".tsx", ".go", ".rs", ".rb", ".java", ".php"}
+JS_IMPORT_PATTERN = re.compile(r"""(?:from\s+|require\(\s*|import\s+)['"](\.{1,2}/[^'"]+)['"]""")
+WORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9_]{2,}")
+
+summary_cache = ResponseCache(SUMMARY_CACHE_DIR, SUMMARY_CACHE_MAX_BYTES)
+
+def estimate_tokens(text):
+    """Approximates the token count of ``text`` at four characters per token."""
+    return math.ceil(len(text) / 4)
+
+def _read_text(path):
+    try:
+        with open(path, "rb") as f:
+            data = f.read(CONTEXT_MAX_FILE_BYTES + 1)
+    except OSError:
+        return None
+    if len(data) > CONTEXT_MAX_FILE_BYTES or b"\0" in data[:8192]:
+        return None
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+def summarize_source(path, text):
+    """
+    Summarizes a file without a model call: for Python the docstring, imports
+    and top-level signatures; for anything else the first lines.
+    """
+    lines = text.splitlines()
+    if path.endswith(".py"):
+        try:
+            tree = ast.parse(text)
+        except (SyntaxError, ValueError):
+            tree = None
+        if tree is not None:
+            parts = []
+            docstring = ast.get_docstring(tree)
+            if docstring:
+                parts.append(f'"""{docstring.strip().splitlines()[0]}"""')
+            imports = []
+            for node in tree.body:
+                if isinstance(node, ast.Import):
+                    imports.extend(alias.name for alias in node.names)
+                elif isinstance(node, ast.ImportFrom):
+                    imports.append("." * node.level + (node.module or ""))
+            if imports:
+                parts.append("imports: " + ", ".join(dict.fromkeys(imports)))
+            for node in tree.body:
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    parts.append(_signature(node, lines))
+                elif isinstance(node, ast.ClassDef):
+                    parts.append(_signature(node, lines))
+                    for child in node.body:
+                        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                            parts.append("    " + _signature(child, lines))
+            parts.append(f"({len(lines)} lines)")
+            return "\n".join(parts)
+    head = [line for line in lines[:15] if line.strip()]
+    return "\n".join(head + [f"... ({len(lines)} lines)"] if len(lines) > 15 else head)
+
+def _signature(node, lines):
+    signature = lines[node.lineno - 1].strip() if node.lineno <= len(lines) else node.name
+    docstring = ast.get_docstring(node)
+    if docstring:
+        signature += f'  # {docstring.strip().splitlines()[0]}'
+    return signature
+
+def _suffix_index(known_paths):
+    """Maps every trailing run of path components ("b/c.py", "c.py") to the paths ending in it."""
+    index = {}
+    for path in known_paths:
+        parts = path.split("/")
+        for start in range(len(parts)):
+            index.setdefault("/".join(parts[start:]), []).append(path)
+    return index
+
+def _python_imports(relative_path, text, suffixes):
+    """Resolves a Python file's imports to files in the workspace."""
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return set()
+    package = os.path.dirname(relative_path).split("/") if os.path.dirname(relative_path) else []
+    modules = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name.split(".") for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = package[:len(package) - node.level + 1] if node.level else []
+            module = base + (node.module.split(".") if node.module else [])
+            modules.append(module)
+            modules.extend(module + [alias.name] for alias in node.names)
+    resolved = set()
+    for module in modules:
+        if not module:
+            continue
+        # Imports may be rooted at any source directory, not just the workspace root
+        for candidate in ("/".join(module) + ".py", "/".join(module + ["__init__.py"])):
+            resolved.update(suffixes.get(candidate, ()))
+    resolved.discard(relative_path)
+    return resolved
+
+def _js_imports(relative_path, text, known_paths):
+    resolved = set()
+    directory = os.path.dirname(relative_path)
+    for target in JS_IMPORT_PATTERN.findall(text):
+        base = os.path.normpath(os.path.join(directory, target)).replace(os.sep, "/")
+        for candidate in (base, *(base + ext for ext in (".js", ".ts", ".jsx", ".tsx")), base + "/index.js", base + "/index.ts"):
+            if candidate in known_paths:
+                resolved.add(candidate)
+                break
+    return resolved
+
+class PackedContext:
+    def __init__(self, text, tokens, budget, included, summarized, listed, omitted, seconds):
+        self.text = text
+        self.tokens = tokens
+        self.budget = budget
+        self.included = included
+        self.summarized = summarized
+        self.listed = listed
+        self.omitted = omitted
+        self.seconds = seconds
+
+    def stats(self):
+        return {
+            "tokens": self.tokens,
+            "budget": self.budget,
+            "included": self.included,
+            "summarized": self.summarized,
+            "listed": self.listed,
+            "omitted": self.omitted,
+            "seconds": round(self.seconds, 3)
+        }
+
+class ContextPacker:
+    """
+    Builds the repository context for a prompt within a token budget.
+
+    Files are ranked by relevance: files the task names, files those import,
+    build manifests and entry points, path words shared with the task, recent
+    modification and small size. The best ones go in verbatim while they fit,
+    the next ones as summaries, and the rest only by name. Summaries are
+    cached by content hash, so unchanged files are summarized once.
+    """
+
+    def __init__(self, cache=summary_cache):
+        self.cache = cache
+        self._hashes = {}  # key: (path, mtime_ns, size), value: content hash
+        self._lock = threading.Lock()
+
+    def _candidates(self, root):
+        matcher = GitignoreMatcher(root)
+        stack = [""]
+        candidates = []
+        while stack and len(candidates) < CONTEXT_MAX_CANDIDATES:
+            relative_dir = stack.pop()
+            try:
+                with os.scandir(os.path.join(root, relative_dir)) as entries:
+                    for entry in sorted(entries, key=lambda entry: entry.name):
+                        relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if matcher.match(relative_path, is_dir):
+                            continue
+                        if is_dir:
+                            stack.append(relative_path)
+                        elif entry.is_file(follow_symlinks=False):
+                            try:
+                                candidates.append((relative_path, entry.stat(follow_symlinks=False)))
+                            except FileNotFoundError:
+                                continue
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+        return candidates
+
+    def _content_hash(self, full_path, stat, text):
+        key = (full_path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            content_hash = self._hashes.get(key)
+        if content_hash is None:
+            content_hash = hashlib.sha256(text.encode()).hexdigest()
+            with self._lock:
+                if len(self._hashes) > 100000:
+                    self._hashes.clear()
+                self._hashes[key] = content_hash
+        return content_hash
+
+    def summary(self, full_path, relative_path, stat, text):
+        key = self.cache.make_key("summary", SUMMARY_VERSION, os.path.splitext(relative_path)[1],
+                                  self._content_hash(full_path, stat, text))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached["summary"]
+        summary = summarize_source(relative_path, text)
+        try:
+            self.cache.put(key, {"summary": summary})
+        except OSError as e:
+            logger.error(f"Error caching summary for {relative_path}: {e}")
+        return summary
+
+    def _rank(self, root, candidates, seeds, task):
+        known_paths = {path for path, _ in candidates}
+        task_words = {word.lower() for word in WORD_PATTERN.findall(task or "")}
+        newest = max((stat.st_mtime for _, stat in candidates), default=0.0)
+        oldest = min((stat.st_mtime for _, stat in candidates), default=0.0)
+
+        imported = set()
+        suffixes = _suffix_index(known_paths)
+        roots = [path for path in known_paths if path in seeds or os.path.basename(path) in ENTRYPOINT_FILES]
+        for path in roots:
+            text = _read_text(os.path.join(root, path))
+            if text is None:
+                continue
+            if path.endswith(".py"):
+                imported |= _python_imports(path, text, suffixes)
+            elif os.path.splitext(path)[1] in SOURCE_EXTENSIONS:
+                imported |= _js_imports(path, text, known_paths)
+
+        ranked = []
+        for path, stat in candidates:
+            name = os.path.basename(path)
+            score = 0.0
+            if path in seeds:
+                score += 100
+            if path in imported:
+                score += 20
+            if name in MANIFEST_FILES:
+                score += 15 - path.count("/") * 5
+            if name in ENTRYPOINT_FILES:
+                score += 10 - path.count("/") * 2
+            if os.path.splitext(name)[1] in SOURCE_EXTENSIONS:
+                score += 3
+            path_words = {word.lower() for word in WORD_PATTERN.findall(path)}
+            score += 4 * len(task_words & path_words)
+            if newest > oldest:
+                score += 3 * (stat.st_mtime - oldest) / (newest - oldest)
+            score -= math.log2(1 + stat.st_size / 1024)
+            score -= path.count("/") * 0.5
+            ranked.append((score, path, stat))
+        ranked.sort(key=lambda item: (-item[0], item[1]))
+        return ranked
+
+    def pack(self, root, budget, seeds=(), task="", only_seeds=False):
+        """
+        Packs the workspace at ``root`` into at most ``budget`` tokens.
+
+        Args:
+            root (str): Workspace directory.
+            budget (int): Token budget for the context section.
+            seeds (list): Relative paths the task refers to; ranked first.
+            task (str): Task text; files whose path shares words with it rank higher.
+            only_seeds (bool): Pack only the ``seeds``, not the rest of the workspace.
+
+        Returns:
+            PackedContext: The context text and what went into it.
+        """
+        started = time.perf_counter()
+        seeds = {os.path.normpath(seed).replace(os.sep, "/") for seed in seeds}
+        candidates = self._candidates(root)
+        if only_seeds:
+            candidates = [(path, stat) for path, stat in candidates if path in seeds]
+        ranked = self._rank(root, candidates, seeds, task)
+
+        header = "## Repository context\n"
+        # Room for the "Other files" heading and the trailing count
+        used = estimate_tokens(header) + 16
+        full_sections, summary_sections, listed = [], [], []
+        omitted = 0
+        for _, path, stat in ranked:
+            remaining = budget - used
+            if remaining <= 0:
+                omitted += 1
+                continue
+            full_path = os.path.join(root, path)
+            text = _read_text(full_path) if stat.st_size <= CONTEXT_MAX_FILE_BYTES else None
+            if text is not None:
+                section = f"### {path}\n```\n{text}\n```\n"
+                tokens = estimate_tokens(section)
+                if tokens <= remaining and (path in seeds or tokens <= budget * CONTEXT_MAX_FILE_SHARE):
+                    full_sections.append(section)
+                    used += tokens
+                    continue
+                section = f"### {path} (summary)\n```\n{self.summary(full_path, path, stat, text)}\n```\n"
+                tokens = estimate_tokens(section)
+                if tokens <= remaining:
+                    summary_sections.append(section)
+                    used += tokens
+                    continue
+            entry = f"- {path} ({stat.st_size} bytes)\n"
+            tokens = estimate_tokens(entry)
+            if tokens <= remaining:
+                listed.append(entry)
+                used += tokens
+            else:
+                omitted += 1
+
+        text = header + "".join(full_sections) + "".join(summary_sections) if ranked else ""
+        if listed:
+            text += "### Other files\n" + "".join(listed)
+        if omitted:
+            text += f"({omitted} more files not shown)\n"
+        return PackedContext(
+            text, estimate_tokens(text), budget, len(full_sections), len(summary_sections), len(listed), omitted,
+            time.perf_counter() - started
+        )
+
+context_packer = ContextPacker()
@@ -1,8 +1,25 @@
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from . import models
+from .utils.trash import trash_bin
 from datetime import datetime, timedelta
 import os
-import shutil
+import subprocess
+
+# Hourly/daily cost rollups are maintained as costs are recorded so that
+# time-bounded cost summaries never have to scan raw project rows.
+COST_ROLLUPS_ENABLED = os.environ.get("COST_ROLLUPS_ENABLED", "true").lower() not in ("0", "false", "no")
+ROLLUP_GRANULARITIES = ("hour", "day")
+# Differences between a project's total and its rollups below this are rounding, not missing cost
+ROLLUP_BACKFILL_TOLERANCE = 1e-9
+
+_rollup_table_ready = False
+
+PROJECTS_DIR = "projects"
+RECONCILE_BATCH_SIZE = 500
 
 def get_db():
     from .database import SessionLocal
@@ -33,53 +50,257 @@ def update_project_user_data(project_name: str, user_id: str, repo_url: str, db:
         db.rollback()
         raise
 
-def remove_old_projects(db: Session, age: timedelta = None, user_id: str = None):
-    query = db.query(models.Project)
-    
+def _project_rows(db: Session):
+    return db.query(
+        models.Project.id,
+        models.Project.name,
+        models.Project.user_id,
+        models.User.user_id.label("owner"),
+        models.Project.updated_at
+    ).outerjoin(models.User, models.Project.user_id == models.User.id)
+
+def _project_batches(query, batch_size: int, start_after: str = None):
+    """Keyset-paginates ``query`` on the primary key so every batch is an index range scan."""
+    last_id = start_after
+    while True:
+        batch_query = query
+        if last_id is not None:
+            batch_query = batch_query.filter(models.Project.id > last_id)
+        batch = batch_query.order_by(models.Project.id).limit(batch_size).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+def _project_folders(row):
+    # Aider workspaces are keyed by name and user id, clones by project id
+    folders = {f"{row.name}_{row.user_id}", row.id}
+    if row.owner:
+        folders.add(f"{row.name}_{row.owner}")
+    return folders
+
+def project_workspace_paths(db: Session, project_id: str):
+    """
+    Returns the existing workspace directories of a project: its clone and
+    its Aider workspaces. Returns None if the project does not exist.
+    """
+    from .api.deploy.utils import get_project_directory
+    row = _project_rows(db).filter(models.Project.id == project_id).first()
+    if row is None:
+        return None
+    candidates = [str(get_project_directory(row.id))]
+    candidates.extend(os.path.join(PROJECTS_DIR, folder) for folder in sorted(_project_folders(row)) if folder != row.id)
+    return [path for path in candidates if os.path.isdir(path)]
+
+def checked_in_project_folders(projects_dir: str = None):
+    """
+    Returns the names of folders under the projects directory that are
+    committed to the source checkout, such as sample projects. They are not
+    workspaces, so reconcile and workspace GC never trash them.
+    """
+    try:
+        result = subprocess.run(
+            ["git", "ls-files", "--", "."],
+            cwd=projects_dir or PROJECTS_DIR, capture_output=True, text=True, timeout=30
+        )
+    except (OSError, subprocess.SubprocessError):
+        return set()
+    if result.returncode != 0:
+        return set()
+    return {line.split("/", 1)[0] for line in result.stdout.splitlines() if "/" in line}
+
+def _delete_project_batch(db: Session, project_ids):
+    db.query(models.Project).filter(models.Project.id.in_(project_ids)).delete(synchronize_session=False)
+    db.commit()
+
+def remove_old_projects(
+    db: Session,
+    age: timedelta = None,
+    user_id: str = None,
+    batch_size: int = RECONCILE_BATCH_SIZE,
+    start_after: str = None,
+    progress=None
+):
+    """
+    Deletes projects last updated before ``age`` ago, optionally for one user.
+
+    Rows are removed in batches of ``batch_size`` with one DELETE per batch and
+    their workspaces are handed to the trash bin, which purges them in the
+    background. ``progress(last_id, scanned, removed)`` is called after each
+    committed batch; passing a previous ``last_id`` as ``start_after`` resumes.
+    """
+    query = _project_rows(db)
+
     if age:
         cutoff_date = datetime.utcnow() - age
-        query = query.filter(models.Project.last_updated < cutoff_date)
-    
+        query = query.filter(models.Project.updated_at < cutoff_date)
+
     if user_id:
-        query = query.filter(models.Project.user_id == user_id)
-    
-    projects_to_remove = query.all()
-    
-    for project in projects_to_remove:
-        project_path = os.path.join("projects", f"{project.name}_{project.user_id}")
-        if os.path.exists(project_path):
-            shutil.rmtree(project_path)
-        db.delete(project)
-    
-    db.commit()
-    
-    return [{"name": p.name, "user_id": p.user_id, "last_updated": p.last_updated} for p in projects_to_remove]
+        query = query.filter(or_(models.Project.user_id == user_id, models.User.user_id == user_id))
 
-def cleanup_projects(db: Session):
-    projects_dir = "projects"
-    if not os.path.exists(projects_dir):
+    checked_in = checked_in_project_folders() if os.path.isdir(PROJECTS_DIR) else set()
+    removed_projects = []
+    for batch in _project_batches(query, batch_size, start_after):
+        # Rows go first: a failed commit then leaves projects whose workspaces are intact, never rows without them
+        _delete_project_batch(db, [row.id for row in batch])
+        for row in batch:
+            for folder in _project_folders(row) - checked_in:
+                trash_bin.discard(os.path.join(PROJECTS_DIR, folder))
+
+        removed_batch = [{"name": row.name, "user_id": row.user_id, "last_updated": row.updated_at} for row in batch]
+        removed_projects.extend(removed_batch)
+        if progress:
+            progress(batch[-1].id, len(batch), removed_batch)
+
+    return removed_projects
+
+def cleanup_projects(
+    db: Session,
+    batch_size: int = RECONCILE_BATCH_SIZE,
+    start_after: str = None,
+    progress=None
+):
+    """
+    Deletes project rows whose workspace folder no longer exists.
+
+    The projects directory is read once with ``os.scandir``; database rows are
+    then streamed in primary-key batches and missing ones deleted with one
+    statement per batch. Progress and resumption work as in ``remove_old_projects``.
+    """
+    if not os.path.exists(PROJECTS_DIR):
         return []
-    existing_projects = set(os.listdir(projects_dir))
-    
-    # Get all projects from the database
-    db_projects = db.query(models.Project).all()
-    
+    with os.scandir(PROJECTS_DIR) as entries:
+        existing_projects = {entry.name for entry in entries if not entry.name.startswith(".")}
+
     removed_projects = []
-    for project in db_projects:
-        project_folder = f"{project.name}_{project.user_id}"
-        if project_folder not in existing_projects:
-            # Remove the project from the database
-            db.delete(project)
-            removed_projects.append({"name": project.name, "user_id": project.user_id})
-    
-    # Commit the changes
-    db.commit()
-    
+    for batch in _project_batches(_project_rows(db), batch_size, start_after):
+        missing = [row for row in batch if existing_projects.isdisjoint(_project_folders(row))]
+        if missing:
+            _delete_project_batch(db, [row.id for row in missing])
+
+        removed_batch = [{"name": row.name, "user_id": row.user_id} for row in missing]
+        removed_projects.extend(removed_batch)
+        if progress:
+            progress(batch[-1].id, len(batch), removed_batch)
+
     return removed_projects
 
 def update_project_cost(db: Session, project_name: str, user_id: str, cost: float):
-    project = db.query(models.Project).filter(models.Project.name == project_name, models.Project.user_id == user_id).first()
+    project = (
+        db.query(models.Project)
+        .outerjoin(models.User, models.Project.user_id == models.User.id)
+        .filter(
+            models.Project.name == project_name,
+            or_(models.Project.user_id == user_id, models.User.user_id == user_id)
+        )
+        .first()
+    )
     if project:
-        project.total_cost += cost
-        project.last_updated = datetime.utcnow()
+        now = datetime.utcnow()
+        project.total_cost = (project.total_cost or 0.0) + cost
+        project.updated_at = now
+        if COST_ROLLUPS_ENABLED:
+            record_cost_rollups(db, project, cost, now)
         db.commit()
+
+def rollup_bucket_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def ensure_cost_rollup_table(db: Session):
+    """Creates the rollup table on first use and backfills it from the project totals, once per process."""
+    global _rollup_table_ready
+    if not _rollup_table_ready:
+        models.CostRollup.__table__.create(bind=db.get_bind(), checkfirst=True)
+        # Its own session, so the backfill commits without touching the caller's transaction
+        with Session(bind=db.get_bind()) as backfill_db:
+            backfill_cost_rollups(backfill_db)
+            backfill_db.commit()
+        _rollup_table_ready = True
+
+def backfill_cost_rollups(db: Session):
+    """
+    Adds to the rollups whatever part of each project's ``total_cost`` they do
+    not hold yet: costs recorded before rollups existed or while they were
+    disabled. That history has no timestamps, so it goes into the bucket of
+    the project's earliest rollup or, lacking one, its last update. Running it
+    again finds nothing missing. The caller commits.
+
+    Returns:
+        int: The number of projects backfilled.
+    """
+    rolled_up = (
+        db.query(
+            models.CostRollup.project_id,
+            func.sum(models.CostRollup.total_cost).label("cost"),
+            func.min(models.CostRollup.bucket_start).label("first_bucket")
+        )
+        .filter(models.CostRollup.granularity == "day")
+        .group_by(models.CostRollup.project_id)
+        .subquery()
+    )
+    rows = (
+        db.query(
+            models.Project.id, models.Project.user_id, models.Project.total_cost,
+            models.Project.created_at, models.Project.updated_at, rolled_up.c.cost, rolled_up.c.first_bucket
+        )
+        .outerjoin(rolled_up, rolled_up.c.project_id == models.Project.id)
+        .filter(models.Project.total_cost > func.coalesce(rolled_up.c.cost, 0.0) + ROLLUP_BACKFILL_TOLERANCE)
+        .all()
+    )
+    for row in rows:
+        recorded_at = row.first_bucket or row.updated_at or row.created_at or datetime.utcnow()
+        for granularity in ROLLUP_GRANULARITIES:
+            # No events: the missing cost is a remainder, not a recorded call
+            _add_to_rollup(
+                db, granularity, rollup_bucket_start(recorded_at, granularity), row.id, row.user_id,
+                row.total_cost - (row.cost or 0.0), 0
+            )
+    return len(rows)
+
+def _add_to_rollup(db: Session, granularity: str, bucket_start: datetime, project_id: str, user_id: str,
+                   cost: float, events: int):
+    """Adds to one bucket in a single statement, so concurrent writers to a new bucket cannot both insert it."""
+    table = models.CostRollup.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+        statement = insert(table).values(
+            granularity=granularity, bucket_start=bucket_start, project_id=project_id, user_id=user_id,
+            total_cost=cost, event_count=events
+        )
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["granularity", "bucket_start", "project_id"],
+            set_={
+                "total_cost": table.c.total_cost + statement.excluded.total_cost,
+                "event_count": table.c.event_count + statement.excluded.event_count,
+            }
+        ))
+        return
+    bucket = (
+        table.c.granularity == granularity,
+        table.c.bucket_start == bucket_start,
+        table.c.project_id == project_id,
+    )
+    increment = {"total_cost": table.c.total_cost + cost, "event_count": table.c.event_count + events}
+    if db.execute(table.update().where(*bucket).values(**increment)).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(table.insert().values(
+                granularity=granularity, bucket_start=bucket_start, project_id=project_id, user_id=user_id,
+                total_cost=cost, event_count=events
+            ))
+    except IntegrityError:
+        # Another writer created the bucket since the update; add to theirs
+        db.execute(table.update().where(*bucket).values(**increment))
+
+def record_cost_rollups(db: Session, project: models.Project, cost: float, recorded_at: datetime = None):
+    """Add ``cost`` to the hourly and daily buckets of ``project``. The caller commits."""
+    recorded_at = recorded_at or datetime.utcnow()
+    ensure_cost_rollup_table(db)
+    for granularity in ROLLUP_GRANULARITIES:
+        _add_to_rollup(
+            db, granularity, rollup_bucket_start(recorded_at, granularity), project.id, project.user_id, cost, 1
+        )
@@ -35,7 +35,13 @@ def init_db():
             
             if 'repo_url' not in existing_columns:
                 conn.execute(text("ALTER TABLE projects ADD COLUMN repo_url TEXT"))
-        
+
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_projects_user_id ON projects (user_id)"))
+
         # Check if users table exists, if not create it
         if 'users' not in inspector.get_table_names():
             models.User.__table__.create(bind=engine)
+
+        # Cost rollups back the time-bucketed /cost-summary queries
+        if 'cost_rollups' not in inspector.get_table_names():
+            models.CostRollup.__table__.create(bind=engine)
@@ -0,0 +1,270 @@
+# agentic_platform/agentic_platform/fingerprint.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from .utils.paths import data_path
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_INDEX_DIR = os.environ.get("WORKSPACE_INDEX_DIR", data_path("workspace_index"))
+# Snapshots kept per workspace for diffs; the oldest are dropped first
+FINGERPRINT_SNAPSHOT_LIMIT = int(os.environ.get("FINGERPRINT_SNAPSHOT_LIMIT", "20"))
+FINGERPRINT_IGNORED_DIRS = {".git"}
+
+# Files modified this close to the last scan may change again within the same
+# mtime tick, so their cached hash is not trusted
+_RACY_WINDOW_NS = 2_000_000_000
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _leaf(relative_path, content_hash):
+    return hashlib.sha256(f"{relative_path}\0{content_hash}".encode()).digest()
+
+def merkle_root(hashes, paths=None):
+    """
+    Computes a Merkle root over a {relative path: content hash} map.
+
+    Args:
+        hashes (dict): Content hashes by relative path.
+        paths (list, optional): Restrict the root to these paths; paths without
+            a hash contribute a "missing" leaf.
+
+    Returns:
+        str: Hex digest of the sorted leaves.
+    """
+    if paths is None:
+        paths = hashes.keys()
+    root_digest = hashlib.sha256()
+    for relative_path in sorted(set(os.path.normpath(path) for path in paths)):
+        root_digest.update(_leaf(relative_path, hashes.get(relative_path, "missing")))
+    return root_digest.hexdigest()
+
+def directory_tree(hashes):
+    """Returns {directory: hash} for every directory, bottom up; the workspace root is ""."""
+    children = {"": {}}
+    for relative_path, content_hash in hashes.items():
+        parent, name = os.path.split(relative_path)
+        children.setdefault(parent, {})[name] = "f" + content_hash
+        while parent:
+            grandparent, directory = os.path.split(parent)
+            children.setdefault(grandparent, {})[directory] = None
+            parent = grandparent
+
+    tree = {}
+    for directory in sorted(children, key=lambda path: path.count(os.sep) + bool(path), reverse=True):
+        digest = hashlib.sha256()
+        for name in sorted(children[directory]):
+            value = children[directory][name]
+            if value is None:
+                value = "d" + tree[os.path.join(directory, name)]
+            digest.update(f"{name}\0{value}\0".encode())
+        tree[directory] = digest.hexdigest()
+    return tree
+
+class WorkspaceIndex:
+    """
+    Persisted (mtime, size, hash) index of the files in one workspace.
+
+    ``refresh`` stat-walks the tree and only rehashes files whose mtime or
+    size changed since the last scan. Each fingerprint can be stored as a
+    snapshot so later scans can be diffed against it.
+    """
+
+    def __init__(self, root, index_dir=WORKSPACE_INDEX_DIR):
+        self.root = os.path.realpath(root)
+        key = hashlib.sha1(self.root.encode()).hexdigest()[:16]
+        self.state_dir = os.path.join(index_dir, key)
+        self._files = None
+        self._indexed_at = 0
+        self._lock = threading.Lock()
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.state_dir, "index.json")
+
+    def _snapshot_path(self, fingerprint):
+        return os.path.join(self.state_dir, "snapshots", f"{fingerprint}.json")
+
+    @staticmethod
+    def _write_json(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    def _load(self):
+        try:
+            with open(self._index_path, "r") as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}, 0
+        if state.get("root") != self.root:
+            return {}, 0
+        return state.get("files", {}), state.get("indexed_at", 0)
+
+    def _walk(self):
+        stack = [""]
+        while stack:
+            relative_dir = stack.pop()
+            try:
+                with os.scandir(os.path.join(self.root, relative_dir)) as entries:
+                    for entry in entries:
+                        relative_path = os.path.join(relative_dir, entry.name)
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in FINGERPRINT_IGNORED_DIRS:
+                                stack.append(relative_path)
+                        elif entry.is_file(follow_symlinks=False):
+                            try:
+                                yield relative_path, entry.stat(follow_symlinks=False)
+                            except FileNotFoundError:
+                                continue
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+
+    def refresh(self):
+        """
+        Brings the index up to date with the files on disk.
+
+        Returns:
+            tuple: {relative path: content hash} and scan statistics.
+        """
+        with self._lock:
+            if self._files is None:
+                self._files, self._indexed_at = self._load()
+            previous = self._files
+            scan_started = time.time_ns()
+            racy_after = self._indexed_at - _RACY_WINDOW_NS
+
+            files = {}
+            hashed = 0
+            total_bytes = 0
+            for relative_path, stat in self._walk():
+                total_bytes += stat.st_size
+                cached = previous.get(relative_path)
+                if (cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size
+                        and stat.st_mtime_ns < racy_after):
+                    files[relative_path] = cached
+                    continue
+                try:
+                    content_hash = hash_file(os.path.join(self.root, relative_path))
+                except (FileNotFoundError, PermissionError):
+                    continue
+                files[relative_path] = [stat.st_mtime_ns, stat.st_size, content_hash]
+                hashed += 1
+
+            removed = len(previous.keys() - files.keys())
+            if hashed or removed or not self._indexed_at:
+                self._write_json(self._index_path, {"root": self.root, "indexed_at": scan_started, "files": files})
+                self._indexed_at = scan_started
+            self._files = files
+
+        stats = {"files": len(files), "bytes": total_bytes, "hashed": hashed, "removed": removed}
+        return {path: entry[2] for path, entry in files.items()}, stats
+
+    def fingerprint(self, paths=None, snapshot=False):
+        """
+        Returns the root of the workspace's directory Merkle tree, or a flat
+        Merkle root over ``paths`` when given.
+
+        Args:
+            paths (list, optional): Relative paths to include; all files by default.
+            snapshot (bool): Store the file hashes so ``diff`` can compare against
+                this fingerprint; only applies to whole-workspace fingerprints.
+
+        Returns:
+            tuple: The fingerprint and the scan statistics.
+        """
+        hashes, stats = self.refresh()
+        if paths is not None:
+            return merkle_root(hashes, paths), stats
+        fingerprint = directory_tree(hashes)[""]
+        if snapshot:
+            self.save_snapshot(fingerprint, hashes)
+        return fingerprint, stats
+
+    def save_snapshot(self, fingerprint, hashes):
+        path = self._snapshot_path(fingerprint)
+        if os.path.exists(path):
+            os.utime(path)
+            return
+        self._write_json(path, hashes)
+        snapshots_dir = os.path.dirname(path)
+        with os.scandir(snapshots_dir) as entries:
+            snapshots = sorted(
+                (entry for entry in entries if entry.name.endswith(".json")),
+                key=lambda entry: entry.stat().st_mtime
+            )
+        for entry in snapshots[:max(0, len(snapshots) - FINGERPRINT_SNAPSHOT_LIMIT)]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def load_snapshot(self, fingerprint):
+        """Returns the file hashes recorded for ``fingerprint``, or None if no snapshot is stored."""
+        if not all(c in "0123456789abcdef" for c in fingerprint):
+            return None
+        try:
+            with open(self._snapshot_path(fingerprint), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def diff(self, since):
+        """
+        Compares the current files with the snapshot stored for fingerprint ``since``.
+
+        Returns:
+            dict: The current fingerprint and the added, modified and removed paths,
+            or None if no snapshot exists for ``since``.
+        """
+        previous = self.load_snapshot(since)
+        if previous is None:
+            return None
+        current, stats = self.refresh()
+        fingerprint = directory_tree(current)[""]
+        self.save_snapshot(fingerprint, current)
+        return {
+            "since": since,
+            "fingerprint": fingerprint,
+            "changed": fingerprint != since,
+            "added": sorted(current.keys() - previous.keys()),
+            "modified": sorted(path for path in current.keys() & previous.keys() if current[path] != previous[path]),
+            "removed": sorted(previous.keys() - current.keys()),
+            "stats": stats
+        }
+
+class WorkspaceFingerprints:
+    """Keeps one ``WorkspaceIndex`` per workspace root so the index stays in memory between scans."""
+
+    def __init__(self, index_dir=WORKSPACE_INDEX_DIR):
+        self.index_dir = index_dir
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, root):
+        key = os.path.realpath(root)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = WorkspaceIndex(key, self.index_dir)
+        return index
+
+    def fingerprint(self, root, paths=None, snapshot=False):
+        return self.get(root).fingerprint(paths, snapshot)[0]
+
+    def forget(self, root):
+        with self._lock:
+            self._indexes.pop(os.path.realpath(root), None)
+
+workspace_fingerprints = WorkspaceFingerprints()
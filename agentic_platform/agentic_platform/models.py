@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, ForeignKey, DateTime, Float
+from sqlalchemy import Column, String, ForeignKey, DateTime, Float, Integer, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -18,9 +18,26 @@ class Project(Base):
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()), index=True)
     name = Column(String, index=True)
-    user_id = Column(String(36), ForeignKey("users.id"))
+    user_id = Column(String(36), ForeignKey("users.id"), index=True)
     repo_url = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     total_cost = Column(Float, default=0.0)
     user = relationship("User", back_populates="projects")
+
+class CostRollup(Base):
+    """Pre-aggregated project cost per hourly or daily bucket."""
+    __tablename__ = "cost_rollups"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    granularity = Column(String(8), nullable=False)  # "hour" or "day"
+    bucket_start = Column(DateTime, nullable=False)
+    project_id = Column(String(36), ForeignKey("projects.id"), nullable=False)
+    user_id = Column(String(36))
+    total_cost = Column(Float, default=0.0)
+    event_count = Column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", "project_id", name="uq_cost_rollups_bucket"),
+        Index("ix_cost_rollups_granularity_bucket", "granularity", "bucket_start"),
+    )
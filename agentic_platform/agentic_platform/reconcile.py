@@ -0,0 +1,112 @@
+# agentic_platform/agentic_platform/reconcile.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from .utils.paths import data_path
+from .crud import cleanup_projects, remove_old_projects
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_STATE_DIR = os.environ.get("RECONCILE_STATE_DIR", data_path("reconcile"))
+
+reconcile_jobs = {}  # key: job_id, value: job progress
+_running_tasks = set()
+
+def _checkpoint_path(kind: str, params: dict) -> str:
+    # Runs with different parameters (e.g. removals for different users) keep separate checkpoints
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return os.path.join(RECONCILE_STATE_DIR, f"{kind}-{digest}.json")
+
+def load_checkpoint(kind: str, params: dict):
+    """Returns the last committed project id of an interrupted run with the same parameters."""
+    try:
+        with open(_checkpoint_path(kind, params), "r") as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if state.get("params") != params:
+        return None
+    return state.get("last_id")
+
+def save_checkpoint(kind: str, params: dict, last_id: str):
+    os.makedirs(RECONCILE_STATE_DIR, exist_ok=True)
+    path = _checkpoint_path(kind, params)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"params": params, "last_id": last_id, "saved_at": datetime.utcnow().isoformat()}, f)
+    os.replace(f"{path}.tmp", path)
+
+def clear_checkpoint(kind: str, params: dict):
+    try:
+        os.remove(_checkpoint_path(kind, params))
+    except FileNotFoundError:
+        pass
+
+def _run(kind: str, params: dict, batch_size: int, start_after, progress):
+    from .database import SessionLocal
+    db = SessionLocal()
+    try:
+        if kind == "remove":
+            age = timedelta(seconds=params["age_seconds"]) if params.get("age_seconds") else None
+            return remove_old_projects(db, age, params.get("user_id"), batch_size, start_after, progress)
+        return cleanup_projects(db, batch_size, start_after, progress)
+    finally:
+        db.close()
+
+def start_reconcile_job(kind: str, params: dict, resume: bool = True, batch_size: int = 500):
+    """
+    Runs a cleanup ("cleanup") or age-based removal ("remove") in a worker thread.
+
+    Progress is tracked in ``reconcile_jobs`` and checkpointed to disk after each
+    batch, so with ``resume`` a run interrupted by a restart continues after the
+    last committed batch instead of starting over.
+
+    Returns:
+        tuple: The job progress dict and the task resolving to the removed projects.
+    """
+    start_after = load_checkpoint(kind, params) if resume else None
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "kind": kind,
+        "params": params,
+        "status": "running",
+        "resumed_from": start_after,
+        "last_id": start_after,
+        "batches": 0,
+        "scanned": 0,
+        "removed": 0,
+        "started_at": datetime.utcnow().isoformat(),
+        "finished_at": None,
+        "error": None
+    }
+    reconcile_jobs[job_id] = job
+
+    def progress(last_id, scanned, removed_batch):
+        job["last_id"] = last_id
+        job["batches"] += 1
+        job["scanned"] += scanned
+        job["removed"] += len(removed_batch)
+        save_checkpoint(kind, params, last_id)
+
+    async def run():
+        try:
+            removed_projects = await asyncio.to_thread(_run, kind, params, batch_size, start_after, progress)
+            clear_checkpoint(kind, params)
+            job["status"] = "completed"
+            return removed_projects
+        except Exception as e:
+            logger.error(f"Reconcile job {job_id} failed: {e}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+            raise
+        finally:
+            job["finished_at"] = datetime.utcnow().isoformat()
+
+    task = asyncio.create_task(run())
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+    return job, task
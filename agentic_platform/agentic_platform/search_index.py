@@ -0,0 +1,442 @@
+# agentic_platform/agentic_platform/search_index.py
+import ast
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import threading
+from .utils.paths import data_path
+from .utils.ignore import GitignoreMatcher, translate_pattern
+
+try:
+    import re._parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_DIR = os.environ.get("SEARCH_INDEX_DIR")
+SEARCH_MAX_FILE_BYTES = int(os.environ.get("SEARCH_MAX_FILE_BYTES", str(1024 * 1024)))
+SEARCH_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS content USING fts5(body, tokenize = 'trigram');
+CREATE TABLE IF NOT EXISTS symbols (
+    file_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    qualname TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    end_line INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_symbols_name ON symbols (name);
+CREATE INDEX IF NOT EXISTS ix_symbols_file_id ON symbols (file_id);
+"""
+
+def extract_symbols(source):
+    """
+    Returns the classes, functions, methods and module-level assignments
+    defined in Python ``source`` as (name, qualname, kind, line, end_line).
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+
+    symbols = []
+
+    def visit(node, parents):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                if isinstance(child, ast.ClassDef):
+                    kind = "class"
+                elif parents and parents[-1][1] == "class":
+                    kind = "method"
+                else:
+                    kind = "function"
+                qualname = ".".join([name for name, _ in parents] + [child.name])
+                symbols.append((child.name, qualname, kind, child.lineno, getattr(child, "end_lineno", None)))
+                visit(child, parents + [(child.name, kind)])
+            elif not parents and isinstance(child, (ast.Assign, ast.AnnAssign)):
+                targets = child.targets if isinstance(child, ast.Assign) else [child.target]
+                for target in targets:
+                    if isinstance(target, ast.Name):
+                        symbols.append((target.id, target.id, "variable", child.lineno, getattr(child, "end_lineno", None)))
+
+    visit(tree, [])
+    return symbols
+
+def required_literals(pattern, flags=0):
+    """
+    Returns literal strings every match of the regex ``pattern`` must contain,
+    for narrowing candidates with the trigram index. Empty when none are known.
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return []
+    literals = []
+    current = []
+    for op, value in parsed:
+        if op == sre_parse.LITERAL:
+            current.append(chr(value))
+            continue
+        if op in (sre_parse.AT,):
+            continue
+        if current:
+            literals.append("".join(current))
+            current = []
+    if current:
+        literals.append("".join(current))
+    return [literal for literal in literals if len(literal) >= 3]
+
+def _path_under(column, path):
+    """SQL condition matching ``path`` itself and everything below it, and its parameters."""
+    escaped = path.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"({column} = ? OR {column} LIKE ? ESCAPE '\\')", [path, escaped + "/%"]
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+class ProjectSearchIndex:
+    """
+    Full-text and symbol index of one workspace, stored in an SQLite database.
+
+    File contents go into an FTS5 table with the trigram tokenizer, so any
+    substring of three or more characters is an index lookup; Python files
+    also get their definitions extracted with ``ast``. ``sync`` stat-walks the
+    tree and reindexes only files whose mtime or size changed.
+    """
+
+    def __init__(self, root, db_path):
+        self.root = os.path.realpath(root)
+        self.db_path = db_path
+        self._write_lock = threading.Lock()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        return connection
+
+    @property
+    def exists(self):
+        return os.path.exists(self.db_path)
+
+    def _walk(self):
+        matcher = GitignoreMatcher(self.root)
+        stack = [""]
+        while stack:
+            relative_dir = stack.pop()
+            try:
+                with os.scandir(os.path.join(self.root, relative_dir)) as entries:
+                    for entry in entries:
+                        relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if matcher.match(relative_path, is_dir):
+                            continue
+                        if is_dir:
+                            stack.append(relative_path)
+                        elif entry.is_file(follow_symlinks=False):
+                            try:
+                                stat = entry.stat(follow_symlinks=False)
+                            except FileNotFoundError:
+                                continue
+                            if stat.st_size <= SEARCH_MAX_FILE_BYTES:
+                                yield relative_path, stat
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+
+    def _read_text(self, relative_path):
+        try:
+            with open(os.path.join(self.root, relative_path), "rb") as f:
+                data = f.read(SEARCH_MAX_FILE_BYTES + 1)
+        except (FileNotFoundError, IsADirectoryError, PermissionError):
+            return None
+        if len(data) > SEARCH_MAX_FILE_BYTES or b"\0" in data[:8192]:
+            return None
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+
+    @staticmethod
+    def _delete(connection, file_ids):
+        for start in range(0, len(file_ids), SEARCH_BATCH_SIZE):
+            batch = file_ids[start:start + SEARCH_BATCH_SIZE]
+            marks = ",".join("?" * len(batch))
+            connection.execute(f"DELETE FROM content WHERE rowid IN ({marks})", batch)
+            connection.execute(f"DELETE FROM symbols WHERE file_id IN ({marks})", batch)
+            connection.execute(f"DELETE FROM files WHERE id IN ({marks})", batch)
+
+    def _index_file(self, connection, relative_path, stat, file_id=None):
+        if file_id is not None:
+            self._delete(connection, [file_id])
+        body = self._read_text(relative_path)
+        # Binary files are recorded without content so a sync does not reread them
+        cursor = connection.execute(
+            "INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?)",
+            (relative_path, stat.st_mtime_ns, stat.st_size)
+        )
+        if body is None:
+            return False
+        file_id = cursor.lastrowid
+        connection.execute("INSERT INTO content (rowid, body) VALUES (?, ?)", (file_id, body))
+        if relative_path.endswith(".py"):
+            connection.executemany(
+                "INSERT INTO symbols (file_id, name, qualname, kind, line, end_line) VALUES (?, ?, ?, ?, ?, ?)",
+                [(file_id, *symbol) for symbol in extract_symbols(body)]
+            )
+        return True
+
+    def sync(self):
+        """
+        Brings the index up to date with the workspace. Blocking; run it in a thread.
+
+        Returns:
+            dict: Counts of indexed, unchanged and removed files.
+        """
+        with self._write_lock:
+            connection = self._connect()
+            try:
+                connection.executescript(SCHEMA)
+                known = {path: (file_id, mtime_ns, size) for file_id, path, mtime_ns, size in
+                         connection.execute("SELECT id, path, mtime_ns, size FROM files")}
+                seen = set()
+                indexed = unchanged = 0
+                pending = 0
+                for relative_path, stat in self._walk():
+                    seen.add(relative_path)
+                    previous = known.get(relative_path)
+                    if previous and previous[1] == stat.st_mtime_ns and previous[2] == stat.st_size:
+                        unchanged += 1
+                        continue
+                    if self._index_file(connection, relative_path, stat, previous[0] if previous else None):
+                        indexed += 1
+                    pending += 1
+                    if pending >= SEARCH_BATCH_SIZE:
+                        connection.commit()
+                        pending = 0
+                removed = [file_id for path, (file_id, _, _) in known.items() if path not in seen]
+                self._delete(connection, removed)
+                connection.commit()
+            finally:
+                connection.close()
+        logger.info(f"Search index for {self.root}: {indexed} indexed, {unchanged} unchanged, {len(removed)} removed")
+        return {"indexed": indexed, "unchanged": unchanged, "removed": len(removed)}
+
+    def update_paths(self, relative_paths):
+        """Reindexes the given files; paths that no longer exist, and everything below them, are dropped."""
+        if not self.exists:
+            return
+        with self._write_lock:
+            connection = self._connect()
+            try:
+                connection.executescript(SCHEMA)
+                for relative_path in relative_paths:
+                    relative_path = os.path.normpath(relative_path).replace(os.sep, "/").strip("/")
+                    if relative_path in ("", ".") or relative_path.split("/")[0] == "..":
+                        continue
+                    condition, condition_params = _path_under("path", relative_path)
+                    rows = connection.execute(f"SELECT id FROM files WHERE {condition}", condition_params).fetchall()
+                    self._delete(connection, [row[0] for row in rows])
+                    full_path = os.path.join(self.root, relative_path)
+                    if os.path.isfile(full_path):
+                        stat = os.stat(full_path)
+                        if stat.st_size <= SEARCH_MAX_FILE_BYTES:
+                            self._index_file(connection, relative_path, stat)
+                    elif os.path.isdir(full_path):
+                        for path, stat in self._walk():
+                            if path.startswith(relative_path + "/"):
+                                self._index_file(connection, path, stat)
+                connection.commit()
+            finally:
+                connection.close()
+
+    def search(self, query, regex=False, path=None, case_sensitive=False, limit=50, context=2, max_matches_per_file=20):
+        """
+        Finds ``query`` in the indexed files.
+
+        Candidate files come from the trigram index, ranked by BM25, and are
+        then scanned line by line for the exact matches.
+
+        Args:
+            query (str): Text, or a regular expression with ``regex``.
+            regex (bool): Treat ``query`` as a Python regular expression.
+            path (str, optional): Only search under this directory, or files
+                matching this glob if it contains wildcards.
+            case_sensitive (bool): Match case exactly.
+            limit (int): Maximum number of files returned.
+            context (int): Lines of context before and after each match.
+            max_matches_per_file (int): Maximum matches reported per file.
+
+        Returns:
+            dict: Files with their matches, each with a line number, the line and its context.
+
+        Raises:
+            ValueError: If ``regex`` is set and ``query`` is not a valid expression.
+        """
+        flags = 0 if case_sensitive else re.IGNORECASE
+        if regex:
+            try:
+                line_pattern = re.compile(query, flags)
+            except re.error as e:
+                raise ValueError(f"Invalid regular expression: {e}")
+            literals = required_literals(query, flags)
+        else:
+            line_pattern = re.compile(re.escape(query), flags)
+            literals = [query] if len(query) >= 3 else []
+
+        sql = "SELECT files.path, content.body FROM content JOIN files ON files.id = content.rowid"
+        conditions, params = [], []
+        if literals:
+            conditions.append("content MATCH ?")
+            params.append(" AND ".join(_fts_phrase(literal) for literal in literals))
+        path_regex = None
+        if path:
+            path = path.strip("/")
+            if any(char in path for char in "*?["):
+                path_regex = translate_pattern(path)
+            else:
+                condition, condition_params = _path_under("files.path", path)
+                conditions.append(condition)
+                params.extend(condition_params)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY bm25(content)" if literals else " ORDER BY files.path"
+
+        results = []
+        scanned = 0
+        connection = self._connect()
+        try:
+            for relative_path, body in connection.execute(sql, params):
+                if path_regex is not None and not path_regex.match(relative_path):
+                    continue
+                scanned += 1
+                lines = body.splitlines()
+                matches = []
+                total = 0
+                for number, line in enumerate(lines):
+                    if not line_pattern.search(line):
+                        continue
+                    total += 1
+                    if len(matches) < max_matches_per_file:
+                        matches.append({
+                            "line": number + 1,
+                            "text": line,
+                            "before": lines[max(0, number - context):number],
+                            "after": lines[number + 1:number + 1 + context]
+                        })
+                if matches:
+                    results.append({"path": relative_path, "match_count": total, "matches": matches})
+                    if len(results) >= limit:
+                        break
+        finally:
+            connection.close()
+        return {"query": query, "regex": regex, "indexed_lookup": bool(literals), "files_scanned": scanned, "results": results}
+
+    def symbols(self, name=None, kind=None, path=None, prefix=False, limit=100):
+        """Looks up definitions by exact name (or name prefix), kind and file path prefix."""
+        sql = ("SELECT symbols.name, symbols.qualname, symbols.kind, files.path, symbols.line, symbols.end_line "
+               "FROM symbols JOIN files ON files.id = symbols.file_id")
+        conditions, params = [], []
+        if name:
+            if prefix:
+                conditions.append("symbols.name >= ? AND symbols.name < ?")
+                params.extend([name, name + "\U0010ffff"])
+            else:
+                conditions.append("symbols.name = ?")
+                params.append(name)
+        if kind:
+            conditions.append("symbols.kind = ?")
+            params.append(kind)
+        path = (path or "").strip("/")
+        if path:
+            # A file or directory path, not a string prefix: "src/app" must not match "src/application.py"
+            condition, condition_params = _path_under("files.path", path)
+            conditions.append(condition)
+            params.extend(condition_params)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY symbols.name, files.path, symbols.line LIMIT ?"
+        params.append(limit)
+        connection = self._connect()
+        try:
+            rows = connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+        return [
+            {"name": name, "qualname": qualname, "kind": kind, "path": path, "line": line, "end_line": end_line}
+            for name, qualname, kind, path, line, end_line in rows
+        ]
+
+class SearchIndexes:
+    """Keeps one ``ProjectSearchIndex`` per project and the background builds started for them."""
+
+    def __init__(self, directory=SEARCH_INDEX_DIR):
+        self._directory = directory
+        self._indexes = {}
+        self._builds = {}
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        if self._directory is None:
+            self._directory = data_path("search")
+        return self._directory
+
+    def get(self, project_id, root):
+        with self._lock:
+            index = self._indexes.get(project_id)
+            if index is None or index.root != os.path.realpath(root):
+                index = ProjectSearchIndex(root, os.path.join(self.directory, f"{project_id}.sqlite3"))
+                self._indexes[project_id] = index
+        return index
+
+    def schedule_build(self, project_id, root):
+        """Starts a background sync of the project's index and returns its task."""
+        task = self._builds.get(project_id)
+        if task is not None and not task.done():
+            return task
+        index = self.get(project_id, root)
+        task = asyncio.create_task(asyncio.to_thread(index.sync))
+        self._builds[project_id] = task
+        task.add_done_callback(lambda finished: self._log_build(project_id, finished))
+        return task
+
+    def _log_build(self, project_id, task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Building search index for project {project_id} failed: {task.exception()}")
+
+    async def ready(self, project_id, root, refresh=False):
+        """Returns the project's index once it is built, building or refreshing it if needed."""
+        index = self.get(project_id, root)
+        task = self._builds.get(project_id)
+        if task is not None and not task.done():
+            await asyncio.shield(task)
+        if refresh or not index.exists:
+            await self.schedule_build(project_id, root)
+        return index
+
+    def update_paths(self, project_id, root, relative_paths):
+        self.get(project_id, root).update_paths(relative_paths)
+
+    def drop(self, project_id):
+        with self._lock:
+            index = self._indexes.pop(project_id, None)
+        path = index.db_path if index else os.path.join(self.directory, f"{project_id}.sqlite3")
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+
+search_indexes = SearchIndexes()
@@ -1,3 +1,10 @@
 # agentic_platform/agentic_platform/utils/__init__.py
 
+from .paths import DATA_DIR, data_path
 from .json_utils import extract_json_from_output
+from .streaming import stream_query_rows, streaming_export
+from .trash import TrashBin, trash_bin
+from .templates import CompiledTemplate, TemplateRegistry, template_registry
+from .response_cache import ResponseCache, response_cache
+from .ignore import IgnoreRules, DockerignoreRules, GitignoreMatcher, translate_pattern
+from .file_io import FileIOService, LoopLagMonitor, file_io, loop_lag_monitor
@@ -0,0 +1,179 @@
+# agentic_platform/agentic_platform/utils/file_io.py
+
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+FILE_IO_WORKERS = int(os.environ.get("FILE_IO_WORKERS", "4"))
+LOOP_LAG_INTERVAL = float(os.environ.get("LOOP_LAG_INTERVAL", "0.05"))
+LOOP_LAG_WINDOW = int(os.environ.get("LOOP_LAG_WINDOW", "2000"))
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def _write_text(path, content):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+def _read_text(path):
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def _remove(path):
+    if os.path.isfile(path) or os.path.islink(path):
+        os.remove(path)
+        return "file"
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+        return "directory"
+    return None
+
+class FileIOService:
+    """
+    Runs blocking filesystem calls on a dedicated, bounded thread pool so a
+    large write or ``rmtree`` never runs on the event loop and cannot use up
+    the default executor that other ``asyncio.to_thread`` work shares.
+    """
+
+    def __init__(self, max_workers=FILE_IO_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.active = 0
+        self.busy_seconds = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="file-io")
+            return self._executor
+
+    def _call(self, func, args, kwargs):
+        with self._lock:
+            self.active += 1
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+                self.busy_seconds += time.perf_counter() - started
+        return result
+
+    async def run(self, func, *args, **kwargs):
+        """Runs ``func(*args, **kwargs)`` on the file IO pool and returns its result."""
+        self.submitted += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), partial(self._call, func, args, kwargs))
+
+    async def read_text(self, path):
+        """Returns the contents of ``path``, or None if it does not exist."""
+        return await self.run(_read_text, path)
+
+    async def write_text(self, path, content):
+        """Writes ``content`` to ``path``, creating missing parent directories."""
+        await self.run(_write_text, path, content)
+
+    async def remove(self, path):
+        """
+        Removes a file or a directory tree.
+
+        Returns:
+            str: "file" or "directory", or None if nothing existed at ``path``.
+        """
+        return await self.run(_remove, path)
+
+    def snapshot(self):
+        return {
+            "max_workers": self.max_workers,
+            "active": self.active,
+            "queued": max(0, self.submitted - self.completed - self.active),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3)
+        }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag: how late a timer that should fire every
+    ``interval`` seconds actually wakes up. Any blocking call on the loop shows
+    up directly as lag, and as added latency on every in-flight request.
+    """
+
+    def __init__(self, interval=LOOP_LAG_INTERVAL, window=LOOP_LAG_WINDOW):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def start(self):
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def reset(self):
+        self.samples.clear()
+        self.max_lag = 0.0
+
+    def snapshot(self):
+        lags = sorted(self.samples)
+        to_ms = lambda value: None if value is None else round(value * 1000, 3)
+        return {
+            "interval_ms": to_ms(self.interval),
+            "samples": len(lags),
+            "p50_ms": to_ms(_percentile(lags, 0.50)),
+            "p99_ms": to_ms(_percentile(lags, 0.99)),
+            "max_ms": to_ms(self.max_lag)
+        }
+
+file_io = FileIOService()
+loop_lag_monitor = LoopLagMonitor()
@@ -0,0 +1,195 @@
+# agentic_platform/agentic_platform/utils/ignore.py
+
+import os
+import re
+import threading
+
+def translate_pattern(pattern):
+    """
+    Translates a gitignore-style glob into a regular expression over
+    "/"-separated relative paths.
+
+    ``*`` and ``?`` never match "/", ``**`` matches across directories, and a
+    pattern without a "/" (other than a trailing one) matches at any depth.
+
+    Args:
+        pattern (str): The glob, e.g. "*.pyc", "build/" or "src/**/test_*.py".
+
+    Returns:
+        re.Pattern: Compiled expression matching whole relative paths.
+    """
+    anchored = "/" in pattern.rstrip("/")
+    pattern = pattern.strip("/")
+    parts = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i):
+                if pattern.startswith("**/", i):
+                    parts.append("(?:.*/)?")
+                    i += 3
+                else:
+                    parts.append(".*")
+                    i += 2
+                continue
+            parts.append("[^/]*")
+        elif c == "?":
+            parts.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                parts.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append(f"[{body}]")
+                i = end
+        elif c == "\\" and i + 1 < len(pattern):
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    prefix = "" if anchored else "(?:.*/)?"
+    return re.compile(f"^{prefix}{''.join(parts)}$", re.DOTALL)
+
+class IgnoreRules:
+    """
+    The rules of one ignore file, matched against paths relative to the
+    directory the file lives in. Later rules override earlier ones and a
+    leading "!" re-includes a path.
+    """
+
+    def __init__(self, patterns=()):
+        self.rules = []
+        for line in patterns:
+            line = line.rstrip("\n")
+            if line.endswith(" ") and not line.endswith("\\ "):
+                line = line.rstrip(" ")
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            elif line.startswith("\\"):
+                line = line[1:]
+            if not line.strip("/"):
+                continue
+            self.rules.append((translate_pattern(line), negate, line.endswith("/")))
+
+    @classmethod
+    def from_file(cls, path):
+        try:
+            with open(path, "r", errors="replace") as f:
+                return cls(f.readlines())
+        except (FileNotFoundError, IsADirectoryError, PermissionError):
+            return None
+
+    def match(self, relative_path, is_dir=False):
+        """Returns True if ignored, False if re-included, or None if no rule applies."""
+        result = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative_path):
+                result = not negate
+        return result
+
+class DockerignoreRules:
+    """
+    The rules of a ``.dockerignore`` file. Unlike gitignore, every pattern is
+    relative to the build context root, and excluding a directory excludes
+    everything below it unless a later "!" rule re-includes the path.
+    """
+
+    def __init__(self, patterns=()):
+        self.rules = []
+        for line in patterns:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:].strip()
+            line = os.path.normpath(line.lstrip("/")).replace(os.sep, "/")
+            if line == ".":
+                continue
+            self.rules.append((translate_pattern("/" + line), negate))
+        self.has_exceptions = any(negate for _, negate in self.rules)
+
+    @classmethod
+    def from_file(cls, path):
+        try:
+            with open(path, "r", errors="replace") as f:
+                return cls(f.readlines())
+        except (FileNotFoundError, IsADirectoryError, PermissionError):
+            return None
+
+    def match(self, relative_path):
+        """Returns True if ``relative_path`` is excluded from the build context."""
+        relative_path = relative_path.replace(os.sep, "/")
+        parts = relative_path.split("/")
+        prefixes = ["/".join(parts[:depth]) for depth in range(1, len(parts) + 1)]
+        excluded = False
+        for regex, negate in self.rules:
+            if any(regex.match(prefix) for prefix in prefixes):
+                excluded = not negate
+        return excluded
+
+    def skips_directory(self, relative_path):
+        """True when nothing below an excluded directory can be re-included, so walkers may prune it."""
+        return not self.has_exceptions and self.match(relative_path)
+
+class GitignoreMatcher:
+    """
+    Applies the ``.gitignore`` files of a tree the way git does: rules in a
+    subdirectory's file take precedence over its parents' for paths below it.
+    ``.git`` is always ignored; ``extra_patterns`` act as rules of lower
+    precedence than any ``.gitignore`` file.
+    """
+
+    def __init__(self, root, extra_patterns=(), filename=".gitignore"):
+        self.root = root
+        self.filename = filename
+        self._extra = IgnoreRules(extra_patterns)
+        self._rules = {}
+        self._lock = threading.Lock()
+
+    def _rules_for(self, relative_dir):
+        with self._lock:
+            if relative_dir not in self._rules:
+                self._rules[relative_dir] = IgnoreRules.from_file(
+                    os.path.join(self.root, relative_dir, self.filename)
+                )
+            return self._rules[relative_dir]
+
+    def match(self, relative_path, is_dir=False):
+        """
+        Decides ``relative_path`` alone, assuming its parent directories are not
+        ignored; tree walkers that skip ignored directories only need this.
+        """
+        relative_path = relative_path.replace(os.sep, "/")
+        if os.path.basename(relative_path) == ".git":
+            return True
+        directory = os.path.dirname(relative_path)
+        while True:
+            rules = self._rules_for(directory)
+            if rules is not None:
+                start = len(directory) + 1 if directory else 0
+                result = rules.match(relative_path[start:], is_dir)
+                if result is not None:
+                    return result
+            if not directory:
+                break
+            directory = os.path.dirname(directory)
+        return bool(self._extra.match(relative_path, is_dir))
+
+    def is_ignored(self, relative_path, is_dir=False):
+        """Like ``match`` but also ignores paths inside an ignored directory."""
+        parts = relative_path.replace(os.sep, "/").split("/")
+        for depth in range(1, len(parts)):
+            if self.match("/".join(parts[:depth]), is_dir=True):
+                return True
+        return self.match(relative_path, is_dir)
@@ -0,0 +1,14 @@
+# agentic_platform/agentic_platform/utils/paths.py
+
+import os
+
+# Caches and indexes are runtime state; they live outside the source tree so
+# local runs never leave files behind for git to pick up.
+DATA_DIR = os.environ.get(
+    "AGENTIC_DATA_DIR",
+    os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "agentic_platform"),
+)
+
+def data_path(*parts):
+    """Returns a path inside the configured data directory."""
+    return os.path.join(DATA_DIR, *parts)
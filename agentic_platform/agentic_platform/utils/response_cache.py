@@ -0,0 +1,102 @@
+# agentic_platform/agentic_platform/utils/response_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from .paths import data_path
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_DIR = os.environ.get("CODE_BOT_CACHE_DIR", data_path("code_bot"))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("CODE_BOT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+class ResponseCache:
+    """
+    Stores JSON responses on disk keyed by a digest of everything that
+    determines them. Entries are evicted least recently used first once the
+    directory grows past ``max_bytes``; a hit refreshes the entry's mtime.
+    """
+
+    def __init__(self, directory=RESPONSE_CACHE_DIR, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts):
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                value = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(value, default=str).encode()
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            # An overwrite replaces the old entry's bytes rather than adding to them
+            try:
+                replaced = os.stat(path).st_size
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(temp_path, path)
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._total_bytes += len(data) - replaced
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".json"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._total_bytes = total
+
+response_cache = ResponseCache()
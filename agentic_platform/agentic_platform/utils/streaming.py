@@ -0,0 +1,82 @@
+# agentic_platform/agentic_platform/utils/streaming.py
+
+import csv
+import io
+import json
+import logging
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+def stream_query_rows(build_query, fmt, batch_size=500):
+    """
+    Streams the rows of a query as NDJSON or CSV text chunks.
+
+    The query is built against a session owned by the generator and iterated
+    with ``yield_per`` so only ``batch_size`` rows are held in memory at a time,
+    independent of how many rows match.
+
+    Args:
+        build_query (callable): Receives a Session and returns a column query.
+        fmt (str): Either "ndjson" or "csv".
+        batch_size (int): Rows fetched per cursor round trip and emitted per chunk.
+
+    Yields:
+        str: Encoded rows, ``batch_size`` rows per chunk.
+    """
+    from ..database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        query = build_query(db)
+        columns = [description["name"] for description in query.column_descriptions]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == "csv":
+            writer.writerow(columns)
+
+        pending = 0
+        for row in query.yield_per(batch_size):
+            if fmt == "csv":
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, row)), default=_json_default))
+                buffer.write("\n")
+            pending += 1
+            if pending >= batch_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+
+        if buffer.tell():
+            yield buffer.getvalue()
+    except Exception as e:
+        logger.error(f"Error streaming export: {e}")
+        raise
+    finally:
+        db.close()
+
+def streaming_export(build_query, fmt, filename, batch_size=500):
+    """
+    Wraps ``stream_query_rows`` in a StreamingResponse with a download filename.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{fmt}'. Use json, ndjson or csv.")
+    return StreamingResponse(
+        stream_query_rows(build_query, fmt, batch_size),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
@@ -0,0 +1,97 @@
+# agentic_platform/agentic_platform/utils/templates.py
+
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# The same placeholders the former per-key str.replace matched: "{{ " + the exact key + " }}", where the key
+# is any text without "{{ " or " }}"; "{{key}}" or "{{  key }}" stay literal text, as they always did
+PLACEHOLDER_PATTERN = re.compile(r"\{\{ ((?:(?!\{\{ | \}\}).)+?) \}\}", re.S)
+
+class CompiledTemplate:
+    """
+    A template split once into literal and placeholder segments.
+
+    Rendering is a single pass that joins the literals with the context values,
+    instead of one ``str.replace`` scan of the whole template per context key.
+    Placeholders without a context value are left as written, and inserted
+    values are not scanned for further placeholders.
+    """
+
+    def __init__(self, name, source, mtime=None):
+        self.name = name
+        self.source = source
+        self.mtime = mtime
+        self._literals = []
+        self._placeholders = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(source):
+            self._literals.append(source[position:match.start()])
+            self._placeholders.append((match.group(1), match.group(0)))
+            position = match.end()
+        self._literals.append(source[position:])
+
+    @property
+    def placeholders(self):
+        return sorted({name for name, _ in self._placeholders})
+
+    def render(self, context):
+        literals = self._literals
+        parts = [literals[0]]
+        for index, (name, raw) in enumerate(self._placeholders, 1):
+            parts.append(str(context[name]) if name in context else raw)
+            parts.append(literals[index])
+        return "".join(parts)
+
+class TemplateRegistry:
+    """
+    Loads and compiles templates from ``directory`` on first use and keeps them
+    in memory. A template is recompiled when its file's mtime changes; the file
+    is stat'ed at most once per ``check_interval`` seconds.
+    """
+
+    def __init__(self, directory="templates", check_interval=1.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._templates = {}
+        self._checked_at = {}
+        self._lock = threading.Lock()
+
+    def get(self, template_name):
+        """
+        Returns the compiled template for ``template_name`` (a file name such as "architect.md").
+
+        Raises:
+            FileNotFoundError: If the template file does not exist.
+        """
+        now = time.monotonic()
+        template = self._templates.get(template_name)
+        if template is not None and now - self._checked_at.get(template_name, 0.0) < self.check_interval:
+            return template
+
+        template_path = os.path.join(self.directory, template_name)
+        try:
+            mtime = os.stat(template_path).st_mtime_ns
+        except FileNotFoundError:
+            with self._lock:
+                self._templates.pop(template_name, None)
+            raise FileNotFoundError(f"Template file not found: {template_path}")
+
+        with self._lock:
+            template = self._templates.get(template_name)
+            if template is None or template.mtime != mtime:
+                with open(template_path, "r") as file:
+                    template = CompiledTemplate(template_name, file.read(), mtime)
+                self._templates[template_name] = template
+                logger.debug(f"Compiled template {template_path}")
+            self._checked_at[template_name] = now
+        return template
+
+    def render(self, template_name, context):
+        return self.get(template_name).render(context)
+
+template_registry = TemplateRegistry()
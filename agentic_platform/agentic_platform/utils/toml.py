@@ -0,0 +1,256 @@
+# agentic_platform/agentic_platform/utils/toml.py
+
+import json
+import re
+
+try:
+    import tomllib as _tomllib
+except ImportError:
+    try:
+        import tomli as _tomllib
+    except ImportError:
+        _tomllib = None
+
+BARE_KEY_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+NUMBER_PATTERN = re.compile(r"[+-]?(?:\d[\d_]*)(?:\.\d[\d_]*)?(?:[eE][+-]?\d+)?")
+
+class TomlError(ValueError):
+    pass
+
+class _Parser:
+    """
+    Parser for the TOML subset config files like fly.toml use: tables, arrays
+    of tables, dotted and quoted keys, strings, numbers, booleans, arrays and
+    inline tables. Dates and multi-line strings are not supported; on Python
+    3.11+ (or with tomli installed) ``loads`` uses the full parser instead.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+        self.line = 1
+
+    def error(self, message):
+        raise TomlError(f"Line {self.line}: {message}")
+
+    def peek(self):
+        return self.text[self.pos] if self.pos < len(self.text) else ""
+
+    def skip_space(self, newlines=False):
+        while self.pos < len(self.text):
+            c = self.text[self.pos]
+            if c in " \t\r" or (newlines and c == "\n"):
+                if c == "\n":
+                    self.line += 1
+                self.pos += 1
+            elif c == "#":
+                while self.pos < len(self.text) and self.text[self.pos] != "\n":
+                    self.pos += 1
+            else:
+                break
+
+    def end_of_line(self):
+        self.skip_space()
+        if self.peek() not in ("\n", ""):
+            self.error(f"unexpected {self.peek()!r}")
+
+    def string(self):
+        quote = self.peek()
+        if self.text.startswith(quote * 3, self.pos):
+            self.error("multi-line strings are not supported")
+        self.pos += 1
+        if quote == "'":
+            end = self.text.find("'", self.pos)
+            if end == -1 or "\n" in self.text[self.pos:end]:
+                self.error("unterminated string")
+            value, self.pos = self.text[self.pos:end], end + 1
+            return value
+        start = self.pos - 1
+        while True:
+            c = self.peek()
+            if c in ("", "\n"):
+                self.error("unterminated string")
+            self.pos += 1
+            if c == "\\":
+                self.pos += 1
+            elif c == '"':
+                break
+        try:
+            return json.loads(self.text[start:self.pos])
+        except ValueError:
+            self.error("invalid escape in string")
+
+    def key(self):
+        parts = []
+        while True:
+            self.skip_space()
+            c = self.peek()
+            if c in ('"', "'"):
+                parts.append(self.string())
+            else:
+                match = BARE_KEY_PATTERN.match(self.text, self.pos)
+                if not match:
+                    self.error("expected a key")
+                parts.append(match.group())
+                self.pos = match.end()
+            self.skip_space()
+            if self.peek() != ".":
+                return parts
+            self.pos += 1
+
+    def value(self):
+        self.skip_space()
+        c = self.peek()
+        if c in ('"', "'"):
+            return self.string()
+        if c == "[":
+            self.pos += 1
+            items = []
+            while True:
+                self.skip_space(newlines=True)
+                if self.peek() == "]":
+                    self.pos += 1
+                    return items
+                items.append(self.value())
+                self.skip_space(newlines=True)
+                if self.peek() == ",":
+                    self.pos += 1
+                elif self.peek() != "]":
+                    self.error("expected ',' or ']' in array")
+        if c == "{":
+            self.pos += 1
+            table = {}
+            self.skip_space()
+            if self.peek() == "}":
+                self.pos += 1
+                return table
+            while True:
+                keys = self.key()
+                if self.peek() != "=":
+                    self.error("expected '='")
+                self.pos += 1
+                self.assign(table, keys, self.value())
+                self.skip_space()
+                if self.peek() == ",":
+                    self.pos += 1
+                elif self.peek() == "}":
+                    self.pos += 1
+                    return table
+                else:
+                    self.error("expected ',' or '}' in inline table")
+        for literal, result in (("true", True), ("false", False)):
+            if self.text.startswith(literal, self.pos):
+                self.pos += len(literal)
+                return result
+        match = NUMBER_PATTERN.match(self.text, self.pos)
+        if match:
+            self.pos = match.end()
+            number = match.group().replace("_", "")
+            return float(number) if any(c in number for c in ".eE") else int(number)
+        self.error(f"unsupported value at {self.text[self.pos:self.pos + 20]!r}")
+
+    def assign(self, table, keys, value):
+        for key in keys[:-1]:
+            table = table.setdefault(key, {})
+            if not isinstance(table, dict):
+                self.error(f"{key} is not a table")
+        if keys[-1] in table:
+            self.error(f"duplicate key {'.'.join(keys)}")
+        table[keys[-1]] = value
+
+    def table_for(self, root, keys, array):
+        table = root
+        for index, key in enumerate(keys):
+            last = index == len(keys) - 1
+            if last and array:
+                entries = table.setdefault(key, [])
+                if not isinstance(entries, list):
+                    self.error(f"{key} is not an array of tables")
+                entries.append({})
+                return entries[-1]
+            table = table.setdefault(key, {})
+            if isinstance(table, list):
+                table = table[-1]
+            if not isinstance(table, dict):
+                self.error(f"{key} is not a table")
+        return table
+
+    def parse(self):
+        root = {}
+        current = root
+        while True:
+            self.skip_space(newlines=True)
+            if self.pos >= len(self.text):
+                return root
+            if self.peek() == "[":
+                array = self.text.startswith("[[", self.pos)
+                self.pos += 2 if array else 1
+                keys = self.key()
+                closing = "]]" if array else "]"
+                if not self.text.startswith(closing, self.pos):
+                    self.error(f"expected {closing!r}")
+                self.pos += len(closing)
+                current = self.table_for(root, keys, array)
+            else:
+                keys = self.key()
+                if self.peek() != "=":
+                    self.error("expected '='")
+                self.pos += 1
+                self.assign(current, keys, self.value())
+            self.end_of_line()
+
+def loads(text):
+    """
+    Parses a TOML document.
+
+    Raises:
+        TomlError: If the document is invalid.
+    """
+    if _tomllib is not None:
+        try:
+            return _tomllib.loads(text)
+        except _tomllib.TOMLDecodeError as e:
+            raise TomlError(str(e))
+    return _Parser(text).parse()
+
+def _key(key):
+    return key if BARE_KEY_PATTERN.fullmatch(key) else json.dumps(key)
+
+def _scalar(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, str):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, list):
+        return "[" + ", ".join(_scalar(item) for item in value) + "]"
+    if isinstance(value, dict):
+        return "{ " + ", ".join(f"{_key(key)} = {_scalar(item)}" for key, item in value.items()) + " }"
+    raise TomlError(f"Cannot serialize {type(value).__name__}")
+
+def _is_table_array(value):
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+def _dump_table(table, path, lines, indent):
+    pad = "  " * indent
+    for key, value in table.items():
+        if not isinstance(value, dict) and not _is_table_array(value):
+            lines.append(f"{pad}{_key(key)} = {_scalar(value)}")
+    for key, value in table.items():
+        child = path + [_key(key)]
+        if isinstance(value, dict):
+            lines.append("")
+            lines.append(f"{pad}[{'.'.join(child)}]")
+            _dump_table(value, child, lines, indent + 1)
+        elif _is_table_array(value):
+            for item in value:
+                lines.append("")
+                lines.append(f"{pad}[[{'.'.join(child)}]]")
+                _dump_table(item, child, lines, indent + 1)
+
+def dumps(data):
+    """Serializes nested dicts and lists as TOML, with sub-tables indented under their parent."""
+    lines = []
+    _dump_table(data, [], lines, 0)
+    return "\n".join(lines).lstrip("\n") + "\n"
@@ -0,0 +1,136 @@
+# agentic_platform/agentic_platform/utils/trash.py
+
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+TRASH_DIR_NAME = ".trash"
+
+# Caps purge throughput so large deletions do not starve builds sharing the
+# disk; 0 disables throttling.
+PURGE_BYTES_PER_SECOND = int(os.environ.get("TRASH_PURGE_BYTES_PER_SEC", "0"))
+
+# Every unlinked entry is charged at least this much so directories of tiny
+# files are throttled on metadata IO as well
+_ENTRY_COST_BYTES = 4096
+
+class TrashBin:
+    """
+    Removes directories in two steps: ``discard`` renames the directory into a
+    ``.trash`` folder next to it, which is a constant-time metadata operation
+    on the same filesystem, and a background thread purges trashed entries
+    with ``shutil.rmtree``. Entries left behind by a previous process are
+    picked up again the next time their trash folder is used.
+
+    With ``max_bytes_per_second`` set, purging walks the tree itself and
+    sleeps between unlinks to stay under that rate.
+    """
+
+    def __init__(self, max_bytes_per_second=0):
+        self.max_bytes_per_second = max_bytes_per_second
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._known_trash_dirs = set()
+        self.purged = 0
+        self.failed = 0
+
+    def discard(self, path):
+        """
+        Moves ``path`` out of the way and schedules it for deletion.
+
+        Returns:
+            bool: True if the path existed and was moved to the trash.
+        """
+        if not os.path.lexists(path):
+            return False
+        parent = os.path.dirname(os.path.abspath(path))
+        trash_dir = os.path.join(parent, TRASH_DIR_NAME)
+        os.makedirs(trash_dir, exist_ok=True)
+        self._track(trash_dir)
+        target = os.path.join(trash_dir, f"{os.path.basename(path)}-{uuid.uuid4().hex}")
+        try:
+            os.rename(path, target)
+        except FileNotFoundError:
+            return False
+        self._queue.put(target)
+        self._ensure_worker()
+        return True
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def _track(self, trash_dir):
+        with self._lock:
+            if trash_dir in self._known_trash_dirs:
+                return
+            self._known_trash_dirs.add(trash_dir)
+        # Resume purges interrupted by a restart
+        for entry in os.scandir(trash_dir):
+            self._queue.put(entry.path)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._purge_loop, name="trash-purge", daemon=True)
+                self._thread.start()
+
+    def _purge_loop(self):
+        while True:
+            path = self._queue.get()
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    if self.max_bytes_per_second:
+                        self._remove_throttled(path)
+                    else:
+                        shutil.rmtree(path)
+                elif os.path.lexists(path):
+                    os.remove(path)
+                self.purged += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error purging trashed path {path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _remove_throttled(self, path):
+        started = time.monotonic()
+        removed_bytes = 0
+
+        def throttle(size):
+            nonlocal removed_bytes
+            removed_bytes += size + _ENTRY_COST_BYTES
+            ahead = removed_bytes / self.max_bytes_per_second - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+        for root, dirs, files in os.walk(path, topdown=False):
+            for name in files:
+                file_path = os.path.join(root, name)
+                try:
+                    size = os.lstat(file_path).st_size
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    continue
+                throttle(size)
+            for name in dirs:
+                dir_path = os.path.join(root, name)
+                if os.path.islink(dir_path):
+                    os.remove(dir_path)
+                else:
+                    os.rmdir(dir_path)
+                throttle(0)
+        os.rmdir(path)
+
+    def join(self):
+        """Blocks until every queued entry has been purged."""
+        self._queue.join()
+
+trash_bin = TrashBin(PURGE_BYTES_PER_SECOND)
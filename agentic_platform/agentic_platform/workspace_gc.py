@@ -0,0 +1,260 @@
+# agentic_platform/agentic_platform/workspace_gc.py
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from .crud import PROJECTS_DIR, checked_in_project_folders
+from .utils.trash import trash_bin
+
+logger = logging.getLogger(__name__)
+
+GC_INTERVAL_SECONDS = int(os.environ.get("GC_INTERVAL_SECONDS", "300"))
+# Quotas are in bytes; 0 disables the quota
+GC_GLOBAL_QUOTA_BYTES = int(os.environ.get("GC_GLOBAL_QUOTA_BYTES", "0"))
+GC_USER_QUOTA_BYTES = int(os.environ.get("GC_USER_QUOTA_BYTES", "0"))
+# Workspaces touched more recently than this are never evicted
+GC_MIN_IDLE_SECONDS = int(os.environ.get("GC_MIN_IDLE_SECONDS", "600"))
+GC_TMP_ROOT = os.environ.get("GC_TMP_ROOT", "/tmp")
+
+# Deploy clones are created as /tmp/{repo_name}-{uuid hex}
+TMP_CLONE_PATTERN = re.compile(r".+-[0-9a-f]{32}$")
+
+class WorkspaceGC:
+    """
+    Periodically measures workspaces under the projects directories and the
+    temporary deploy clones, and evicts the least recently used ones to the
+    trash bin once the global or a per-user byte quota is exceeded.
+
+    Last access is the later of the newest modification time in the tree and
+    the last ``touch`` from a request handler. Paths that are ``pin``ned, such
+    as clones with a deployment in progress, and paths returned by a
+    ``protect``ed source, such as the registered clones, are never evicted.
+    Paths are compared by their real path.
+    """
+
+    def __init__(self, interval=GC_INTERVAL_SECONDS, global_quota=GC_GLOBAL_QUOTA_BYTES,
+                 user_quota=GC_USER_QUOTA_BYTES, min_idle=GC_MIN_IDLE_SECONDS):
+        self.interval = interval
+        self.global_quota = global_quota
+        self.user_quota = user_quota
+        self.min_idle = min_idle
+        self._accessed = {}
+        self._pinned = set()
+        self._protected = []
+        self._lock = threading.Lock()
+        self._task = None
+        self.metrics = {
+            "runs": 0,
+            "last_run_at": None,
+            "last_run_seconds": None,
+            "workspaces": 0,
+            "total_bytes": 0,
+            "user_bytes": {},
+            "evicted": 0,
+            "evicted_bytes": 0,
+            "last_evicted": [],
+            "errors": 0
+        }
+
+    def touch(self, path):
+        with self._lock:
+            self._accessed[os.path.realpath(path)] = time.time()
+
+    def pin(self, path):
+        with self._lock:
+            self._pinned.add(os.path.realpath(path))
+
+    def unpin(self, path):
+        with self._lock:
+            self._pinned.discard(os.path.realpath(path))
+
+    def protect(self, paths):
+        """Registers a callable returning paths that must never be evicted; it is called on every run."""
+        self._protected.append(paths)
+
+    def _project_roots(self):
+        from .api.deploy.utils import BASE_DIR
+        return {os.path.realpath(PROJECTS_DIR), os.path.realpath(os.path.join(BASE_DIR, "projects"))}
+
+    def _discover(self):
+        """Yields (path, folder name) for every workspace; the name is None for deploy clones."""
+        for root in self._project_roots():
+            if not os.path.isdir(root):
+                continue
+            checked_in = checked_in_project_folders(root)
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".") or entry.name in checked_in or not entry.is_dir(follow_symlinks=False):
+                        continue
+                    yield entry.path, entry.name
+        tmp_root = os.path.realpath(GC_TMP_ROOT)
+        if os.path.isdir(tmp_root):
+            with os.scandir(tmp_root) as entries:
+                for entry in entries:
+                    # Only git checkouts, so unrelated temp directories are never touched
+                    if (TMP_CLONE_PATTERN.match(entry.name) and entry.is_dir(follow_symlinks=False)
+                            and os.path.isdir(os.path.join(entry.path, ".git"))):
+                        yield entry.path, None
+
+    def _resolve_owners(self, workspaces):
+        """Maps workspace folder names to user ids: name_user folders by suffix, clone folders by project id."""
+        from .database import SessionLocal
+        from .models import Project
+
+        folder_names = [name for _, name in workspaces if name]
+        owners = {}
+        if folder_names:
+            db = SessionLocal()
+            try:
+                for start in range(0, len(folder_names), 500):
+                    batch = folder_names[start:start + 500]
+                    for project_id, user_id in db.query(Project.id, Project.user_id).filter(Project.id.in_(batch)):
+                        owners[project_id] = user_id
+            finally:
+                db.close()
+        for _, name in workspaces:
+            if name and name not in owners and "_" in name:
+                owners[name] = name.rsplit("_", 1)[1]
+        return owners
+
+    @staticmethod
+    def _measure(path):
+        total = 0
+        newest = 0.0
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        try:
+                            stat = entry.stat(follow_symlinks=False)
+                        except FileNotFoundError:
+                            continue
+                        newest = max(newest, stat.st_mtime)
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            total += stat.st_size
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+        return total, newest
+
+    def run_once(self):
+        """Measures all workspaces and evicts LRU ones over quota. Blocking; run it in a thread."""
+        started = time.monotonic()
+        now = time.time()
+        workspaces = list(self._discover())
+        owners = self._resolve_owners(workspaces)
+
+        with self._lock:
+            accessed = dict(self._accessed)
+            pinned = set(self._pinned)
+        for paths in self._protected:
+            pinned.update(os.path.realpath(path) for path in paths())
+
+        usage = []
+        for path, name in workspaces:
+            size, newest = self._measure(path)
+            last_access = max(newest, accessed.get(path, 0.0))
+            usage.append({
+                "path": path,
+                "user_id": owners.get(name) if name else None,
+                "bytes": size,
+                "last_access": last_access
+            })
+
+        total_bytes = sum(item["bytes"] for item in usage)
+        user_bytes = {}
+        for item in usage:
+            if item["user_id"]:
+                user_bytes[item["user_id"]] = user_bytes.get(item["user_id"], 0) + item["bytes"]
+
+        evicted = []
+
+        def evict(item):
+            nonlocal total_bytes
+            try:
+                if not trash_bin.discard(item["path"]):
+                    return
+            except OSError as e:
+                self.metrics["errors"] += 1
+                logger.error(f"Error evicting workspace {item['path']}: {e}")
+                return
+            total_bytes -= item["bytes"]
+            if item["user_id"]:
+                user_bytes[item["user_id"]] -= item["bytes"]
+            with self._lock:
+                self._accessed.pop(item["path"], None)
+            evicted.append(item)
+            logger.info(f"Evicted workspace {item['path']} ({item['bytes']} bytes)")
+
+        candidates = sorted(
+            (item for item in usage if item["path"] not in pinned and now - item["last_access"] >= self.min_idle),
+            key=lambda item: item["last_access"]
+        )
+
+        if self.user_quota:
+            for item in candidates:
+                owner = item["user_id"]
+                if owner and user_bytes.get(owner, 0) > self.user_quota:
+                    evict(item)
+        if self.global_quota:
+            for item in candidates:
+                if total_bytes <= self.global_quota:
+                    break
+                if item not in evicted:
+                    evict(item)
+
+        self.metrics.update({
+            "runs": self.metrics["runs"] + 1,
+            "last_run_at": datetime.utcnow().isoformat(),
+            "last_run_seconds": round(time.monotonic() - started, 3),
+            "workspaces": len(usage) - len(evicted),
+            "total_bytes": total_bytes,
+            "user_bytes": user_bytes,
+            "evicted": self.metrics["evicted"] + len(evicted),
+            "evicted_bytes": self.metrics["evicted_bytes"] + sum(item["bytes"] for item in evicted),
+            "last_evicted": [{"path": item["path"], "bytes": item["bytes"]} for item in evicted]
+        })
+        return evicted
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                self.metrics["errors"] += 1
+                logger.error(f"Workspace GC run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self):
+        return {
+            **self.metrics,
+            "global_quota_bytes": self.global_quota,
+            "user_quota_bytes": self.user_quota,
+            "min_idle_seconds": self.min_idle,
+            "interval_seconds": self.interval,
+            "pinned": len(self._pinned),
+            "trash_pending": trash_bin.pending,
+            "trash_purged": trash_bin.purged,
+            "trash_failed": trash_bin.failed
+        }
+
+workspace_gc = WorkspaceGC()
@@ -0,0 +1,345 @@
+# agentic_platform/benchmarks/bench_deploy_load.py
+"""
+End-to-end load on the deploy API with fake flyctl/fly/git binaries.
+
+Starts the platform app (or, with --target preview, agentic_preview's app)
+under uvicorn in this process. The CLIs it shells out to are the scriptable
+fakes from fake_cli.py. Concurrent clients then run the preview flow
+repeatedly:
+
+    POST /deploy -> GET /status until deployed -> GET /logs (SSE) -> POST /stop-app
+
+The run reports flows per second, p50/p99 latency and errors per endpoint.
+It also samples the server's open file descriptors, asyncio task count and
+RSS. --save writes the results as a JSON baseline. --compare checks a run
+against a baseline and exits non-zero when throughput or p99 latency
+regressed by more than --tolerance.
+
+Run from the agentic_platform directory:
+
+    python benchmarks/bench_deploy_load.py --clients 20 --flows 200 --save baseline.json
+    python benchmarks/bench_deploy_load.py --clients 20 --flows 200 --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_cli import DEFAULT_CONFIG, install_fake_cli
+
+PREVIEW_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "agentic_preview"
+)
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def open_fds():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        # ru_maxrss is the peak, in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def load_app(target):
+    """Imports the app after the environment is set, since both read their settings at import time."""
+    # No background probes or pre-created apps against the fake CLI
+    os.environ.setdefault("AUTOSCALE_INTERVAL", "0")
+    os.environ.setdefault("PREVIEW_POOL_SIZE", "0")
+    # Fake apps are destroyed at exit rather than handed off, and no state outlives the run
+    os.environ.setdefault("SHUTDOWN_TEARDOWN", "true")
+    os.environ.setdefault("COORDINATION_STORE", "memory://")
+    if target == "preview":
+        sys.path.insert(0, PREVIEW_DIR)
+        import main
+        return main.app, ""
+    from agentic_platform.main import app
+    return app, "/api/v1/deploy"
+
+class ServerThread:
+    """Runs uvicorn on its own loop and thread, so resource samples cover the server, not the clients."""
+
+    def __init__(self, app, port):
+        import uvicorn
+        self.loop = None
+        app.router.on_startup.append(self._capture_loop)
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    async def _capture_loop(self):
+        self.loop = asyncio.get_running_loop()
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+    def task_count(self):
+        async def count():
+            return len(asyncio.all_tasks())
+        try:
+            return asyncio.run_coroutine_threadsafe(count(), self.loop).result(timeout=5)
+        except Exception:
+            return None
+
+async def http_request(port, method, path, body=None, stream_lines=False):
+    """
+    Minimal HTTP/1.1 client, one connection per request. Returns (status, body);
+    with ``stream_lines`` the body is the number of SSE ``data:`` lines read.
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = json.dumps(body).encode() if body is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n".encode() + payload
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = (await reader.readline()).strip()
+        if not line:
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.lower()] = value.strip()
+    try:
+        if stream_lines:
+            count = 0
+            async for line in reader:
+                if line.startswith(b"data:"):
+                    count += 1
+            return status, count
+        data = await reader.read()
+        if headers.get("transfer-encoding") == "chunked":
+            data = dechunk(data)
+        return status, json.loads(data) if data else None
+    finally:
+        writer.close()
+
+def dechunk(data):
+    body = b""
+    while data:
+        size_line, _, data = data.partition(b"\r\n")
+        size = int(size_line, 16)
+        if size == 0:
+            break
+        body, data = body + data[:size], data[size + 2:]
+    return body
+
+class Results:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.flows = 0
+        self.failed_flows = 0
+        self.log_lines = 0
+
+    def record(self, endpoint, seconds, ok):
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+async def timed(results, endpoint, port, method, path, body=None, stream_lines=False):
+    started = time.perf_counter()
+    try:
+        status, data = await http_request(port, method, path, body, stream_lines)
+    except (OSError, ValueError, IndexError) as e:
+        results.record(endpoint, time.perf_counter() - started, False)
+        return None, str(e)
+    results.record(endpoint, time.perf_counter() - started, status < 400)
+    return status, data
+
+async def flow(results, port, prefix, index, args):
+    status, data = await timed(results, "deploy", port, "POST", f"{prefix}/deploy",
+                               {"repo": f"bench/repo{index}", "branch": "main"})
+    if status != 200:
+        results.failed_flows += 1
+        return
+    app_name = data["app_name"]
+    deployed = False
+    for _ in range(args.status_polls):
+        await asyncio.sleep(args.poll_interval)
+        status, data = await timed(results, "status", port, "GET", f"{prefix}/status/{app_name}")
+        state = (data or {}).get("deployment", data) if isinstance(data, dict) else None
+        if isinstance(state, dict) and state.get("status") in ("Deployed", "Failed"):
+            deployed = state["status"] == "Deployed"
+            break
+    status, lines = await timed(results, "logs", port, "GET", f"{prefix}/logs/{app_name}", stream_lines=True)
+    if status == 200:
+        results.log_lines += lines
+    if args.target == "platform":
+        await timed(results, "stop", port, "POST", f"{prefix}/stop-app/{app_name}")
+    if deployed:
+        results.flows += 1
+    else:
+        results.failed_flows += 1
+
+async def run_load(server, port, prefix, args):
+    results = Results()
+    samples = []
+    queue = asyncio.Queue()
+    for index in range(args.flows):
+        queue.put_nowait(index)
+
+    async def client():
+        while not queue.empty():
+            await flow(results, port, prefix, queue.get_nowait(), args)
+
+    async def sampler():
+        while True:
+            samples.append({"fds": open_fds(), "tasks": server.task_count(), "rss": rss_bytes()})
+            await asyncio.sleep(args.sample_interval)
+
+    sampling = asyncio.create_task(sampler())
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(args.clients)])
+    elapsed = time.perf_counter() - started
+    sampling.cancel()
+    samples.append({"fds": open_fds(), "tasks": server.task_count(), "rss": rss_bytes()})
+    return results, samples, elapsed
+
+def summarize(args, results, samples, elapsed, baseline_resources):
+    def peak(key):
+        values = [sample[key] for sample in samples if sample[key] is not None]
+        return max(values) if values else None
+
+    return {
+        "target": args.target,
+        "clients": args.clients,
+        "flows": args.flows,
+        "seconds": round(elapsed, 3),
+        "completed_flows": results.flows,
+        "failed_flows": results.failed_flows,
+        "throughput": round(results.flows / elapsed, 3) if elapsed else None,
+        "log_lines": results.log_lines,
+        "endpoints": {
+            endpoint: {
+                "requests": len(latencies),
+                "errors": results.errors.get(endpoint, 0),
+                "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            }
+            for endpoint, latencies in sorted(results.latencies.items())
+        },
+        "resources": {
+            "fds_before": baseline_resources["fds"],
+            "fds_peak": peak("fds"),
+            "fds_after": samples[-1]["fds"],
+            "tasks_before": baseline_resources["tasks"],
+            "tasks_peak": peak("tasks"),
+            "tasks_after": samples[-1]["tasks"],
+            "rss_before_mb": round(baseline_resources["rss"] / 2 ** 20, 1),
+            "rss_peak_mb": round(peak("rss") / 2 ** 20, 1),
+        },
+    }
+
+def compare(summary, baseline, tolerance):
+    """Lists regressions beyond ``tolerance`` (a fraction) against a saved baseline."""
+    regressions = []
+    if baseline.get("throughput") and summary["throughput"] is not None:
+        if summary["throughput"] < baseline["throughput"] * (1 - tolerance):
+            regressions.append(f"throughput {summary['throughput']}/s vs {baseline['throughput']}/s")
+    for endpoint, stats in summary["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if before and stats["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{endpoint} p99 {stats['p99_ms']}ms vs {before['p99_ms']}ms")
+    return regressions
+
+def print_summary(summary):
+    print(f"{summary['target']}: {summary['completed_flows']}/{summary['flows']} flows in {summary['seconds']}s "
+          f"with {summary['clients']} clients = {summary['throughput']} flows/s, {summary['log_lines']} log lines")
+    for endpoint, stats in summary["endpoints"].items():
+        print(f"  {endpoint:7s} {stats['requests']:6d} requests {stats['errors']:5d} errors "
+              f"p50 {stats['p50_ms']:9.2f}ms p99 {stats['p99_ms']:9.2f}ms")
+    resources = summary["resources"]
+    print(f"  fds {resources['fds_before']} -> peak {resources['fds_peak']} -> {resources['fds_after']}, "
+          f"tasks {resources['tasks_before']} -> peak {resources['tasks_peak']} -> {resources['tasks_after']}, "
+          f"rss {resources['rss_before_mb']}MB -> peak {resources['rss_peak_mb']}MB")
+
+def main(args):
+    config = DEFAULT_CONFIG
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    config = json.loads(json.dumps(config))
+    if args.deploy_latency is not None:
+        config["commands"].setdefault("flyctl deploy", {})["latency"] = args.deploy_latency
+    if args.failure_rate is not None:
+        config["default"]["failure_rate"] = args.failure_rate
+    if args.log_lines is not None:
+        config["commands"].setdefault("flyctl logs", {})["output_lines"] = args.log_lines
+
+    workdir = tempfile.mkdtemp(prefix="bench-deploy-")
+    os.environ.update(install_fake_cli(os.path.join(workdir, "bin"), config))
+    app, prefix = load_app(args.target)
+    import logging
+    # Errors from simulated failures are counted in the results instead
+    logging.disable(logging.CRITICAL)
+
+    port = free_port()
+    server = ServerThread(app, port)
+    server.start()
+    try:
+        before = {"fds": open_fds(), "tasks": server.task_count(), "rss": rss_bytes()}
+        results, samples, elapsed = asyncio.run(run_load(server, port, prefix, args))
+    finally:
+        server.stop()
+    summary = summarize(args, results, samples, elapsed, before)
+    print_summary(summary)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Saved baseline to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(summary, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--target", choices=("platform", "preview"), default="platform", help="App under test")
+    parser.add_argument("--clients", type=int, default=10, help="Concurrent clients")
+    parser.add_argument("--flows", type=int, default=50, help="Deploy flows in total")
+    parser.add_argument("--status-polls", type=int, default=50, help="Status polls per flow before giving up")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="Seconds between status polls")
+    parser.add_argument("--sample-interval", type=float, default=0.2, help="Seconds between resource samples")
+    parser.add_argument("--config", help="fake_cli JSON config (default: fake_cli.DEFAULT_CONFIG)")
+    parser.add_argument("--deploy-latency", type=float, help="Seconds each fake flyctl deploy takes")
+    parser.add_argument("--failure-rate", type=float, help="Fraction of fake CLI calls that fail")
+    parser.add_argument("--log-lines", type=int, help="Lines each fake flyctl logs prints")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression, as a fraction")
+    main(parser.parse_args())
@@ -0,0 +1,49 @@
+# agentic_platform/benchmarks/bench_dockerfile.py
+"""
+Dockerfile generation time for fixture projects.
+
+Runs generate_dockerfile over every project directory given (by default the
+fixture projects under tests/fixtures/dockerfile, which the tests check) and reports the detected
+stack, entrypoint and generation time. Projects the generator cannot handle
+are the ones /docker would still send to Aider.
+
+Run from the agentic_platform directory:
+
+    python benchmarks/bench_dockerfile.py --repeat 100
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agentic_platform.api.deploy.dockerfile import generate_dockerfile
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "fixtures", "dockerfile")
+
+def main(args):
+    roots = args.projects or [
+        os.path.join(FIXTURES_DIR, name) for name in sorted(os.listdir(FIXTURES_DIR))
+        if os.path.isdir(os.path.join(FIXTURES_DIR, name))
+    ]
+    for root in roots:
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            generated = generate_dockerfile(root)
+        elapsed = (time.perf_counter() - started) / args.repeat
+        if generated is None:
+            print(f"{os.path.basename(root):20s} {elapsed * 1000:7.2f}ms | not detected, falls back to Aider")
+        else:
+            print(
+                f"{os.path.basename(root):20s} {elapsed * 1000:7.2f}ms | {generated.stack:24s} {generated.entrypoint}"
+            )
+        if args.show and generated is not None:
+            print(generated.content)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("projects", nargs="*", help="Project directories (default: tests/fixtures/dockerfile/*)")
+    parser.add_argument("--repeat", type=int, default=20, help="Generations per project")
+    parser.add_argument("--show", action="store_true", help="Print the generated Dockerfiles")
+    main(parser.parse_args())
@@ -0,0 +1,107 @@
+# agentic_platform/benchmarks/bench_file_io.py
+"""
+Event loop latency while large directory trees are deleted.
+
+Builds several trees of small files and deletes them while a probe keeps
+calling ``explore_directory`` on a small directory, the way concurrent UI
+requests would. Each scenario reports the probe's request latency and the
+loop lag measured by LoopLagMonitor:
+
+- inline:  shutil.rmtree on the event loop, as remove_file used to do
+- file_io: remove_file, which deletes on the bounded file IO pool
+
+Run from the agentic_platform directory:
+
+    python benchmarks/bench_file_io.py --trees 4 --files 5000
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agentic_platform.api.deploy.services import explore_directory, remove_file
+from agentic_platform.utils.file_io import LoopLagMonitor, file_io
+
+def build_tree(path, files, fanout=50):
+    for index in range(files):
+        directory = os.path.join(path, f"d{index % fanout}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"f{index}.txt"), "w") as f:
+            f.write("x" * 256)
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+async def inline_remove(path):
+    shutil.rmtree(path)
+
+async def run_scenario(name, remove, workdir, trees, files):
+    paths = []
+    for index in range(trees):
+        path = os.path.join(workdir, f"{name}-{index}")
+        build_tree(path, files)
+        paths.append(path)
+    probe_dir = os.path.join(workdir, "probe")
+    os.makedirs(probe_dir, exist_ok=True)
+    for index in range(20):
+        open(os.path.join(probe_dir, f"p{index}.txt"), "w").close()
+
+    monitor = LoopLagMonitor(interval=0.005, window=100000)
+    monitor.start()
+    latencies = []
+    done = asyncio.Event()
+
+    async def probe():
+        # Requests arrive on a fixed schedule; latency counts from the arrival
+        # time, so time spent waiting for a blocked loop is included
+        interval = 0.002
+        arrival = time.perf_counter()
+        while not done.is_set():
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await explore_directory(probe_dir)
+            latencies.append(time.perf_counter() - arrival)
+            arrival += interval
+
+    async def deletes():
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        for path in paths:
+            await remove(path)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.05)
+        done.set()
+        return elapsed
+
+    probe_task = asyncio.create_task(probe())
+    delete_seconds = await deletes()
+    await probe_task
+    await monitor.stop()
+    lag = monitor.snapshot()
+    print(
+        f"{name:8s} delete {delete_seconds:7.3f}s | requests {len(latencies):5d} "
+        f"p50 {percentile(latencies, 0.5) * 1000:8.2f}ms p99 {percentile(latencies, 0.99) * 1000:8.2f}ms "
+        f"max {max(latencies) * 1000:8.2f}ms | loop lag p99 {lag['p99_ms']:8.2f}ms max {lag['max_ms']:8.2f}ms"
+    )
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="bench-file-io-")
+    try:
+        await run_scenario("inline", inline_remove, workdir, args.trees, args.files)
+        await run_scenario("file_io", remove_file, workdir, args.trees, args.files)
+    finally:
+        file_io.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--trees", type=int, default=4, help="Directory trees deleted per scenario")
+    parser.add_argument("--files", type=int, default=5000, help="Files per tree")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,59 @@
+# agentic_platform/benchmarks/bench_templates.py
+"""
+Microbenchmark for SPARC prompt rendering.
+
+Compares the previous per-request path (read the template from disk, one
+str.replace per context key, write a NamedTemporaryFile) against the
+precompiled TemplateRegistry render for every template in templates/.
+
+Run from the agentic_platform directory:
+
+    python benchmarks/bench_templates.py --iterations 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agentic_platform.utils.templates import TemplateRegistry, PLACEHOLDER_PATTERN
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+def legacy_render(template_name, context):
+    with open(os.path.join(TEMPLATES_DIR, template_name), "r") as file:
+        template_content = file.read()
+    for key, value in context.items():
+        template_content = template_content.replace(f"{{{{ {key} }}}}", str(value))
+    with tempfile.NamedTemporaryFile(mode="w+", delete=False) as temp_file:
+        temp_file.write(template_content)
+        temp_file_path = temp_file.name
+    os.unlink(temp_file_path)
+    return template_content
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    registry = TemplateRegistry(TEMPLATES_DIR)
+    print(f"{'template':<22}{'keys':>5}{'legacy us':>12}{'compiled us':>13}{'speedup':>9}")
+    for template_name in sorted(os.listdir(TEMPLATES_DIR)):
+        if not template_name.endswith(".md"):
+            continue
+        with open(os.path.join(TEMPLATES_DIR, template_name), "r") as file:
+            keys = sorted(set(PLACEHOLDER_PATTERN.findall(file.read())))
+        context = {key: f"value for {key} " * 20 for key in keys}
+
+        assert legacy_render(template_name, context) == registry.render(template_name, context)
+
+        legacy = timeit.timeit(lambda: legacy_render(template_name, context), number=args.iterations)
+        compiled = timeit.timeit(lambda: registry.render(template_name, context), number=args.iterations)
+        legacy_us = legacy / args.iterations * 1e6
+        compiled_us = compiled / args.iterations * 1e6
+        print(f"{template_name:<22}{len(keys):>5}{legacy_us:>12.1f}{compiled_us:>13.2f}{legacy_us / compiled_us:>8.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# agentic_platform/benchmarks/fake_cli.py
+"""
+Scriptable stand-ins for the ``flyctl``, ``fly`` and ``git`` binaries.
+
+``install_fake_cli`` writes the three executables into a directory and
+returns the environment that puts them first on PATH. Every call reads a
+JSON config, so a benchmark can vary latency, output volume and failure
+rate per command without rewriting the scripts:
+
+    {
+      "default": {"latency": 0.05, "jitter": 0.0, "failure_rate": 0.0, "output_lines": 5},
+      "commands": {
+        "flyctl deploy": {"latency": 2.0, "output_lines": 200},
+        "flyctl logs": {"output_lines": 50, "interval": 0.01},
+        "git clone": {"latency": 0.3, "repo_files": 50, "file_bytes": 2048}
+      }
+    }
+
+A command uses the entry whose key is the longest prefix of its program
+name and subcommands (``fly`` is treated as ``flyctl``), merged over
+``default``. Every call is appended to ``calls.log`` next to the config.
+"""
+import json
+import os
+import stat
+import sys
+
+DEFAULT_CONFIG = {
+    "default": {"latency": 0.05, "jitter": 0.0, "failure_rate": 0.0, "output_lines": 5, "interval": 0.0},
+    "commands": {
+        "flyctl deploy": {"latency": 1.0, "output_lines": 100},
+        "flyctl logs": {"latency": 0.0, "output_lines": 20, "interval": 0.005},
+        "git ls-remote": {"latency": 0.1},
+        "git clone": {"latency": 0.2, "repo_files": 20, "file_bytes": 1024},
+    },
+}
+
+FAKE_CLI_SCRIPT = r'''
+import json, os, random, sys, time
+
+config_path = os.environ["FAKE_CLI_CONFIG"]
+with open(config_path) as f:
+    config = json.load(f)
+program = "flyctl" if os.path.basename(sys.argv[0]) == "fly" else os.path.basename(sys.argv[0])
+args = sys.argv[1:]
+words = [program] + [arg for arg in args if not arg.startswith("-")]
+settings = dict(config.get("default", {}))
+best = -1
+for key, override in config.get("commands", {}).items():
+    parts = key.split()
+    if words[:len(parts)] == parts and len(parts) > best:
+        best = len(parts)
+        chosen = override
+if best >= 0:
+    settings.update(chosen)
+with open(os.path.join(os.path.dirname(config_path), "calls.log"), "a") as log:
+    log.write(" ".join(words) + "\n")
+
+def option(name, default=None):
+    for flag in name:
+        if flag in args and args.index(flag) + 1 < len(args):
+            return args[args.index(flag) + 1]
+    return default
+
+latency = settings.get("latency", 0) + random.uniform(0, settings.get("jitter", 0))
+time.sleep(latency)
+if random.random() < settings.get("failure_rate", 0):
+    sys.stderr.write(f"Error: simulated failure of {' '.join(words)}\n")
+    sys.exit(1)
+
+lines = int(settings.get("output_lines", 0))
+interval = settings.get("interval", 0)
+app = option(["--app", "-a"], "fake-app")
+command = " ".join(words[1:3])
+
+if program == "git":
+    if words[1:2] == ["ls-remote"]:
+        print("0" * 40 + "\trefs/heads/main")
+        print("1" * 40 + "\trefs/heads/master")
+    elif words[1:2] == ["clone"]:
+        target = words[-1]
+        os.makedirs(target)
+        with open(os.path.join(target, "Dockerfile"), "w") as f:
+            f.write("FROM python:3.11-slim\nWORKDIR /app\nCOPY requirements.txt .\n"
+                    "RUN pip install -r requirements.txt\nCOPY . .\nCMD [\"python\", \"app.py\"]\n")
+        with open(os.path.join(target, "requirements.txt"), "w") as f:
+            f.write("fastapi\nuvicorn\n")
+        for index in range(int(settings.get("repo_files", 0))):
+            with open(os.path.join(target, f"module_{index}.py"), "w") as f:
+                f.write("#" * int(settings.get("file_bytes", 0)) + "\n")
+    else:
+        # Anything else, e.g. ls-files, fails so callers take their non-git fallback
+        sys.stderr.write("fatal: not a git repository\n")
+        sys.exit(128)
+    sys.exit(0)
+
+if words[1:2] == ["status"]:
+    print(json.dumps({"Name": app, "Hostname": f"{app}.fly.dev", "Status": "deployed", "Deployed": True}))
+elif command in ("apps list", "machines list", "machine list", "secrets list", "volumes list"):
+    if "--json" in args:
+        print(json.dumps([{"id": "fake-machine-1", "state": "started"}] if "machine" in command else []))
+    else:
+        print("NAME\tOWNER\tSTATUS")
+elif command == "config show":
+    print(json.dumps({"app": app}))
+elif words[1:2] == ["deploy"]:
+    for index in range(lines):
+        print(f"#{index} [internal] build step {index}", flush=True)
+    # Like BuildKit, progress goes to stderr
+    print("#5 transferring context: 1.2MB 0.4s done", file=sys.stderr)
+elif words[1:2] == ["logs"]:
+    for index in range(lines):
+        print(f"app[fake-machine-1] ord [info] method=GET path=/ status=200 in_flight=1 duration=12ms #{index}", flush=True)
+        if interval:
+            time.sleep(interval)
+else:
+    for index in range(lines):
+        print(f"{' '.join(words)}: {index}")
+'''
+
+def install_fake_cli(bin_dir, config=None):
+    """
+    Writes fake ``flyctl``, ``fly`` and ``git`` executables and their config.
+
+    Args:
+        bin_dir (str): Directory for the executables, created if needed.
+        config (dict): Settings as described in the module docstring; the
+            built-in defaults are used when omitted.
+
+    Returns:
+        dict: Environment variables to apply: PATH with ``bin_dir`` first, and
+        FAKE_CLI_CONFIG.
+    """
+    os.makedirs(bin_dir, exist_ok=True)
+    config_path = os.path.join(bin_dir, "fake_cli.json")
+    write_config(config_path, config or DEFAULT_CONFIG)
+    script = f"#!{sys.executable}\n{FAKE_CLI_SCRIPT}"
+    for name in ("flyctl", "fly", "git"):
+        path = os.path.join(bin_dir, name)
+        with open(path, "w") as f:
+            f.write(script)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return {"PATH": bin_dir + os.pathsep + os.environ.get("PATH", ""), "FAKE_CLI_CONFIG": config_path}
+
+def write_config(config_path, config):
+    """Replaces the config; running benchmarks pick it up on their next command."""
+    with open(config_path, "w") as f:
+        json.dump(config, f, indent=2)
+
+def read_calls(bin_dir):
+    """The commands run so far, one "program subcommand ..." string each."""
+    try:
+        with open(os.path.join(bin_dir, "calls.log")) as f:
+            return f.read().splitlines()
+    except OSError:
+        return []
@@ -0,0 +1,3 @@
+package fixture
+
+func Version() string { return "1.0.0" }
@@ -0,0 +1,5 @@
+import express from "express";
+
+const app = express();
+app.get("/", (_req, res) => res.send("ok"));
+app.listen(Number(process.env.PORT ?? 8080));
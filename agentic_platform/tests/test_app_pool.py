@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+from agentic_platform.api.deploy.pool import PreviewAppPool
+
+class FakeFlyctl:
+    def __init__(self, volumes=()):
+        self.commands = []
+        self.volumes = list(volumes)
+
+    async def __call__(self, command):
+        self.commands.append(command)
+        if command[1:3] == ["volumes", "list"]:
+            return json.dumps(self.volumes)
+        if command[1:3] == ["secrets", "list"]:
+            return json.dumps([{"Name": "API_KEY"}])
+        return ""
+
+def make_pool(flyctl, size=2, **kwargs):
+    pool = PreviewAppPool(size=size, execute=flyctl, **kwargs)
+    pool.ready.extend(["preview-pool-a", "preview-pool-b"][:size])
+    return pool
+
+def test_unserved_app_is_emptied_and_recycled():
+    flyctl = FakeFlyctl()
+    pool = make_pool(flyctl)
+    app_name = pool.acquire("my-repo-main")
+
+    assert app_name == "preview-pool-a" and pool.label(app_name) == "my-repo-main"
+    assert asyncio.run(pool.release(app_name, served=False)) == "recycled"
+    assert list(pool.ready) == ["preview-pool-b", "preview-pool-a"] and pool.label(app_name) is None
+    assert ["flyctl", "scale", "count", "0", "--app", app_name, "--yes"] in flyctl.commands
+    assert ["flyctl", "secrets", "unset", "API_KEY", "--app", app_name, "--stage"] in flyctl.commands
+
+def test_served_app_is_destroyed_so_its_url_dies_with_it():
+    flyctl = FakeFlyctl()
+    pool = make_pool(flyctl)
+    app_name = pool.acquire("my-repo-main")
+
+    assert asyncio.run(pool.release(app_name)) == "destroyed"
+    assert list(pool.ready) == ["preview-pool-b"]
+    assert flyctl.commands == [["flyctl", "apps", "destroy", app_name, "--yes"]]
+
+def test_served_app_is_recycled_when_reuse_is_enabled():
+    pool = make_pool(FakeFlyctl(), reuse_served=True)
+    app_name = pool.acquire("my-repo-main")
+
+    assert asyncio.run(pool.release(app_name)) == "recycled"
+
+def test_apps_with_volumes_or_without_room_are_destroyed():
+    pool = make_pool(FakeFlyctl(volumes=[{"id": "vol_1"}]))
+    assert asyncio.run(pool.release(pool.acquire("with-volume"), served=False)) == "destroyed"
+
+    full = make_pool(FakeFlyctl(), size=1)
+    full.ready.append("preview-pool-c")
+    assert asyncio.run(full.release("preview-pool-d", served=False)) == "destroyed"
+    assert asyncio.run(full.release("my-own-app", served=False)) == "destroyed"
+
+def test_handoff_is_adopted_by_the_next_instance():
+    pool = make_pool(FakeFlyctl())
+    app_name = pool.acquire("my-repo-main")
+
+    successor = PreviewAppPool(size=2, execute=FakeFlyctl())
+    successor.adopt(json.loads(json.dumps(pool.handoff())))
+
+    assert list(successor.ready) == ["preview-pool-b"]
+    assert successor.label(app_name) == "my-repo-main"
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from agentic_platform.api.deploy import autoscale
+from agentic_platform.api.deploy.autoscale import ScalingAdvisor
+
+class StubPreview:
+    """A local HTTP app whose /health reports whatever in-flight count the test sets."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                body = json.dumps({"in_flight": stub.in_flight, "latency_ms": 20}).encode()
+                self.send_response(200 if self.path == "/health" else 404)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def stub():
+    preview = StubPreview()
+    yield preview
+    preview.close()
+
+def run_ticks(advisor, count):
+    async def ticks():
+        actions = []
+        for _ in range(count):
+            await advisor.tick()
+            actions.append(advisor.previews["app"].recommendation["action"])
+        return actions
+    return asyncio.run(ticks())
+
+def test_scales_out_then_in_through_hysteresis(stub):
+    commands = []
+
+    async def execute(command):
+        commands.append(command)
+        return ""
+
+    clock = Clock()
+    advisor = ScalingAdvisor(execute=execute, apply=True, interval=0, clock=clock)
+    advisor.register("app", stub.url, profile="preview", source="health")
+    soft_limit = advisor.previews["app"].soft_limit
+
+    # Sustained pressure: nothing happens until there are enough samples and
+    # the signal has held for SCALE_UP_STREAK evaluations
+    stub.in_flight = soft_limit
+    actions = run_ticks(advisor, autoscale.AUTOSCALE_MIN_SAMPLES + autoscale.SCALE_UP_STREAK - 1)
+    assert actions[:-1] == ["hold"] * (len(actions) - 1)
+    assert actions[-1] == "scale_out"
+    assert commands == [["flyctl", "scale", "count", "2", "--app", "app", "--yes"]]
+    assert advisor.previews["app"].machines == 2
+    assert stub.requests == len(actions)
+
+    # Slack right after the change is held back by the cooldown
+    stub.in_flight = 0
+    actions = run_ticks(advisor, autoscale.AUTOSCALE_MIN_SAMPLES + autoscale.SCALE_DOWN_STREAK)
+    assert set(actions) == {"hold"}
+    assert "cooling down" in advisor.previews["app"].recommendation["reason"]
+
+    # Once the cooldown is over, the slack streak scales back in
+    clock.now += autoscale.AUTOSCALE_COOLDOWN + 1
+    actions = run_ticks(advisor, 1)
+    assert actions == ["scale_in"]
+    assert commands[-1] == ["flyctl", "scale", "count", "1", "--app", "app", "--yes"]
+    assert advisor.previews["app"].machines == 1
+
+def test_a_single_spike_does_not_scale(stub):
+    commands = []
+
+    async def execute(command):
+        commands.append(command)
+        return ""
+
+    advisor = ScalingAdvisor(execute=execute, apply=True, interval=0, clock=Clock())
+    advisor.register("app", stub.url, profile="preview", source="health")
+    stub.in_flight = 2
+    run_ticks(advisor, autoscale.AUTOSCALE_MIN_SAMPLES)
+    stub.in_flight = advisor.previews["app"].soft_limit
+    actions = run_ticks(advisor, autoscale.SCALE_UP_STREAK - 1)
+    assert set(actions) == {"hold"}
+    assert commands == []
+
+def test_previews_default_to_log_sampling(stub):
+    async def execute(command):
+        return "app[1] ord [info] in_flight=3 duration=12ms\n"
+
+    advisor = ScalingAdvisor(execute=execute, interval=0, clock=Clock())
+    preview = advisor.register("app", stub.url)
+    assert preview.source == "logs"
+    run_ticks(advisor, 1)
+    # Sampling must not go through the preview's public URL
+    assert stub.requests == 0
+    assert preview.samples[-1].concurrency == 3
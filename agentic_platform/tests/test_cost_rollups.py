@@ -0,0 +1,77 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from agentic_platform import crud, models
+
+@pytest.fixture
+def sessions(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'costs.db'}", connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(crud, "_rollup_table_ready", False)
+    yield sessionmaker(bind=engine, autoflush=False)
+    engine.dispose()
+
+def add_project(db, total_cost=0.0, updated_at=None):
+    user = models.User(user_id="alice")
+    project = models.Project(name="demo", user=user, total_cost=total_cost, updated_at=updated_at)
+    db.add_all([user, project])
+    db.commit()
+    return project
+
+def buckets(db, granularity):
+    rows = db.query(models.CostRollup).filter(models.CostRollup.granularity == granularity).all()
+    return [(row.bucket_start, row.total_cost, row.event_count) for row in rows]
+
+def test_concurrent_writers_share_a_new_bucket(sessions):
+    first, second = sessions(), sessions()
+    project = add_project(first)
+    crud._rollup_table_ready = True
+    moment = datetime(2026, 10, 19, 12, 30)
+
+    crud.record_cost_rollups(first, project, 1.0, moment)
+    errors = []
+
+    def record_second():
+        # Blocks on first's write lock, then lands on the bucket first inserted
+        try:
+            crud.record_cost_rollups(second, second.get(models.Project, project.id), 2.0, moment)
+            second.commit()
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=record_second)
+    thread.start()
+    time.sleep(0.2)
+    first.commit()
+    thread.join(10)
+
+    assert errors == []
+    assert buckets(first, "hour") == [(datetime(2026, 10, 19, 12), 3.0, 2)]
+    assert buckets(first, "day") == [(datetime(2026, 10, 19), 3.0, 2)]
+
+def test_backfill_adds_only_the_missing_cost(sessions):
+    db = sessions()
+    project = add_project(db, total_cost=5.0, updated_at=datetime(2026, 10, 1, 8, 15))
+
+    assert crud.backfill_cost_rollups(db) == 1
+    db.commit()
+    assert buckets(db, "day") == [(datetime(2026, 10, 1), 5.0, 0)]
+    assert buckets(db, "hour") == [(datetime(2026, 10, 1, 8), 5.0, 0)]
+
+    crud.update_project_cost(db, "demo", "alice", 0.5)
+    assert crud.backfill_cost_rollups(db) == 0
+    assert sum(cost for _, cost, _ in buckets(db, "day")) == pytest.approx(project.total_cost)
+
+def test_first_use_backfills_once(sessions):
+    db = sessions()
+    add_project(db, total_cost=2.0, updated_at=datetime(2026, 9, 30, 23, 59))
+
+    crud.update_project_cost(db, "demo", "alice", 1.0)
+
+    assert sorted(cost for _, cost, _ in buckets(db, "day")) == [1.0, 2.0]
+    assert crud._rollup_table_ready
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from agentic_platform.api.deploy import endpoints
+from agentic_platform.api.deploy.drain import DeployDrainer
+from agentic_platform.api.deploy.models import DeployRequest
+
+class FakeProvider:
+    name = "fake"
+    uses_app_pool = False
+    survives_restart = True
+
+@pytest.fixture
+def registries(tmp_path, monkeypatch):
+    drainer = DeployDrainer(timeout=0.2, state_path=str(tmp_path / "state.json"))
+    monkeypatch.setattr(endpoints, "deploy_drainer", drainer)
+    monkeypatch.setattr(endpoints, "deployments", {})
+    monkeypatch.setattr(endpoints, "cloned_repos", {})
+    monkeypatch.setattr(endpoints, "preview_provider", FakeProvider())
+    monkeypatch.setattr(endpoints, "SHUTDOWN_TEARDOWN", False)
+    return drainer
+
+def test_builds_get_until_the_deadline_then_are_cancelled(registries):
+    async def scenario():
+        fast = asyncio.create_task(asyncio.sleep(0.01))
+        slow = asyncio.create_task(asyncio.sleep(30))
+        registries.track("fast-app", fast)
+        registries.track("slow-app", slow)
+
+        started = time.monotonic()
+        cancelled = await registries.wait_for_builds()
+
+        assert cancelled == ["slow-app"]
+        assert 0.2 <= time.monotonic() - started < 5
+        assert fast.done() and not fast.cancelled() and slow.cancelled()
+        assert registries.builds == {}
+
+    asyncio.run(scenario())
+    assert (registries.metrics["builds_finished"], registries.metrics["builds_cancelled"]) == (1, 1)
+
+def test_new_deploys_are_rejected_while_draining(registries):
+    registries.start_draining()
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(endpoints.deploy(DeployRequest(repo="octo/app", branch="main")))
+
+    assert raised.value.status_code == 503 and endpoints.deployments == {}
+
+def test_handoff_is_written_on_shutdown_and_restored_on_startup(registries, tmp_path, monkeypatch):
+    released, rearmed = [], []
+
+    async def release_app(app_name, served=True):
+        released.append((app_name, served))
+        return "destroyed"
+
+    async def stop_instance(app_name, delay=None, on_stopped=None):
+        rearmed.append((app_name, delay))
+
+    monkeypatch.setattr(endpoints, "release_app", release_app)
+    monkeypatch.setattr(endpoints, "stop_instance", stop_instance)
+    clone = tmp_path / "clone"
+    clone.mkdir()
+    expires_at = time.time() + 600
+    endpoints.deployments.update({
+        "live-app": {"status": "Deployed", "preview_url": "https://live-app.fly.dev", "expires_at": expires_at},
+        "stopped-app": {"status": "Stopped", "preview_url": None, "expires_at": None},
+        "building-app": {"status": "Deploying"},
+    })
+    endpoints.cloned_repos.update({"repo-1": str(clone), "repo-gone": str(tmp_path / "missing")})
+
+    async def shutdown():
+        registries.track("building-app", asyncio.create_task(asyncio.sleep(30)))
+        await endpoints.cleanup()
+
+    asyncio.run(shutdown())
+
+    # The build cut off at the deadline is released; its URL was never handed out
+    assert released == [("building-app", False)]
+    assert endpoints.deployments == {} and endpoints.cloned_repos == {} and registries.finished
+
+    successor = DeployDrainer(state_path=registries.state_path)
+    monkeypatch.setattr(endpoints, "deploy_drainer", successor)
+
+    async def startup():
+        await endpoints.restore_deployments()
+        await asyncio.sleep(0)
+
+    asyncio.run(startup())
+
+    assert set(endpoints.deployments) == {"live-app"}
+    assert endpoints.cloned_repos == {"repo-1": str(clone)}
+    assert [app_name for app_name, _ in rearmed] == ["live-app"] and 590 < rearmed[0][1] <= 600
+    # The state is taken over once
+    assert successor.load() is None
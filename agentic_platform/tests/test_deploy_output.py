@@ -0,0 +1,21 @@
+import asyncio
+
+from agentic_platform.api.deploy import utils
+from agentic_platform.api.deploy.build_context import parse_context_transfer
+from agentic_platform.api.deploy.providers import FlyProvider
+
+class FakeDeploy:
+    returncode = 0
+
+    async def communicate(self, input=None):
+        # flyctl prints its own messages on stdout and BuildKit progress on stderr
+        return b"==> Building image\n--> Pushing image done\n", b"#5 transferring context: 1.2MB 0.4s done\n"
+
+def test_context_upload_is_read_from_build_progress_on_stderr(monkeypatch):
+    async def create_subprocess_exec(*command, **kwargs):
+        return FakeDeploy()
+
+    monkeypatch.setattr(utils.asyncio, "create_subprocess_exec", create_subprocess_exec)
+    output = asyncio.run(FlyProvider().deploy("preview-app", "/tmp", []))
+
+    assert parse_context_transfer(output) == {"bytes": 1200000, "seconds": 0.4}
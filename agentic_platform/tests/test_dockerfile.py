@@ -0,0 +1,93 @@
+import asyncio
+import os
+import shutil
+
+import pytest
+
+from agentic_platform.api.deploy import services
+from agentic_platform.api.deploy.dockerfile import generate_dockerfile
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "dockerfile")
+
+@pytest.mark.parametrize("fixture, stack, entrypoint, expected", [
+    ("node", "node", "npm start", [
+        "FROM node:18-slim AS builder",
+        "COPY package.json package-lock.json ./",
+        "RUN npm ci",
+        "RUN npm run build",
+        "RUN npm prune --omit=dev",
+        "USER node",
+        'CMD ["npm", "start"]',
+    ]),
+    ("go", "go", "go build ./cmd/server", [
+        "FROM golang:1.21 AS builder",
+        "COPY go.mod go.sum ./",
+        "RUN go mod download",
+        'RUN CGO_ENABLED=0 go build -trimpath -ldflags="-s -w" -o /out/app ./cmd/server',
+        "FROM gcr.io/distroless/static-debian12:nonroot",
+        'ENTRYPOINT ["/app"]',
+    ]),
+    ("poetry", "python-poetry", "fastapi app.main:app", [
+        "FROM python:3.10-slim AS builder",
+        "COPY pyproject.toml poetry.lock ./",
+        "RUN poetry export --without-hashes --only main -f requirements.txt -o requirements.lock"
+        " && pip install --no-cache-dir -r requirements.lock",
+        "RUN pip install --no-cache-dir uvicorn",
+        'CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8080"]',
+    ]),
+    ("pep621", "python-pyproject", "flask app:app", [
+        "FROM python:3.12-slim AS builder",
+        'RUN pip install --no-cache-dir "flask>=3.0" "gunicorn>=21.2"',
+        "USER app",
+        'CMD ["gunicorn", "--bind", "0.0.0.0:8080", "app:app"]',
+    ]),
+])
+def test_detects_stack_and_writes_key_lines(fixture, stack, entrypoint, expected):
+    generated = generate_dockerfile(os.path.join(FIXTURES, fixture))
+
+    assert generated is not None
+    assert (generated.stack, generated.entrypoint) == (stack, entrypoint)
+    lines = generated.content.splitlines()
+    for line in expected:
+        assert line in lines
+    # In order, so the dependency layer comes before anything that changes with the sources
+    positions = [lines.index(line) for line in expected]
+    assert positions == sorted(positions)
+
+def test_undetected_project_returns_none():
+    assert generate_dockerfile(os.path.join(FIXTURES, "unknown")) is None
+
+class FakeProcess:
+    returncode = 0
+
+    async def communicate(self):
+        return b"FROM debian:stable-slim\nCOPY . /app\n", b""
+
+def test_undetected_project_falls_back_to_the_model(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    shutil.copytree(os.path.join(FIXTURES, "unknown"), repo)
+    calls = []
+
+    async def create_subprocess_exec(*command, **kwargs):
+        calls.append(command)
+        return FakeProcess()
+
+    monkeypatch.setattr(services.asyncio, "create_subprocess_exec", create_subprocess_exec)
+    result = asyncio.run(services.create_dockerfile(str(repo)))
+
+    assert calls and calls[0][:3] == ("gh", "copilot", "suggest")
+    assert "stack" not in result
+    assert (repo / "Dockerfile").read_text() == "FROM debian:stable-slim\nCOPY . /app\n"
+
+def test_detected_project_skips_the_model(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    shutil.copytree(os.path.join(FIXTURES, "pep621"), repo)
+
+    async def create_subprocess_exec(*command, **kwargs):
+        raise AssertionError(f"ran {command}")
+
+    monkeypatch.setattr(services.asyncio, "create_subprocess_exec", create_subprocess_exec)
+    result = asyncio.run(services.create_dockerfile(str(repo)))
+
+    assert result["stack"] == "python-pyproject"
+    assert (repo / "Dockerfile").read_text() == result["content"]
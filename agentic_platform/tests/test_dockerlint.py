@@ -0,0 +1,101 @@
+import pytest
+
+from agentic_platform.api.deploy.dockerlint import _install_kind, _optimize_stage, _stages, parse_dockerfile
+
+def render(instructions):
+    return "".join(instruction.render() for instruction in instructions)
+
+def test_parse_keeps_continuations_heredocs_and_comments():
+    text = (
+        "# syntax=docker/dockerfile:1\n"
+        "FROM python:3.12-slim AS builder\n"
+        "RUN apt-get update \\\n"
+        "    # comments inside a continuation are dropped by the builder\n"
+        "    && apt-get install -y git\n"
+        "COPY <<EOF /etc/app.conf\n"
+        "RUN not an instruction\n"
+        "EOF\n"
+        "FROM gcr.io/distroless/python3\n"
+        "COPY --from=builder /app /app\n"
+        "# trailing\n"
+    )
+    instructions, trailing = parse_dockerfile(text)
+
+    assert [(item.keyword, item.line) for item in instructions] == [
+        ("FROM", 2), ("RUN", 3), ("COPY", 6), ("FROM", 9), ("COPY", 10)
+    ]
+    assert instructions[0].comments == ["# syntax=docker/dockerfile:1\n"]
+    assert instructions[1].value == "apt-get update && apt-get install -y git"
+    assert len(instructions[2].lines) == 3
+    assert trailing == ["# trailing\n"]
+    assert render(instructions) + "".join(trailing) == text
+    assert [[item.keyword for item in stage] for stage in _stages(instructions)] == [
+        ["FROM", "RUN", "COPY"], ["FROM", "COPY"]
+    ]
+
+@pytest.mark.parametrize("command, expected", [
+    ("pip install --no-cache-dir -r requirements.txt", ("deps", ["requirements.txt"])),
+    ("pip install uvicorn gunicorn", ("tool", [])),
+    ("pip install -e .", ("other", [])),
+    ("npm ci && npm run build", ("other", [])),
+    ("npm ci", ("deps", ["package.json", "package-lock.json", "npm-shrinkwrap.json", ".npmrc"])),
+    ("npm install -g pnpm", ("tool", [])),
+    ("apt-get update && apt-get install -y curl", ("tool", [])),
+    ("poetry config virtualenvs.create false && poetry install", ("deps", ["pyproject.toml", "poetry.lock"])),
+    ("go mod download", ("deps", ["go.mod", "go.sum"])),
+    ("python manage.py collectstatic", ("other", [])),
+])
+def test_install_kind(command, expected):
+    assert _install_kind(command) == expected
+
+def optimize(text, root):
+    changes = []
+    instructions, _ = parse_dockerfile(text)
+    return render(_optimize_stage(instructions, str(root), changes)).splitlines(), changes
+
+def test_install_moves_above_the_context_copy_after_the_env_it_uses(tmp_path):
+    (tmp_path / "requirements.txt").write_text("flask\n")
+    lines, changes = optimize(
+        "FROM python:3.12-slim\n"
+        "WORKDIR /app\n"
+        "COPY . .\n"
+        "ARG PIP_INDEX_URL\n"
+        "ENV PIP_INDEX_URL=${PIP_INDEX_URL}\n"
+        "RUN pip install -r requirements.txt\n"
+        "RUN python manage.py collectstatic\n"
+        "RUN apt-get update\n",
+        tmp_path
+    )
+
+    assert [line for line in lines if line and not line.startswith("#")] == [
+        "FROM python:3.12-slim",
+        "WORKDIR /app",
+        "ARG PIP_INDEX_URL",
+        "ENV PIP_INDEX_URL=${PIP_INDEX_URL}",
+        "COPY requirements.txt /app/",
+        "RUN pip install -r requirements.txt",
+        "COPY . .",
+        "RUN python manage.py collectstatic",
+        "RUN apt-get update",
+    ]
+    assert len(changes) == 1
+
+def test_nothing_moves_past_a_step_that_reads_the_sources(tmp_path):
+    (tmp_path / "requirements.txt").write_text("flask\n")
+    text = (
+        "FROM python:3.12-slim\n"
+        "WORKDIR /app\n"
+        "COPY . .\n"
+        "RUN python scripts/generate_requirements.py\n"
+        "ENV PIP_NO_CACHE_DIR=1\n"
+        "RUN pip install -r requirements.txt\n"
+    )
+    lines, changes = optimize(text, tmp_path)
+
+    assert lines == text.splitlines() and changes == []
+
+def test_manifest_install_stays_put_when_the_manifest_is_missing(tmp_path):
+    text = "FROM node:20\nWORKDIR /app\nCOPY . .\nRUN npm ci\n"
+    lines, changes = optimize(text, tmp_path)
+
+    assert lines == text.splitlines() and changes == []
@@ -0,0 +1,74 @@
+import pytest
+
+from agentic_platform.api.deploy import fly_config
+from agentic_platform.api.deploy.fly_config import generate_fly_config, merge_fly_config
+from agentic_platform.utils import toml
+
+REPO_FLY_TOML = """
+app = "their-app"
+primary_region = "ams"
+
+[build]
+  dockerfile = "Dockerfile.prod"
+
+[[vm]]
+  cpu_kind = "performance"
+  cpus = 2
+  memory_mb = 4096
+
+[http_service]
+  internal_port = 3000
+  force_https = true
+  auto_stop_machines = "off"
+  min_machines_running = 1
+
+  [http_service.concurrency]
+    type = "requests"
+    soft_limit = 100
+    hard_limit = 120
+"""
+
+@pytest.fixture(params=["tomllib", "fallback"])
+def parser(request, monkeypatch):
+    if request.param == "fallback":
+        monkeypatch.setattr(toml, "_tomllib", None)
+    return request.param
+
+def test_default_profile_keeps_the_repository_settings(parser):
+    merged = merge_fly_config(toml.loads(REPO_FLY_TOML), "preview-app")
+
+    assert merged["app"] == "preview-app"
+    assert merged["vm"] == [{"cpu_kind": "performance", "cpus": 2, "memory_mb": 4096}]
+    assert merged["http_service"]["auto_stop_machines"] == "off"
+    assert merged["http_service"]["concurrency"] == {"type": "requests", "soft_limit": 100, "hard_limit": 120}
+    assert merged["build"] == {"dockerfile": "Dockerfile.prod"} and merged["primary_region"] == "ams"
+
+def test_named_profile_overrides_only_what_it_sets(parser):
+    merged = merge_fly_config(toml.loads(REPO_FLY_TOML), "preview-app", "micro")
+
+    assert merged["vm"] == [{"cpu_kind": "shared", "cpus": 1, "memory_mb": 256}]
+    service = merged["http_service"]
+    assert (service["auto_stop_machines"], service["min_machines_running"]) == ("stop", 0)
+    assert service["concurrency"] == {"type": "requests", "soft_limit": 10, "hard_limit": 15}
+    assert service["internal_port"] == 3000 and service["force_https"] is True
+
+def test_generated_default_matches_the_original_template():
+    service = generate_fly_config("preview-app")["services"][0]
+
+    assert not {"auto_stop_machines", "auto_start_machines", "min_machines_running"} & set(service)
+    assert all("force_https" not in port for port in service["ports"])
+    assert service["concurrency"]["soft_limit"] == 20 and service["concurrency"]["hard_limit"] == 25
+
+def test_rendered_config_round_trips_through_the_fallback_parser(parser):
+    fly_config._merged_fly_config.cache_clear()
+    text = fly_config.render_fly_config("preview-app", "standard", existing_text=REPO_FLY_TOML)
+
+    parsed = toml.loads(text)
+    assert parsed["app"] == "preview-app"
+    assert parsed["vm"] == [{"cpu_kind": "shared", "cpus": 2, "memory_mb": 2048}]
+    assert parsed["http_service"]["auto_stop_machines"] == "suspend"
+
+def test_fallback_parser_reports_the_line_of_an_error(monkeypatch):
+    monkeypatch.setattr(toml, "_tomllib", None)
+    with pytest.raises(toml.TomlError, match="Line 3"):
+        toml.loads('app = "x"\n[vm]\nmemory_mb = = 1\n')
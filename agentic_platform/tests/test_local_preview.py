@@ -0,0 +1,17 @@
+import pytest
+
+from agentic_platform.api.deploy import providers
+from agentic_platform.api.deploy.providers import bind_command_port
+
+@pytest.mark.parametrize("command, expected", [
+    (["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8080"],
+     ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "9123"]),
+    (["gunicorn", "--bind", "0.0.0.0:8080", "app:app"], ["gunicorn", "--bind", "127.0.0.1:9123", "app:app"]),
+    (["npx", "next", "start", "-p", "3000"], ["npx", "next", "start", "-p", "9123"]),
+    (["/bin/sh", "-c", "flask run --host=0.0.0.0 --port=8080"], ["/bin/sh", "-c", "flask run --host=0.0.0.0 --port=9123"]),
+    (["uvicorn", "app:app"], ["uvicorn", "app:app", "--host", "127.0.0.1", "--port", "9123"]),
+    (["npm", "start"], ["npm", "start"]),
+])
+def test_dockerfile_command_listens_on_the_preview_port(command, expected, monkeypatch):
+    monkeypatch.setattr(providers, "PREVIEW_LOCAL_HOST", "127.0.0.1")
+    assert bind_command_port(command, 9123) == expected
@@ -0,0 +1,40 @@
+import subprocess
+
+import pytest
+
+from agentic_platform.api.deploy.patch import apply_hunks, parse_unified_diff
+
+def unified_diff(tmp_path, old, new):
+    """Real ``diff -u`` output for ``old`` -> ``new``."""
+    old_path, new_path = tmp_path / "old.txt", tmp_path / "new.txt"
+    old_path.write_text(old)
+    new_path.write_text(new)
+    result = subprocess.run(["diff", "-u", str(old_path), str(new_path)], capture_output=True, text=True)
+    assert result.returncode == 1, result.stderr
+    return result.stdout
+
+@pytest.mark.parametrize("old, new", [
+    # Only the old side lacks a final newline
+    ("a\nb", "a\nc\n"),
+    # Only the new side lacks a final newline
+    ("a\nb\n", "a\nc"),
+    # Neither side ends in a newline, and the last line changes
+    ("a\nb", "a\nc"),
+    # Neither side ends in a newline, and the last line is unchanged context
+    ("a\nb\nc", "a\nB\nc"),
+    # The newline is only added or only removed
+    ("a\nb", "a\nb\n"),
+    ("a\nb\n", "a\nb"),
+])
+def test_round_trip_no_newline_at_end_of_file(tmp_path, old, new):
+    diff = unified_diff(tmp_path, old, new)
+    assert "\\ No newline at end of file" in diff
+    [patch] = parse_unified_diff(diff)
+    assert apply_hunks(old, patch.hunks) == new
+
+def test_marker_strips_only_the_side_it_follows(tmp_path):
+    diff = unified_diff(tmp_path, "a\nb", "a\nc\n")
+    [patch] = parse_unified_diff(diff)
+    [hunk] = patch.hunks
+    assert hunk.old_lines == ["a\n", "b"]
+    assert hunk.new_lines == ["a\n", "c\n"]
@@ -0,0 +1,33 @@
+import asyncio
+import importlib
+
+from agentic_platform.api.deploy import endpoints, services
+
+def test_run_time_limit_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("PREVIEW_RUN_TIME_LIMIT", raising=False)
+    try:
+        assert importlib.reload(services).RUN_TIME_LIMIT == 0
+        assert asyncio.run(services.stop_instance("preview-app")) is None
+    finally:
+        monkeypatch.undo()
+        importlib.reload(services)
+
+def test_stopped_preview_no_longer_reports_deployed(monkeypatch):
+    released = []
+
+    async def release_app(app_name):
+        released.append(app_name)
+        return "recycled"
+
+    monkeypatch.setattr(services, "release_app", release_app)
+    monkeypatch.setitem(endpoints.deployments, "preview-app", {
+        "status": "Deployed", "preview_url": "https://preview-app.fly.dev", "expires_at": 1.0
+    })
+
+    outcome = asyncio.run(services.stop_instance("preview-app", delay=0.01, on_stopped=endpoints.mark_stopped))
+
+    assert outcome == "recycled" and released == ["preview-app"]
+    deployment = endpoints.deployments["preview-app"]
+    assert deployment["status"] == "Stopped"
+    assert deployment["preview_url"] is None and deployment["expires_at"] is None
+    assert "recycled" in deployment["message"]
@@ -0,0 +1,70 @@
+import os
+import subprocess
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from agentic_platform import crud, models, reconcile
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(reconcile, "RECONCILE_STATE_DIR", str(tmp_path / ".reconcile"))
+    return tmp_path
+
+def test_checkpoints_are_kept_per_parameters(state_dir):
+    alice = {"age_seconds": 86400, "user_id": "alice"}
+    bob = {"age_seconds": 86400, "user_id": "bob"}
+
+    reconcile.save_checkpoint("remove", alice, "id-a")
+    reconcile.save_checkpoint("remove", bob, "id-b")
+
+    assert reconcile.load_checkpoint("remove", alice) == "id-a"
+    assert reconcile.load_checkpoint("remove", dict(reversed(list(bob.items())))) == "id-b"
+    reconcile.clear_checkpoint("remove", alice)
+    assert reconcile.load_checkpoint("remove", alice) is None
+    assert reconcile.load_checkpoint("remove", bob) == "id-b"
+
+def test_rows_are_deleted_before_workspaces_are_trashed(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'projects.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user = models.User(user_id="alice")
+    db.add_all([user, models.Project(name="old", user=user, updated_at=datetime(2020, 1, 1))])
+    db.commit()
+
+    remaining_when_trashed = []
+
+    def discard(path):
+        remaining_when_trashed.append(sessionmaker(bind=engine)().query(models.Project).count())
+
+    monkeypatch.setattr(crud.trash_bin, "discard", discard)
+    removed = crud.remove_old_projects(db)
+
+    assert [project["name"] for project in removed] == ["old"]
+    assert remaining_when_trashed and set(remaining_when_trashed) == {0}
+    engine.dispose()
+
+def test_checked_in_folders_are_never_trashed(tmp_path, monkeypatch):
+    projects = tmp_path / "projects"
+    for folder in ("sample_alice", "old_alice"):
+        (projects / folder).mkdir(parents=True)
+        (projects / folder / "main.py").write_text("print('hi')\n")
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    subprocess.run(["git", "add", "projects/sample_alice"], cwd=tmp_path, check=True)
+    monkeypatch.setattr(crud, "PROJECTS_DIR", str(projects))
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'projects.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user = models.User(user_id="alice")
+    db.add_all([user, *(models.Project(name=name, user=user, updated_at=datetime(2020, 1, 1)) for name in ("sample", "old"))])
+    db.commit()
+
+    discarded = []
+    monkeypatch.setattr(crud.trash_bin, "discard", lambda path: discarded.append(os.path.basename(path)))
+    crud.remove_old_projects(db)
+
+    assert "sample_alice" not in discarded and "old_alice" in discarded
+    engine.dispose()
@@ -0,0 +1,14 @@
+import os
+
+from agentic_platform.utils.response_cache import ResponseCache
+
+def disk_bytes(directory):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+
+def test_overwrites_count_only_the_size_difference(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=10_000)
+    cache.put("aa01", {"answer": "x" * 100})
+    for length in (500, 50, 2000, 10):
+        cache.put("aa01", {"answer": "x" * length})
+        assert cache._total_bytes == disk_bytes(tmp_path)
+    assert cache.get("aa01") == {"answer": "x" * 10}
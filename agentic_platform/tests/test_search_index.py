@@ -0,0 +1,25 @@
+from agentic_platform.search_index import ProjectSearchIndex
+
+def build_index(tmp_path):
+    root = tmp_path / "repo"
+    for relative_path in ("src/app/main.py", "src/application.py", "src/app_utils.py", "src/app.py"):
+        path = root / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("def handler():\n    return 1\n")
+    index = ProjectSearchIndex(str(root), str(tmp_path / "index" / "search.db"))
+    index.sync()
+    return index
+
+def test_symbol_path_filter_matches_whole_path_segments(tmp_path):
+    index = build_index(tmp_path)
+
+    assert [symbol["path"] for symbol in index.symbols("handler", path="src/app")] == ["src/app/main.py"]
+    assert [symbol["path"] for symbol in index.symbols("handler", path="/src/app.py")] == ["src/app.py"]
+    assert len(index.symbols("handler", path="src")) == 4
+    assert len(index.symbols("handler", path="/")) == 4
+
+def test_search_and_symbols_agree_on_path_filters(tmp_path):
+    index = build_index(tmp_path)
+
+    searched = [result["path"] for result in index.search("handler", path="src/app")["results"]]
+    assert searched == [symbol["path"] for symbol in index.symbols("handler", path="src/app")]
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+from agentic_platform.utils.templates import PLACEHOLDER_PATTERN, CompiledTemplate
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+def replace_render(source, context):
+    """The substitution sparc_task did before templates were compiled."""
+    for key, value in context.items():
+        source = source.replace(f"{{{{ {key} }}}}", str(value))
+    return source
+
+@pytest.mark.parametrize("source, context", [
+    ("Fix {{ task }} in {{ files }}.", {"task": "the bug", "files": "a.py"}),
+    ("{{task}} and {{  task  }} stay literal; {{ task }} does not", {"task": "X"}),
+    ("Keys need not be words: {{ file-name }}, {{ app.type }}, {{ two words }}", {
+        "file-name": "main.py", "app.type": "api", "two words": "ok"
+    }),
+    ("Unknown {{ missing }} stays, {{ count }} renders", {"count": 3}),
+    ("{{ {{ task }} and {{ task }} }}", {"task": "X"}),
+    ("An unclosed {{ brace before {{ task }}", {"task": "X"}),
+    ("Adjacent {{ a }}{{ b }} and repeated {{ a }}", {"a": 1, "b": 2}),
+])
+def test_matches_the_previous_substitution(source, context):
+    assert CompiledTemplate("t", source).render(context) == replace_render(source, context)
+
+@pytest.mark.parametrize("name", sorted(name for name in os.listdir(TEMPLATES_DIR) if name.endswith(".md")))
+def test_shipped_templates_render_as_before(name):
+    with open(os.path.join(TEMPLATES_DIR, name), "r") as f:
+        source = f.read()
+    keys = set(PLACEHOLDER_PATTERN.findall(source))
+    assert keys
+    context = {key: f"<{key}>" for key in keys}
+    rendered = CompiledTemplate(name, source).render(context)
+    assert rendered == replace_render(source, context)
+    assert "{{" not in rendered
@@ -0,0 +1,48 @@
+import os
+import shutil
+import time
+
+from agentic_platform import workspace_gc as gc_module
+from agentic_platform.workspace_gc import WorkspaceGC
+
+def make_workspace(root, name):
+    path = root / name
+    path.mkdir()
+    data = path / "data.bin"
+    data.write_bytes(b"x" * 1000)
+    old = time.time() - 3600
+    os.utime(data, (old, old))
+    return path
+
+def test_only_unprotected_idle_workspaces_are_evicted(tmp_path, monkeypatch):
+    real = tmp_path / "real"
+    real.mkdir()
+    for name in ("pinned", "cloned", "touched", "idle"):
+        make_workspace(real, name)
+    # Handlers see the workspaces through a symlinked path; discovery resolves it
+    link = tmp_path / "link"
+    link.symlink_to(real)
+
+    gc = WorkspaceGC(interval=0, global_quota=1, min_idle=60)
+    monkeypatch.setattr(gc, "_project_roots", lambda: {os.path.realpath(link)})
+    monkeypatch.setattr(gc, "_resolve_owners", lambda workspaces: {})
+    monkeypatch.setattr(gc_module, "GC_TMP_ROOT", str(tmp_path / "no-tmp"))
+    discarded = []
+
+    def discard(path):
+        discarded.append(path)
+        shutil.rmtree(path)
+        return True
+
+    monkeypatch.setattr(gc_module.trash_bin, "discard", discard)
+
+    gc.pin(str(link / "pinned"))
+    gc.protect(lambda: [str(link / "cloned")])
+    gc.touch(str(link / "touched"))
+    evicted = gc.run_once()
+
+    assert [item["path"] for item in evicted] == [str(real / "idle")]
+    assert discarded == [str(real / "idle")]
+
+    gc.unpin(os.path.join(str(link), "pinned", ""))
+    assert [item["path"] for item in gc.run_once()] == [str(real / "pinned")]
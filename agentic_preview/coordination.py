@@ -0,0 +1,464 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# sqlite:///path/to/file.db, shared by every worker on the host; memory:// keeps state in this process
+COORDINATION_STORE = os.environ.get("COORDINATION_STORE", "sqlite:////tmp/agentic_preview_state.db")
+# Seconds a worker's leadership or liveness lasts without renewal
+LEASE_TTL = float(os.environ.get("COORDINATION_LEASE_TTL", "15"))
+REAPER_INTERVAL = float(os.environ.get("REAPER_INTERVAL", "5"))
+# Threads running store calls off the event loop
+COORDINATION_THREADS = int(os.environ.get("COORDINATION_THREADS", "4"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+class SharedStore(ABC):
+    """
+    State shared by every worker serving the app: key/value namespaces,
+    expiring leases, due-time timers and an append-only event log. Values
+    are JSON-serializable.
+    """
+
+    @abstractmethod
+    def get(self, namespace: str, key: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def put(self, namespace: str, key: str, value):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def items(self, namespace: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, namespace: str, key: str, fields: dict):
+        """Atomically merges ``fields`` into the stored dict, which is created if missing; returns the new value."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Takes or renews ``name`` for ``owner``; fails while another owner holds an unexpired lease."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def release_lease(self, name: str, owner: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def lease_holders(self, prefix: str):
+        """Owners of the unexpired leases whose names start with ``prefix``."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def schedule(self, kind: str, key: str, due_at: float):
+        raise NotImplementedError
+
+    @abstractmethod
+    def cancel(self, kind: str, key: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim_due(self, kind: str, now: float):
+        """Removes and returns the keys of ``kind`` timers due by ``now``; each key is claimed once."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def append_event(self, payload) -> int:
+        """Stores an event and returns its sequence number."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def events_since(self, seq: int, limit: int = 1000):
+        """(seq, payload) pairs after ``seq``, oldest first."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def trim_events(self, keep: int):
+        raise NotImplementedError
+
+class MemoryStore(SharedStore):
+    """Single-process store with the same semantics, for tests and ``--workers 1`` without a shared file."""
+
+    def __init__(self):
+        self.data = {}
+        self.leases = {}
+        self.timers = {}
+        self.events = []
+        self.lock = threading.Lock()
+
+    def get(self, namespace, key):
+        return self.data.get(namespace, {}).get(key)
+
+    def put(self, namespace, key, value):
+        self.data.setdefault(namespace, {})[key] = json.loads(json.dumps(value))
+
+    def delete(self, namespace, key):
+        return self.data.get(namespace, {}).pop(key, None) is not None
+
+    def items(self, namespace):
+        return list(self.data.get(namespace, {}).items())
+
+    def update(self, namespace, key, fields):
+        with self.lock:
+            value = self.get(namespace, key) or {}
+            value.update(json.loads(json.dumps(fields)))
+            self.put(namespace, key, value)
+            return value
+
+    def acquire_lease(self, name, owner, ttl):
+        now = time.time()
+        with self.lock:
+            holder = self.leases.get(name)
+            if holder and holder[0] != owner and holder[1] > now:
+                return False
+            self.leases[name] = (owner, now + ttl)
+            return True
+
+    def release_lease(self, name, owner):
+        with self.lock:
+            if self.leases.get(name, (None,))[0] == owner:
+                del self.leases[name]
+
+    def lease_holders(self, prefix):
+        now = time.time()
+        return [owner for name, (owner, expires) in self.leases.items() if name.startswith(prefix) and expires > now]
+
+    def schedule(self, kind, key, due_at):
+        self.timers[(kind, key)] = due_at
+
+    def cancel(self, kind, key):
+        self.timers.pop((kind, key), None)
+
+    def claim_due(self, kind, now):
+        with self.lock:
+            due = [key for (timer_kind, key), due_at in self.timers.items() if timer_kind == kind and due_at <= now]
+            for key in due:
+                del self.timers[(kind, key)]
+            return due
+
+    def append_event(self, payload):
+        with self.lock:
+            self.events.append(payload)
+            return len(self.events)
+
+    def events_since(self, seq, limit=1000):
+        return [(index + 1, payload) for index, payload in enumerate(self.events[seq:seq + limit], start=seq)]
+
+    def trim_events(self, keep):
+        # Sequence numbers are list positions here, so nothing is dropped
+        pass
+
+class SQLiteStore(SharedStore):
+    """
+    SharedStore in one SQLite file in WAL mode, for workers on one host.
+    Every statement is a short autocommit transaction; contended writes wait
+    up to ``busy_timeout`` instead of failing.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS kv (namespace TEXT, key TEXT, value TEXT, PRIMARY KEY (namespace, key));
+        CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, expires_at REAL);
+        CREATE TABLE IF NOT EXISTS timers (kind TEXT, key TEXT, due_at REAL, PRIMARY KEY (kind, key));
+        CREATE INDEX IF NOT EXISTS timers_due ON timers (kind, due_at);
+        CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT);
+    """
+
+    def __init__(self, path, busy_timeout=5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.local = threading.local()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(self.SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def _execute(self, sql, parameters=()):
+        return self._connection().execute(sql, parameters)
+
+    def get(self, namespace, key):
+        row = self._execute("SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, namespace, key, value):
+        self._execute(
+            "INSERT INTO kv (namespace, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value",
+            (namespace, key, json.dumps(value))
+        )
+
+    def delete(self, namespace, key):
+        return self._execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key)).rowcount > 0
+
+    def items(self, namespace):
+        rows = self._execute("SELECT key, value FROM kv WHERE namespace = ? ORDER BY rowid", (namespace,))
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def update(self, namespace, key, fields):
+        connection = self._connection()
+        # Takes the write lock before reading, so concurrent merges from other workers queue up instead of losing fields
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            value = self.get(namespace, key) or {}
+            value.update(fields)
+            self.put(namespace, key, value)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return value
+
+    def acquire_lease(self, name, owner, ttl):
+        now = time.time()
+        cursor = self._execute(
+            "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+            (name, owner, now + ttl, now)
+        )
+        return cursor.rowcount > 0
+
+    def release_lease(self, name, owner):
+        self._execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def lease_holders(self, prefix):
+        rows = self._execute(
+            "SELECT owner FROM leases WHERE substr(name, 1, ?) = ? AND expires_at > ?",
+            (len(prefix), prefix, time.time())
+        )
+        return [owner for (owner,) in rows]
+
+    def schedule(self, kind, key, due_at):
+        self._execute(
+            "INSERT INTO timers (kind, key, due_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (kind, key) DO UPDATE SET due_at = excluded.due_at",
+            (kind, key, due_at)
+        )
+
+    def cancel(self, kind, key):
+        self._execute("DELETE FROM timers WHERE kind = ? AND key = ?", (kind, key))
+
+    def claim_due(self, kind, now):
+        rows = self._execute("SELECT key FROM timers WHERE kind = ? AND due_at <= ?", (kind, now)).fetchall()
+        # Whoever deletes the row owns the timer, even if two reapers overlap during a leadership change
+        return [key for (key,) in rows if self._execute(
+            "DELETE FROM timers WHERE kind = ? AND key = ?", (kind, key)
+        ).rowcount > 0]
+
+    def append_event(self, payload):
+        return self._execute("INSERT INTO events (payload) VALUES (?)", (json.dumps(payload),)).lastrowid
+
+    def events_since(self, seq, limit=1000):
+        rows = self._execute("SELECT seq, payload FROM events WHERE seq > ? ORDER BY seq LIMIT ?", (seq, limit))
+        return [(row_seq, json.loads(payload)) for row_seq, payload in rows]
+
+    def trim_events(self, keep):
+        self._execute("DELETE FROM events WHERE seq <= (SELECT MAX(seq) FROM events) - ?", (keep,))
+
+def get_store(url: str = COORDINATION_STORE) -> SharedStore:
+    if url.startswith("memory:"):
+        return MemoryStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported COORDINATION_STORE '{url}'; use sqlite:///path or memory://")
+
+class AsyncStore:
+    """
+    The SharedStore calls as coroutines, run on a small thread pool. A write
+    waiting out another worker's lock then holds one of those threads for up
+    to ``busy_timeout``, not the event loop serving every request.
+    """
+
+    def __init__(self, store: SharedStore, threads: int = COORDINATION_THREADS):
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="coordination")
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args))
+
+    async def get(self, namespace, key):
+        return await self._run(self.store.get, namespace, key)
+
+    async def put(self, namespace, key, value):
+        return await self._run(self.store.put, namespace, key, value)
+
+    async def delete(self, namespace, key):
+        return await self._run(self.store.delete, namespace, key)
+
+    async def items(self, namespace):
+        return await self._run(self.store.items, namespace)
+
+    async def update(self, namespace, key, fields):
+        """Merges ``fields`` into the stored dict atomically; returns the new value."""
+        return await self._run(self.store.update, namespace, key, fields)
+
+    async def acquire_lease(self, name, owner, ttl):
+        return await self._run(self.store.acquire_lease, name, owner, ttl)
+
+    async def release_lease(self, name, owner):
+        return await self._run(self.store.release_lease, name, owner)
+
+    async def lease_holders(self, prefix):
+        return await self._run(self.store.lease_holders, prefix)
+
+    async def schedule(self, kind, key, due_at):
+        return await self._run(self.store.schedule, kind, key, due_at)
+
+    async def cancel(self, kind, key):
+        return await self._run(self.store.cancel, kind, key)
+
+    async def claim_due(self, kind, now):
+        return await self._run(self.store.claim_due, kind, now)
+
+    async def append_event(self, payload):
+        return await self._run(self.store.append_event, payload)
+
+    async def events_since(self, seq, limit=1000):
+        return await self._run(self.store.events_since, seq, limit)
+
+    async def trim_events(self, keep):
+        return await self._run(self.store.trim_events, keep)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+class SharedDict:
+    """
+    One store namespace with an async dict-like interface. Values are
+    copies: change a stored dict by setting it again (or with
+    ``update_item``), not by mutating it.
+    """
+
+    def __init__(self, store: AsyncStore, namespace: str):
+        self.store = store
+        self.namespace = namespace
+
+    async def get(self, key, default=None):
+        value = await self.store.get(self.namespace, key)
+        return default if value is None else value
+
+    async def set(self, key, value):
+        await self.store.put(self.namespace, key, value)
+
+    async def pop(self, key):
+        """Removes ``key``; returns whether it was there."""
+        return await self.store.delete(self.namespace, key)
+
+    async def contains(self, key):
+        return await self.store.get(self.namespace, key) is not None
+
+    async def items(self):
+        return await self.store.items(self.namespace)
+
+    async def keys(self):
+        return [key for key, _ in await self.store.items(self.namespace)]
+
+    async def update_item(self, key, **fields):
+        return await self.store.update(self.namespace, key, fields)
+
+class Coordinator:
+    """
+    Liveness and leadership for one worker. Every worker renews its
+    ``worker:`` lease; whichever holds the ``reaper`` lease runs the due
+    timers, so a deadline fires once even with several workers, and still
+    fires when the worker that set it has exited.
+    """
+
+    def __init__(self, store: AsyncStore, worker_id: str = WORKER_ID, interval: float = REAPER_INTERVAL,
+                 ttl: float = LEASE_TTL):
+        self.store = store
+        self.worker_id = worker_id
+        self.interval = interval
+        self.ttl = ttl
+        self.handlers = {}
+        self.duties = []
+        self.is_leader = False
+        self._task = None
+
+    def on_timer(self, kind: str, handler: Callable[[str], Awaitable]):
+        """Registers the coroutine run for each due ``kind`` timer, with the timer's key."""
+        self.handlers[kind] = handler
+
+    def on_leader_tick(self, duty: Callable[[], Awaitable]):
+        """Registers a coroutine the leader runs every interval, e.g. pruning."""
+        self.duties.append(duty)
+
+    async def live_workers(self):
+        return await self.store.lease_holders("worker:")
+
+    async def tick(self):
+        await self.store.acquire_lease(f"worker:{self.worker_id}", self.worker_id, self.ttl)
+        was_leader = self.is_leader
+        self.is_leader = await self.store.acquire_lease("reaper", self.worker_id, self.ttl)
+        if self.is_leader and not was_leader:
+            logger.info(f"Worker {self.worker_id} is now the reaper")
+        if not self.is_leader:
+            return
+        for kind, handler in self.handlers.items():
+            for key in await self.store.claim_due(kind, time.time()):
+                asyncio.create_task(self._run(kind, handler, key))
+        for duty in self.duties:
+            try:
+                await duty()
+            except Exception as e:
+                logger.error(f"Error in reaper duty: {e}")
+
+    async def _run(self, kind, handler, key):
+        try:
+            await handler(key)
+        except Exception as e:
+            logger.error(f"Error running {kind} timer for {key}: {e}")
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.tick()
+            except sqlite3.Error as e:
+                logger.error(f"Coordination store error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Let another worker take over the reaper duties right away rather than after the lease expires
+        await self.store.release_lease("reaper", self.worker_id)
+        await self.store.release_lease(f"worker:{self.worker_id}", self.worker_id)
+        self.is_leader = False
+
+    async def is_last_worker(self):
+        return not [worker for worker in await self.live_workers() if worker != self.worker_id]
+
+store = AsyncStore(get_store())
+coordinator = Coordinator(store)
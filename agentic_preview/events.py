@@ -0,0 +1,239 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+from coordination import AsyncStore, store
+
+logger = logging.getLogger(__name__)
+
+# Events kept for replay, across all apps and per app
+EVENTS_BACKLOG = int(os.environ.get("EVENTS_BACKLOG", "5000"))
+EVENTS_APP_BACKLOG = int(os.environ.get("EVENTS_APP_BACKLOG", "200"))
+# Undelivered events a subscriber may hold before it is dropped and has to reconnect with its last seq
+EVENTS_QUEUE_SIZE = int(os.environ.get("EVENTS_QUEUE_SIZE", "1000"))
+# Seconds between reads of events published by other workers
+EVENTS_POLL_INTERVAL = float(os.environ.get("EVENTS_POLL_INTERVAL", "0.5"))
+
+# Stages after which a deployment produces no further events
+TERMINAL_STAGES = {"failed", "destroyed"}
+
+class DeploymentEvent:
+    def __init__(self, seq, app_name, stage, status, message, data, timestamp=None):
+        self.seq = seq
+        self.app_name = app_name
+        self.stage = stage
+        self.status = status
+        self.message = message
+        self.data = data
+        self.timestamp = timestamp or time.time()
+
+    @classmethod
+    def from_dict(cls, seq, payload):
+        return cls(
+            seq, payload["app_name"], payload["stage"], payload.get("status"), payload.get("message", ""),
+            payload.get("data") or {}, payload.get("timestamp")
+        )
+
+    def dict(self):
+        return {
+            "seq": self.seq,
+            "app_name": self.app_name,
+            "stage": self.stage,
+            "status": self.status,
+            "message": self.message,
+            "timestamp": self.timestamp,
+            **({"data": self.data} if self.data else {}),
+        }
+
+class Subscription:
+    """
+    A subscriber's view of the bus: replayed events first, then live ones,
+    never twice. Events published on this worker arrive in sequence order;
+    those from other workers arrive when the bus next syncs, so they can
+    follow events with a higher seq.
+
+    ``apps`` is the set of app names to receive, or None for every app.
+    """
+
+    def __init__(self, bus, apps):
+        self.bus = bus
+        self.apps = None if apps is None else set(apps)
+        self.queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        # Seqs of recently delivered events. A duplicate is queued while its
+        # first copy is still queued, so it is never more than a queue behind.
+        self.delivered = set()
+        self._delivered_order = deque()
+        self.overflowed = False
+
+    def wants(self, app_name):
+        return self.apps is None or app_name in self.apps
+
+    def offer(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A stalled consumer must not hold up publishers or grow without bound
+            self.overflowed = True
+            logger.warning(f"Dropped an event subscriber that fell {EVENTS_QUEUE_SIZE} events behind")
+
+    def add(self, apps: Optional[Iterable[str]], since: Optional[int] = None):
+        """Widens the subscription (None: every app) and queues the backlog after ``since`` for the added apps."""
+        previous = None if self.apps is None else set(self.apps)
+        replay = None if apps is None else set(apps)
+        if replay is None:
+            self.apps = None
+        elif self.apps is not None:
+            self.apps |= replay
+        # Apps already subscribed have live events queued; replaying older ones behind them would be skipped anyway
+        if since is not None and previous is not None:
+            for event in self.bus.backlog(replay, since):
+                if event.app_name not in previous:
+                    self.offer(event)
+
+    def remove(self, apps: Iterable[str]):
+        if self.apps is not None:
+            self.apps -= set(apps)
+
+    async def next(self, timeout: Optional[float] = None):
+        """
+        The next event, or None on timeout.
+
+        Raises:
+            OverflowError: If the subscriber fell too far behind and was dropped.
+        """
+        while True:
+            if self.overflowed and self.queue.empty():
+                raise OverflowError("Subscriber fell behind; reconnect with the last seq received")
+            try:
+                event = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return None
+            if not self.wants(event.app_name) or event.seq in self.delivered:
+                continue
+            self.delivered.add(event.seq)
+            self._delivered_order.append(event.seq)
+            if len(self._delivered_order) > EVENTS_QUEUE_SIZE:
+                self.delivered.discard(self._delivered_order.popleft())
+            return event
+
+    def close(self):
+        self.bus.subscribers.discard(self)
+
+class EventBus:
+    """
+    Publish/subscribe for deployment stage transitions.
+
+    Every event gets the next global sequence number. Recent events are kept
+    so a client that reconnects with the last seq it saw gets what it missed
+    before the live events.
+
+    With a ``store``, sequence numbers come from the shared event log and
+    ``start()`` tails it, so subscribers on any worker see the events
+    published by every worker.
+    """
+
+    def __init__(self, backlog=EVENTS_BACKLOG, app_backlog=EVENTS_APP_BACKLOG, store: Optional[AsyncStore] = None,
+                 poll_interval=EVENTS_POLL_INTERVAL):
+        self._seq = itertools.count(1)
+        self.last_seq = 0
+        self.events = deque(maxlen=backlog)
+        self.app_events = {}
+        self.app_backlog = app_backlog
+        self.subscribers = set()
+        self.store = store
+        self.poll_interval = poll_interval
+        # Highest seq read from the store, and the seqs above it published here
+        self.synced_seq = 0
+        self.published = set()
+        self._task = None
+
+    async def publish(self, app_name: str, stage: str, status: str, message: str = "", **data):
+        event = DeploymentEvent(0, app_name, stage, status, message, data)
+        if self.store is None:
+            event.seq = next(self._seq)
+        else:
+            event.seq = await self.store.append_event(event.dict())
+            self.published.add(event.seq)
+        self._dispatch(event)
+        return event
+
+    def _dispatch(self, event):
+        self.last_seq = max(self.last_seq, event.seq)
+        self.events.append(event)
+        self.app_events.setdefault(event.app_name, deque(maxlen=self.app_backlog)).append(event)
+        for subscriber in list(self.subscribers):
+            if subscriber.wants(event.app_name):
+                subscriber.offer(event)
+
+    async def sync(self):
+        """Dispatches the events other workers have stored since the last sync; returns how many were read."""
+        rows = await self.store.events_since(self.synced_seq)
+        for seq, payload in rows:
+            self.synced_seq = seq
+            if seq in self.published:
+                self.published.discard(seq)
+            else:
+                self._dispatch(DeploymentEvent.from_dict(seq, payload))
+        return len(rows)
+
+    async def _tail(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Error reading shared deployment events: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def start(self):
+        """Loads the kept history from the store and starts following it."""
+        if self.store is None or (self._task and not self._task.done()):
+            return
+        while await self.sync():
+            pass
+        self._task = asyncio.create_task(self._tail())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def backlog(self, apps: Optional[Iterable[str]], since: int = 0):
+        """Kept events after ``since`` for ``apps`` (None: all apps), in sequence order."""
+        if apps is None:
+            return sorted((event for event in self.events if event.seq > since), key=lambda event: event.seq)
+        events = [
+            event for app_name in apps for event in self.app_events.get(app_name, ()) if event.seq > since
+        ]
+        return sorted(events, key=lambda event: event.seq)
+
+    def latest(self, app_name: str):
+        events = self.app_events.get(app_name)
+        return max(events, key=lambda event: event.seq) if events else None
+
+    def subscribe(self, apps: Optional[Iterable[str]] = None, since: Optional[int] = None):
+        """
+        Starts a subscription. It is registered before the backlog is read, so
+        no event published in between is lost; duplicates are skipped by seq.
+        """
+        subscription = Subscription(self, apps)
+        self.subscribers.add(subscription)
+        if since is not None:
+            for event in self.backlog(subscription.apps, since):
+                subscription.offer(event)
+        return subscription
+
+    def forget(self, app_name: str):
+        """Drops an app's per-app backlog; its events stay in the global backlog until they age out."""
+        self.app_events.pop(app_name, None)
+
+event_bus = EventBus(store=store)
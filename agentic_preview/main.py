@@ -2,19 +2,30 @@ import os
 import asyncio
 import json
 import shutil
+import time
 from datetime import datetime
 from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
 from fastapi.responses import RedirectResponse, StreamingResponse
 import logging
 import uuid
 
+from coordination import SharedDict, coordinator, store
+from events import EVENTS_BACKLOG, event_bus, TERMINAL_STAGES
+
 app = FastAPI()
 
 # Configurable runtime limit in seconds
 RUN_TIME_LIMIT = 200  # Adjust as needed
+# Seconds between keepalives on idle event streams
+EVENTS_HEARTBEAT = float(os.environ.get("EVENTS_HEARTBEAT", "15"))
+# Seconds shutdown waits for running builds before cancelling them
+SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get("SHUTDOWN_DRAIN_TIMEOUT", "300"))
+# Destroy every preview when the last worker exits instead of leaving them to the next start
+SHUTDOWN_TEARDOWN = os.environ.get("SHUTDOWN_TEARDOWN", "false").lower() in ("1", "true", "yes")
+SHUTDOWN_TEARDOWN_CONCURRENCY = int(os.environ.get("SHUTDOWN_TEARDOWN_CONCURRENCY", "8"))
 
 # Set up logging
 logging.basicConfig(
@@ -24,8 +35,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-deployments = {}  # key: app_name, value: deployment info
-cloned_repos = {}  # key: repo_id, value: repo_path
+# Shared by every worker (uvicorn --workers N) through the coordination store
+deployments = SharedDict(store, "deployments")  # key: app_name, value: deployment info
+cloned_repos = SharedDict(store, "cloned_repos")  # key: repo_id, value: repo_path
+deploy_tasks = {}  # key: app_name, value: this worker's running deploy_app task
+draining = False  # set on shutdown: no new deploys are accepted
 
 class DeployRequest(BaseModel):
     repo: str
@@ -78,15 +92,27 @@ async def execute_command(cmd: List[str], cwd: Optional[str] = None):
     return stdout.decode()
 
 async def stop_instance(app_name: str):
-    """Stops the Fly.io instance after RUN_TIME_LIMIT seconds."""
-    await asyncio.sleep(RUN_TIME_LIMIT)
+    """
+    Stops the Fly.io instance once its RUN_TIME_LIMIT is up. Runs from the
+    stop timer set on deploy, on whichever worker is the reaper at the time.
+    """
     try:
         logger.info(f"Stopping app {app_name} after {RUN_TIME_LIMIT} seconds.")
+        await publish_stage(app_name, "stopping", f"Run time limit of {RUN_TIME_LIMIT} seconds reached.")
         await execute_command(['flyctl', 'apps', 'destroy', app_name, '--yes'])
         logger.info(f"[{datetime.utcnow()}] App {app_name} has been stopped.")
+        await publish_stage(app_name, "destroyed", "App destroyed.")
     except Exception as e:
         logger.error(f"Error stopping app {app_name}: {e}")
 
+async def publish_stage(app_name: str, stage: str, message: str = "", **data):
+    """Records a deploy pipeline stage on the deployment and publishes it to event subscribers."""
+    deployment = {}
+    # Stored copies are shared across workers, so the change has to be written back
+    if await deployments.contains(app_name):
+        deployment = await deployments.update_item(app_name, stage=stage)
+    return await event_bus.publish(app_name, stage, deployment.get("status"), message, **data)
+
 async def deploy_app(repo: str, branch: str, args: List[str], app_name: str, repo_dir: str, memory: int):
     try:
         # Check if Dockerfile exists; if not, return an error
@@ -99,6 +125,7 @@ async def deploy_app(repo: str, branch: str, args: List[str], app_name: str, rep
             logger.info("Using existing Dockerfile.")
 
         # Check if fly.toml exists, generate one if not
+        await publish_stage(app_name, "configuring", "Preparing fly.toml.")
         fly_toml_path = os.path.join(repo_dir, 'fly.toml')
         if not os.path.exists(fly_toml_path):
             logger.info("Creating fly.toml configuration.")
@@ -144,9 +171,11 @@ app = "{app_name}"
             logger.info("Using existing fly.toml.")
 
         # Create the app on Fly.io
+        await publish_stage(app_name, "creating_app", "Creating the Fly.io app.")
         await execute_command(['flyctl', 'apps', 'create', app_name], cwd=repo_dir)
 
         # Deploy the app using flyctl deploy
+        await publish_stage(app_name, "deploying", "Building and deploying.")
         deploy_cmd = ['flyctl', 'deploy', '--remote-only', '--config', 'fly.toml', '--app', app_name]
         deploy_cmd.extend(args)
         await execute_command(deploy_cmd, cwd=repo_dir)
@@ -159,26 +188,28 @@ app = "{app_name}"
         hostname = app_status.get('Hostname', f"{app_name}.fly.dev")
         logger.info(f"Preview URL: {hostname}")
 
-        # Schedule the instance to stop after RUN_TIME_LIMIT seconds
-        asyncio.create_task(stop_instance(app_name))
+        # Schedule the instance to stop after RUN_TIME_LIMIT seconds; the timer outlives this worker
+        await store.schedule("stop_instance", app_name, time.time() + RUN_TIME_LIMIT)
 
         # Update deployment status
-        deployments[app_name] = {
+        await deployments.set(app_name, {
             "status": "Deployed",
             "preview_url": f"https://{hostname}",
             "message": "Deployment successful.",
             "timestamp": datetime.utcnow().isoformat()
-        }
+        })
+        await publish_stage(app_name, "deployed", "Deployment successful.", preview_url=f"https://{hostname}")
 
     except Exception as e:
         logger.error(f"Error during deployment: {e}")
         # Update deployment status
-        deployments[app_name] = {
+        await deployments.set(app_name, {
             "status": "Failed",
             "preview_url": None,
             "message": f"Deployment failed: {str(e)}",
             "timestamp": datetime.utcnow().isoformat()
-        }
+        })
+        await publish_stage(app_name, "failed", f"Deployment failed: {str(e)}")
         # Capture the traceback for debugging
         import traceback
         traceback_str = ''.join(traceback.format_exception(None, e, e.__traceback__))
@@ -197,6 +228,10 @@ app = "{app_name}"
 
 @app.post("/deploy")
 async def deploy(deploy_request: DeployRequest):
+    if draining:
+        raise HTTPException(
+            status_code=503, detail="The service is shutting down; retry shortly.", headers={"Retry-After": "30"}
+        )
     app_name: Optional[str] = None
     repo_dir: Optional[str] = None  # Initialize repo_dir
     try:
@@ -245,21 +280,25 @@ async def deploy(deploy_request: DeployRequest):
         app_name = f"preview-{repo_name.lower()}-{branch.lower() if branch else 'default'}-{timestamp}"
         logger.info(f"Generated app name: {app_name}")
 
-        # Start the deployment in the background
-        asyncio.create_task(deploy_app(repo, branch, args, app_name, repo_dir, memory))
-
-        # Store the deployment status
-        deployments[app_name] = {
+        # Store the deployment status before the build can publish its first stage
+        await deployments.set(app_name, {
             "status": "Deploying",
             "preview_url": None,
             "message": "Deployment started.",
             "timestamp": datetime.utcnow().isoformat()
-        }
+        })
+        await publish_stage(app_name, "queued", "Deployment started.", repo=repo, branch=branch)
+
+        # Start the deployment in the background
+        deploy_task = asyncio.create_task(deploy_app(repo, branch, args, app_name, repo_dir, memory))
+        deploy_tasks[app_name] = deploy_task
+        deploy_task.add_done_callback(lambda _: deploy_tasks.pop(app_name, None))
 
         return {
             "app_name": app_name,
             "message": "Deployment started.",
-            "status_url": f"/status/{app_name}"
+            "status_url": f"/status/{app_name}",
+            "events_url": f"/deployments/{app_name}/events"
         }
 
     except HTTPException as http_exc:
@@ -281,8 +320,9 @@ async def deploy(deploy_request: DeployRequest):
 async def check_status(app_name: str):
     try:
         logger.info(f"Checking status for app: {app_name}")
-        if app_name in deployments:
-            return deployments[app_name]
+        deployment = await deployments.get(app_name)
+        if deployment is not None:
+            return deployment
         else:
             logger.warning(f"No deployment found for app: {app_name}")
             raise HTTPException(status_code=404, detail=f"No deployment found for app: {app_name}")
@@ -292,7 +332,7 @@ async def check_status(app_name: str):
 
 @app.get("/logs/{app_name}")
 async def stream_logs(app_name: str):
-    if app_name not in deployments:
+    if not await deployments.contains(app_name):
         logger.warning(f"No deployment found for app: {app_name}")
         raise HTTPException(status_code=404, detail=f"No deployment found for app: {app_name}")
 
@@ -330,6 +370,94 @@ async def stream_logs(app_name: str):
 
     return StreamingResponse(log_streamer(), media_type="text/event-stream")
 
+@app.get("/deployments/{app_name}/events")
+async def deployment_events(
+    app_name: str,
+    request: Request,
+    since: Optional[int] = None,
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Server-sent events for one deployment's stage transitions. Each event's
+    ``id`` is its sequence number; reconnecting with ``Last-Event-ID`` (or
+    ``since``) replays what was missed, and a fresh stream starts with the
+    deployment's kept history. The stream ends after a terminal stage.
+    """
+    if event_bus.latest(app_name) is None and not await deployments.contains(app_name):
+        logger.warning(f"No deployment found for app: {app_name}")
+        raise HTTPException(status_code=404, detail=f"No deployment found for app: {app_name}")
+    if since is None:
+        since = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    subscription = event_bus.subscribe([app_name], since)
+
+    async def event_streamer():
+        try:
+            while not await request.is_disconnected():
+                event = await subscription.next(timeout=EVENTS_HEARTBEAT)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {event.seq}\nevent: {event.stage}\ndata: {json.dumps(event.dict())}\n\n"
+                if event.stage in TERMINAL_STAGES:
+                    break
+        except OverflowError as e:
+            yield f"event: overflow\ndata: {json.dumps({'error': str(e)})}\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        event_streamer(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+    )
+
+@app.websocket("/deployments/events/ws")
+async def deployment_events_ws(websocket: WebSocket):
+    """
+    One connection for many deployments. Clients send
+    ``{"action": "subscribe", "apps": [...] or "*", "since": seq}`` and
+    ``{"action": "unsubscribe", "apps": [...]}``; the server sends
+    ``{"type": "event", ...}`` for each stage transition, replaying events
+    after ``since`` for newly subscribed apps first.
+    """
+    await websocket.accept()
+    subscription = event_bus.subscribe([])
+
+    async def receive():
+        while True:
+            message = await websocket.receive_json()
+            action = message.get("action") if isinstance(message, dict) else None
+            apps = message.get("apps") if isinstance(message, dict) else None
+            if action == "subscribe" and (apps == "*" or isinstance(apps, list)):
+                subscription.add(None if apps == "*" else apps, message.get("since"))
+                await websocket.send_json({"type": "subscribed", "apps": apps, "last_seq": event_bus.last_seq})
+            elif action == "unsubscribe" and isinstance(apps, list):
+                subscription.remove(apps)
+                await websocket.send_json({"type": "unsubscribed", "apps": apps})
+            else:
+                await websocket.send_json({"type": "error", "detail": "Expected a subscribe or unsubscribe action"})
+
+    async def send():
+        while True:
+            event = await subscription.next(timeout=EVENTS_HEARTBEAT)
+            if event is None:
+                await websocket.send_json({"type": "keepalive", "last_seq": event_bus.last_seq})
+            else:
+                await websocket.send_json({"type": "event", **event.dict()})
+
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(send())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if isinstance(error, OverflowError):
+                await websocket.send_json({"type": "overflow", "detail": str(error)})
+                await websocket.close(code=1013)
+            elif error is not None and not isinstance(error, WebSocketDisconnect):
+                logger.error(f"Error in deployment events websocket: {error}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        subscription.close()
+
 @app.get("/apps")
 async def list_apps():
     try:
@@ -362,7 +490,7 @@ async def clone_repo(request: CloneRequest):
             logger.error(error_message)
             raise HTTPException(status_code=400, detail=error_message)
 
-        cloned_repos[repo_id] = temp_dir
+        await cloned_repos.set(repo_id, temp_dir)
         logger.info(f"Repository cloned successfully with ID: {repo_id}")
         return {"repo_id": repo_id, "message": "Repository cloned successfully"}
     except Exception as e:
@@ -371,16 +499,16 @@ async def clone_repo(request: CloneRequest):
 
 @app.get("/repos")
 async def list_repo_ids():
-    return {"repo_ids": list(cloned_repos.keys())}
+    return {"repo_ids": await cloned_repos.keys()}
 
 
 @app.post("/explore")
 async def explore_repo(request: ExploreRequest):
-    if request.repo_id not in cloned_repos:
+    repo_path = await cloned_repos.get(request.repo_id)
+    if repo_path is None:
         logger.warning(f"Repository not found for ID: {request.repo_id}")
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    repo_path = cloned_repos[request.repo_id]
     full_path = os.path.join(repo_path, request.path or "")
 
     if request.action == "explore":
@@ -486,20 +614,95 @@ async def create_dockerfile(repo_path):
         logger.error(f"Error creating Dockerfile: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def prune_events():
+    await store.trim_events(EVENTS_BACKLOG)
+
+coordinator.on_timer("stop_instance", stop_instance)
+coordinator.on_leader_tick(prune_events)
+
+@app.on_event("startup")
+async def start_coordination():
+    coordinator.start()
+    await event_bus.start()
+
+async def destroy_app(app_name: str, message: str):
+    await execute_command(['flyctl', 'apps', 'destroy', app_name, '--yes'])
+    logger.info(f"Destroyed app: {app_name}")
+    await publish_stage(app_name, "destroyed", message)
+    await store.cancel("stop_instance", app_name)
+
+async def teardown(items, release):
+    """Runs ``release`` on every item, at most SHUTDOWN_TEARDOWN_CONCURRENCY at a time."""
+    semaphore = asyncio.Semaphore(max(1, SHUTDOWN_TEARDOWN_CONCURRENCY))
+
+    async def release_one(item):
+        async with semaphore:
+            try:
+                await release(item)
+                return True
+            except Exception as e:
+                logger.error(f"Error tearing down {item}: {e}")
+                return False
+
+    return await asyncio.gather(*[release_one(item) for item in items])
+
+async def drain_builds():
+    """
+    Waits up to SHUTDOWN_DRAIN_TIMEOUT for this worker's running builds, then
+    cancels the rest and destroys their half-deployed apps, which nothing
+    else would stop.
+    """
+    if not deploy_tasks:
+        return
+    logger.info(f"Draining {len(deploy_tasks)} builds for up to {SHUTDOWN_DRAIN_TIMEOUT}s")
+    tasks = dict(deploy_tasks)
+    _, pending = await asyncio.wait(tasks.values(), timeout=SHUTDOWN_DRAIN_TIMEOUT)
+    interrupted = [app_name for app_name, task in tasks.items() if task in pending]
+    for app_name in interrupted:
+        tasks[app_name].cancel()
+    if pending:
+        await asyncio.wait(pending)
+    for app_name in interrupted:
+        message = "Deployment interrupted by shutdown."
+        await deployments.update_item(
+            app_name, status="Failed", message=message, timestamp=datetime.utcnow().isoformat()
+        )
+        await publish_stage(app_name, "failed", message)
+    await teardown(interrupted, lambda app_name: destroy_app(app_name, "App destroyed after an interrupted deployment."))
+
 @app.on_event("shutdown")
 async def cleanup():
-    # Clean up cloned repositories
-    for repo_id, repo_path in cloned_repos.items():
-        shutil.rmtree(repo_path, ignore_errors=True)
+    global draining
+    draining = True
+    await drain_builds()
+    await event_bus.stop()
+    await coordinator.stop()
+    # Other workers keep serving the shared deployments and repos; only the last one out may tear them down
+    if not await coordinator.is_last_worker() or not await store.acquire_lease("shutdown", coordinator.worker_id, 60):
+        logger.info(f"Worker {coordinator.worker_id} leaving deployments to the remaining workers")
+        return
+    if not SHUTDOWN_TEARDOWN:
+        # Deployments, clones and stop timers stay in the store; the next start's reaper picks the timers up
+        logger.info(
+            f"Handing off {len(await deployments.keys())} deployments and {len(await cloned_repos.keys())} "
+            f"repositories to the next start"
+        )
+        await store.release_lease("shutdown", coordinator.worker_id)
+        return
+
+    async def remove_repo(repo_id):
+        await asyncio.to_thread(shutil.rmtree, await cloned_repos.get(repo_id), ignore_errors=True)
+        await cloned_repos.pop(repo_id)
         logger.info(f"Cleaned up repository: {repo_id}")
 
-    # Clean up deployments (optional)
-    for app_name in deployments.keys():
-        try:
-            await execute_command(['flyctl', 'apps', 'destroy', app_name, '--yes'])
-            logger.info(f"Destroyed app: {app_name}")
-        except Exception as e:
-            logger.error(f"Error destroying app during cleanup: {e}")
+    async def remove_deployment(app_name):
+        if (await deployments.get(app_name, {})).get("stage") not in TERMINAL_STAGES:
+            await destroy_app(app_name, "App destroyed during shutdown.")
+        await deployments.pop(app_name)
+
+    await teardown(await cloned_repos.keys(), remove_repo)
+    await teardown(await deployments.keys(), remove_deployment)
+    await store.release_lease("shutdown", coordinator.worker_id)
 
 if __name__ == "__main__":
     import uvicorn
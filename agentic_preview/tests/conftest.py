@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The service imports its modules from the top level, as uvicorn main:app does
+os.environ.setdefault("COORDINATION_STORE", "memory://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from coordination import AsyncStore, MemoryStore, SharedDict
+
+@pytest.fixture
+def worker(monkeypatch):
+    store = AsyncStore(MemoryStore(), threads=1)
+    monkeypatch.setattr(main, "deployments", SharedDict(store, "deployments"))
+    monkeypatch.setattr(main, "deploy_tasks", {})
+    monkeypatch.setattr(main, "SHUTDOWN_DRAIN_TIMEOUT", 0.2)
+    destroyed = []
+
+    async def destroy_app(app_name, message=""):
+        destroyed.append(app_name)
+
+    async def publish_stage(app_name, stage, message="", **data):
+        pass
+
+    monkeypatch.setattr(main, "destroy_app", destroy_app)
+    monkeypatch.setattr(main, "publish_stage", publish_stage)
+    yield destroyed
+    store.close()
+
+def test_builds_past_the_deadline_are_cancelled_and_their_apps_destroyed(worker):
+    async def scenario():
+        fast = asyncio.create_task(asyncio.sleep(0.01))
+        slow = asyncio.create_task(asyncio.sleep(30))
+        main.deploy_tasks.update({"fast-app": fast, "slow-app": slow})
+        for app_name in main.deploy_tasks:
+            await main.deployments.set(app_name, {"status": "Deploying"})
+
+        await main.drain_builds()
+
+        assert fast.done() and not fast.cancelled() and slow.cancelled()
+        assert (await main.deployments.get("slow-app"))["status"] == "Failed"
+        assert (await main.deployments.get("fast-app"))["status"] == "Deploying"
+
+    asyncio.run(scenario())
+    assert worker == ["slow-app"]
+
+def test_new_deploys_are_rejected_while_draining(worker, monkeypatch):
+    monkeypatch.setattr(main, "draining", True)
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(main.deploy(main.DeployRequest(repo="octo/app", branch="main")))
+
+    assert raised.value.status_code == 503
@@ -0,0 +1,37 @@
+import asyncio
+
+from coordination import AsyncStore, MemoryStore
+from events import EventBus
+
+def test_events_from_another_worker_are_delivered_after_later_local_ones():
+    async def scenario():
+        store = AsyncStore(MemoryStore(), threads=1)
+        first, second = EventBus(store=store), EventBus(store=store)
+        subscription = second.subscribe(["app"])
+
+        # The first worker stores seq 1, but the second publishes seq 2 before its next sync reads it
+        await first.publish("app", "building", "running")
+        await second.publish("app", "deployed", "running")
+        await second.sync()
+
+        received = [await subscription.next(timeout=1) for _ in range(2)]
+        assert [(event.seq, event.stage) for event in received] == [(2, "deployed"), (1, "building")]
+        assert await subscription.next(timeout=0.05) is None
+        store.close()
+
+    asyncio.run(scenario())
+
+def test_replayed_and_live_copies_are_delivered_once():
+    async def scenario():
+        bus = EventBus()
+        await bus.publish("app", "queued", "pending")
+        subscription = bus.subscribe(["app"], since=0)
+        for event in bus.backlog(["app"]):
+            subscription.offer(event)
+        await bus.publish("app", "building", "running")
+
+        received = [await subscription.next(timeout=1) for _ in range(2)]
+        assert [event.stage for event in received] == ["queued", "building"]
+        assert await subscription.next(timeout=0.05) is None
+
+    asyncio.run(scenario())